@@ -0,0 +1,201 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from file_manager import CompressWorker, ParallelWalker, TransferEngine
+
+
+def make_tree(root, files, files_per_dir=100, fanout=10, file_size=0, data=None):
+    # files_per_dir files of file_size bytes in each directory, directories nested fanout-wide
+    data = os.urandom(file_size) if data is None else data
+    dirs = max(1, files // files_per_dir)
+    created = 0
+    for d in range(dirs):
+        parts = []
+        n = d
+        while True:
+            parts.append(f'd{n % fanout}')
+            n //= fanout
+            if n == 0:
+                break
+        path = os.path.join(root, *reversed(parts), f'leaf{d}')
+        os.makedirs(path, exist_ok=True)
+        for f in range(min(files_per_dir, files - created)):
+            with open(os.path.join(path, f'file{f}_{d}.txt'), 'wb') as fh:
+                fh.write(data)
+        created += files_per_dir
+    return root
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def search_oswalk_two_pass(root, query):
+    # The original SearchWorker loop: count everything, then walk again to match
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        total += len(dirnames) + len(filenames)
+    results = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            if query in name.lower():
+                results.append(os.path.join(dirpath, name))
+    return len(results)
+
+
+def search_parallel(root, query, workers):
+    walker = ParallelWalker(root, lambda entry: query in entry.name.lower(), workers)
+    return sum(len(matches) for matches in walker.iter_matches())
+
+
+def bench_search(args):
+    root = args.dir or tempfile.mkdtemp(prefix='dolphy-bench-')
+    try:
+        if not os.listdir(root):
+            print(f'Creating {args.files} files in {root}...')
+            elapsed, _ = timed(make_tree, root, args.files)
+            print(f'  created in {elapsed:.1f} s')
+        query = args.query.lower()
+        baseline, expected = timed(search_oswalk_two_pass, root, query)
+        print(f'{"os.walk, two passes":<24}{baseline:>9.2f} s  {expected:>8} hits  1.00x')
+        for workers in args.threads:
+            elapsed, hits = timed(search_parallel, root, query, workers)
+            note = '' if hits == expected else '  MISMATCH'
+            print(f'{f"scandir, {workers} thread(s)":<24}{elapsed:>9.2f} s  {hits:>8} hits  {baseline / elapsed:.2f}x{note}')
+    finally:
+        if not args.dir and not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def copy_engine(src, dst, threads):
+    engine = TransferEngine(copy_threads=threads)
+    job = engine.submit('copy', [src], dst)
+    while job.active():
+        time.sleep(0.01)
+    engine.shutdown()
+    return job.files_done, job.errors
+
+
+def bench_copy(args):
+    base = args.dir or tempfile.mkdtemp(prefix='dolphy-bench-')
+    src = os.path.join(base, 'src')
+    try:
+        if not os.path.isdir(src):
+            print(f'Creating {args.files} files of {args.size} bytes in {src}...')
+            elapsed, _ = timed(make_tree, src, args.files, 100, 10, args.size)
+            print(f'  created in {elapsed:.1f} s')
+        dev = os.stat(base).st_dev
+        print(f'rotational media: {TransferEngine.is_rotational(dev)} (automatic pool size: {TransferEngine().pool_size(dev, dev)})')
+        dst = os.path.join(base, 'dst')
+        os.mkdir(dst)
+        # The source tree is in the page cache for every run, so all variants read it under the same conditions
+        baseline, _ = timed(shutil.copytree, src, os.path.join(dst, 'copytree'), True)
+        print(f'{"shutil.copytree":<24}{baseline:>9.2f} s  1.00x')
+        for threads in args.threads:
+            target = os.path.join(dst, f't{threads}')
+            os.mkdir(target)
+            elapsed, (files, errors) = timed(copy_engine, src, target, threads)
+            note = f'  {len(errors)} ERRORS' if errors else ''
+            print(f'{f"engine, {threads} thread(s)":<24}{elapsed:>9.2f} s  {baseline / elapsed:.2f}x  {files} files{note}')
+        shutil.rmtree(dst, ignore_errors=True)
+    finally:
+        if not args.dir and not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+def text_data(size):
+    # Compressible, log-like content; random bytes would only measure how fast deflate gives up
+    lines = []
+    total = i = 0
+    while total < size:
+        line = f'{i:08d} level=info value={i * 2654435761 % 2 ** 32:08x} path=/srv/data/{i % 977}/item{i % 31}.dat\n'.encode()
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return b''.join(lines)[:size]
+
+
+def compress_worker(paths, target, fmt, level, threads):
+    # CompressWorker.run() on this thread; one thread selects the standard library writers
+    worker = CompressWorker(paths, target, fmt, level, threads=threads)
+    results = []
+    worker.completed.connect(lambda status, message: results.append((status, message)))
+    worker.run()
+    status, message = results[0]
+    if status != CompressWorker.DONE:
+        raise RuntimeError(message)
+    return worker.bytes_in, worker.bytes_out
+
+
+def bench_compress(args):
+    base = args.dir or tempfile.mkdtemp(prefix='dolphy-bench-')
+    src = os.path.join(base, 'src')
+    large = os.path.join(base, 'large.log')
+    try:
+        if not os.path.isdir(src):
+            print(f'Creating {args.files} files of {args.size} bytes in {src}...')
+            elapsed, _ = timed(make_tree, src, args.files, 100, 10, args.size, text_data(args.size))
+            print(f'  created in {elapsed:.1f} s')
+        if not os.path.exists(large):
+            print(f'Creating a {args.large} MB file...')
+            with open(large, 'wb') as f:
+                block = text_data(16 * 1024 * 1024)
+                for _ in range(max(1, args.large // 16)):
+                    f.write(block)
+        out = os.path.join(base, 'out')
+        os.makedirs(out, exist_ok=True)
+        cases = [('ZIP (.zip)', [src], 'tree.zip'), ('TAR.GZ (.tar.gz)', [src], 'tree.tar.gz'), ('GZ (.gz)', [large], 'large.log.gz')]
+        for fmt, paths, name in cases:
+            print(f'{fmt}, level {args.level}:')
+            baseline = None
+            for threads in [1] + [t for t in args.threads if t > 1]:
+                target = os.path.join(out, name)
+                elapsed, (bytes_in, bytes_out) = timed(compress_worker, paths, target, fmt, args.level, threads)
+                os.remove(target)
+                baseline = baseline or elapsed
+                label = 'standard library' if threads == 1 else f'parallel, {threads} thread(s)'
+                print(f'  {label:<26}{elapsed:>9.2f} s  {bytes_in / elapsed / 2 ** 20:>8.1f} MB/s  '
+                      f'ratio {bytes_out / bytes_in:.3f}  {baseline / elapsed:.2f}x')
+        shutil.rmtree(out, ignore_errors=True)
+    finally:
+        if not args.dir and not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dolphy File Manager benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    search = sub.add_parser('search', help='tree traversal for file name search')
+    search.add_argument('--files', type=int, default=1_000_000)
+    search.add_argument('--dir', help='existing tree to search (created when empty)')
+    search.add_argument('--keep', action='store_true', help='keep the generated tree')
+    search.add_argument('--query', default='file7_')
+    search.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    search.set_defaults(func=bench_search)
+    copy = sub.add_parser('copy', help='many-small-file tree copy vs. shutil.copytree')
+    copy.add_argument('--files', type=int, default=100_000)
+    copy.add_argument('--size', type=int, default=4096, help='bytes per file')
+    copy.add_argument('--dir', help='working folder (source tree is created in dir/src when missing)')
+    copy.add_argument('--keep', action='store_true', help='keep the generated tree')
+    copy.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    copy.set_defaults(func=bench_copy)
+    compress = sub.add_parser('compress', help='ZIP, .tar.gz and .gz: parallel deflate vs. the standard library')
+    compress.add_argument('--files', type=int, default=2_000)
+    compress.add_argument('--size', type=int, default=256 * 1024, help='bytes per file')
+    compress.add_argument('--large', type=int, default=1024, help='size of the single .gz input in MB')
+    compress.add_argument('--level', default='Normal', choices=['Store (no compression)', 'Fast', 'Normal', 'Best'])
+    compress.add_argument('--dir', help='working folder (inputs are created there when missing)')
+    compress.add_argument('--keep', action='store_true', help='keep the generated inputs')
+    compress.add_argument('--threads', type=int, nargs='+', default=[2, 4, 8, 16, 32])
+    compress.set_defaults(func=bench_compress)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,42 @@
 import sys
 import os
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QTreeView, QFileSystemModel, QVBoxLayout, QWidget, QSplitter, QToolBar, QLineEdit, QMessageBox, QListWidget, QListWidgetItem, QMenuBar, QMenu, QHeaderView, QStyledItemDelegate, QDialog, QDialogButtonBox, QLabel, QVBoxLayout, QCheckBox, QFileDialog, QInputDialog, QPushButton, QHBoxLayout, QProgressBar, QStackedWidget, QAbstractItemView, QTabWidget, QScrollArea, QTextEdit, QFormLayout, QTableWidget, QTableWidgetItem, QSizePolicy, QComboBox, QProgressDialog
+    QApplication, QMainWindow, QTreeView, QFileSystemModel, QVBoxLayout, QWidget, QSplitter, QToolBar, QLineEdit, QMessageBox, QListWidget, QListWidgetItem, QMenuBar, QMenu, QHeaderView, QStyledItemDelegate, QDialog, QDialogButtonBox, QLabel, QVBoxLayout, QCheckBox, QFileDialog, QInputDialog, QPushButton, QHBoxLayout, QProgressBar, QStackedWidget, QAbstractItemView, QTabWidget, QScrollArea, QTextEdit, QFormLayout, QTableWidget, QTableWidgetItem, QSizePolicy, QComboBox, QProgressDialog, QTreeWidget, QTreeWidgetItem, QToolTip, QSpinBox
 )
-from PySide6.QtCore import Qt, QDir, QThread, Signal, QObject, QFileSystemWatcher, QPropertyAnimation, QEasingCurve, QTimer
-from PySide6.QtGui import QPalette, QColor, QAction, QIcon, QKeySequence, QShortcut, QPixmap
+from PySide6.QtCore import Qt, QRectF, QAbstractTableModel, QModelIndex, QDir, QThread, Signal, QObject, QFileSystemWatcher, QPropertyAnimation, QEasingCurve, QTimer
+from PySide6.QtGui import QPalette, QColor, QPainter, QAction, QIcon, QKeySequence, QShortcut, QPixmap
 from PySide6.QtMultimediaWidgets import QVideoWidget
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
 import random
 import shutil
+import threading
+import heapq
+import sqlite3
+import collections
+import time
+import queue
+import re
+import itertools
+import bisect
+import io
+import errno
+import hashlib
+import fnmatch
+import mmap
+import multiprocessing
+import concurrent.futures
+from array import array
 import subprocess
 import difflib
 import json
 import stat
+import struct
 import platform
 import mimetypes
+import urllib.parse
 import zipfile
 import tarfile
+import zlib
 try:
     import py7zr
     HAS_PY7ZR = True
@@ -32,56 +52,1697 @@ try:
     HAS_ISO = True
 except ImportError:
     HAS_ISO = False
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
 
 os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
 os.environ["QT_SCALE_FACTOR"] = "1"
 os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "1"
 
+def human_readable_size(size, decimal_places=2):
+    for unit in ['B','KB','MB','GB','TB']:
+        if size < 1024.0:
+            return f"{size:.{decimal_places}f} {unit}"
+        size /= 1024.0
+    return f"{size:.{decimal_places}f} PB"
+
+class FolderSizeCache:
+    # One row per directory, valid while (device, inode, mtime) match; subdirs is NUL-separated
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'folder_sizes.db')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._conn()
+        if conn.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS dirs')
+            conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, dev INTEGER, ino INTEGER, mtime_ns INTEGER, '
+            'own_bytes INTEGER, own_files INTEGER, own_blocks INTEGER, total_bytes INTEGER, subdirs TEXT)'
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load_subtree(self, folder):
+        folder = os.path.normpath(folder)
+        prefix = folder.rstrip(os.sep) + os.sep
+        entries = {}
+        try:
+            rows = self._conn().execute(
+                'SELECT path, dev, ino, mtime_ns, own_bytes, own_files, own_blocks, subdirs FROM dirs '
+                'WHERE path = ? OR (path >= ? AND path < ?)',
+                (folder, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+            )
+            for path, dev, ino, mtime_ns, own_bytes, own_files, own_blocks, subdirs in rows:
+                entries[path] = (dev, ino, mtime_ns, own_bytes, own_files, own_blocks, subdirs.split('\0') if subdirs else [])
+        except sqlite3.Error:
+            pass
+        return entries
+
+    def cached_total(self, folder):
+        folder = os.path.normpath(folder)
+        try:
+            row = self._conn().execute('SELECT dev, ino, mtime_ns, total_bytes FROM dirs WHERE path = ?', (folder,)).fetchone()
+            st = os.stat(folder)
+        except (sqlite3.Error, OSError):
+            return None
+        if row and row[3] is not None and row[:3] == (st.st_dev, st.st_ino, st.st_mtime_ns):
+            return row[3]
+        return None
+
+    def store(self, rows):
+        with self._lock:
+            try:
+                conn = self._conn()
+                conn.executemany('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def evict(self, path):
+        # The changed directory and every ancestor whose total included it
+        paths = []
+        path = os.path.normpath(path)
+        while True:
+            paths.append(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        with self._lock:
+            try:
+                conn = self._conn()
+                conn.execute(f'DELETE FROM dirs WHERE path IN ({",".join("?" * len(paths))})', paths)
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+class DiskUsageIndex:
+    # Directory tree held in flat arrays. Nodes are numbered breadth-first, so the children of a node are
+    # contiguous (first_child .. first_child + child_count, sorted by name) and every parent precedes its
+    # children. own_* count the files directly inside a directory, bytes/files/blocks the whole subtree.
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.parent = array('q')
+        self.first_child = array('q')
+        self.child_count = array('q')
+        self.own_bytes = array('q')
+        self.own_files = array('q')
+        self.own_blocks = array('q')
+        self.bytes = array('q')
+        self.files = array('q')
+        self.blocks = array('q')
+        self._names = ''
+        self._name_offsets = array('q', [0])
+
+    def __len__(self):
+        return len(self.parent)
+
+    def name(self, node):
+        return self._names[self._name_offsets[node]:self._name_offsets[node + 1]]
+
+    def path(self, node):
+        parts = []
+        while node > 0:
+            parts.append(self.name(node))
+            node = self.parent[node]
+        return os.path.join(self.root, *reversed(parts))
+
+    def children(self, node):
+        return range(self.first_child[node], self.first_child[node] + self.child_count[node])
+
+    def find(self, path):
+        path = os.path.normpath(path)
+        if path == self.root:
+            return 0
+        prefix = self.root.rstrip(os.sep) + os.sep
+        if not path.startswith(prefix):
+            return None
+        node = 0
+        for part in path[len(prefix):].split(os.sep):
+            lo = self.first_child[node]
+            end = hi = lo + self.child_count[node]
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.name(mid) < part:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == end or self.name(lo) != part:
+                return None
+            node = lo
+        return node
+
+    def size(self, path):
+        node = self.find(path)
+        return None if node is None else self.bytes[node]
+
+    def memory_bytes(self):
+        arrays = (self.parent, self.first_child, self.child_count, self.own_bytes, self.own_files, self.own_blocks,
+                  self.bytes, self.files, self.blocks, self._name_offsets)
+        return sum(a.buffer_info()[1] * a.itemsize for a in arrays) + sys.getsizeof(self._names)
+
+    @classmethod
+    def build(cls, folder, is_cancelled=None, cache=None):
+        # One os.scandir pass over the tree. With a cache, directories whose (dev, inode, mtime) are
+        # unchanged reuse their stored totals and subdirectory names, so only changed subtrees are listed.
+        index = cls(folder)
+        known = cache.load_subtree(index.root) if cache else {}
+        queue = collections.deque([index.root])
+        names = []
+        rows = []
+        index.parent.append(-1)
+        names.append('')
+        while queue:
+            if is_cancelled and is_cancelled():
+                return None
+            node = len(index.own_bytes)
+            current = queue.popleft()
+            try:
+                st = os.stat(current, follow_symlinks=False)
+                key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+            except OSError:
+                key = None
+            entry = known.get(current)
+            if key and entry and entry[:3] == key:
+                own_bytes, own_files, own_blocks, subdirs = entry[3:]
+            else:
+                own_bytes = own_files = own_blocks = 0
+                subdirs = []
+                try:
+                    with os.scandir(current) as it:
+                        for e in it:
+                            try:
+                                if e.is_dir(follow_symlinks=False):
+                                    subdirs.append(e.name)
+                                else:
+                                    fst = e.stat(follow_symlinks=False)
+                                    own_bytes += fst.st_size
+                                    own_files += 1
+                                    own_blocks += getattr(fst, 'st_blocks', (fst.st_size + 511) // 512)
+                            except OSError:
+                                pass
+                except OSError:
+                    pass
+                subdirs.sort()
+            index.own_bytes.append(own_bytes)
+            index.own_files.append(own_files)
+            index.own_blocks.append(own_blocks)
+            index.first_child.append(len(index.parent))
+            index.child_count.append(len(subdirs))
+            if cache and key:
+                rows.append((node, current, key, own_bytes, own_files, own_blocks, subdirs))
+            for name in subdirs:
+                index.parent.append(node)
+                names.append(name)
+                queue.append(os.path.join(current, name))
+        for name in names:
+            index._name_offsets.append(index._name_offsets[-1] + len(name))
+        index._names = ''.join(names)
+        index.bytes = array('q', index.own_bytes)
+        index.files = array('q', index.own_files)
+        index.blocks = array('q', index.own_blocks)
+        for node in range(len(index) - 1, 0, -1):
+            parent = index.parent[node]
+            index.bytes[parent] += index.bytes[node]
+            index.files[parent] += index.files[node]
+            index.blocks[parent] += index.blocks[node]
+        if cache:
+            cache.store([
+                (path, key[0], key[1], key[2], own_bytes, own_files, own_blocks, index.bytes[node], '\0'.join(subdirs))
+                for node, path, key, own_bytes, own_files, own_blocks, subdirs in rows
+            ])
+        return index
+
+class FilenameIndex:
+    # Names of every entry below the indexed roots. entries.name is mirrored into an FTS5 trigram table
+    # so that substring (LIKE '%q%') queries use the index; without FTS5 the same query scans entries.
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'filename_index.db')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY, built REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS dirs (id INTEGER PRIMARY KEY, path TEXT UNIQUE)')
+        conn.execute('CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, dir_id INTEGER, name TEXT, is_dir INTEGER)')
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_dir ON entries (dir_id)')
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(name, content='entries', content_rowid='id', tokenize='trigram')")
+            conn.execute('CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN '
+                         'INSERT INTO names (rowid, name) VALUES (new.id, new.name); END')
+            conn.execute('CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN '
+                         "INSERT INTO names (names, rowid, name) VALUES ('delete', old.id, old.name); END")
+            self.has_fts = True
+        except sqlite3.Error:
+            self.has_fts = False
+        conn.commit()
+        self.roots = {path: built for path, built in conn.execute('SELECT path, built FROM roots')}
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def covers(self, path):
+        path = os.path.normpath(path)
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots)
+
+    def _subtree_clause(self, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        return '(d.path = ? OR (d.path >= ? AND d.path < ?))', (path, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+
+    def search(self, root, query, recursive=True):
+        root = os.path.normpath(root)
+        # No ESCAPE clause: it keeps the trigram index from being used. A literal % or _ in the query just
+        # widens the LIKE match, and the exact substring test below narrows it again.
+        pattern = '%' + query + '%'
+        needle = query.lower()
+        if recursive:
+            scope, args = self._subtree_clause(root)
+        else:
+            scope, args = 'd.path = ?', (root,)
+        if self.has_fts:
+            sql = ('SELECT d.path, e.name FROM names JOIN entries e ON e.id = names.rowid JOIN dirs d ON d.id = e.dir_id '
+                   f'WHERE names.name LIKE ? AND {scope}')
+        else:
+            sql = f'SELECT d.path, e.name FROM entries e JOIN dirs d ON d.id = e.dir_id WHERE e.name LIKE ? AND {scope}'
+        try:
+            return [os.path.join(dirpath, name) for dirpath, name in self._conn().execute(sql, (pattern, *args)) if needle in name.lower()]
+        except sqlite3.Error:
+            return []
+
+    def iter_directories(self, root, recursive=True):
+        root = os.path.normpath(root)
+        if recursive:
+            scope, args = self._subtree_clause(root)
+        else:
+            scope, args = 'd.path = ?', (root,)
+        try:
+            rows = self._conn().execute(f'SELECT d.path, e.name FROM entries e JOIN dirs d ON d.id = e.dir_id WHERE {scope} ORDER BY e.dir_id', args)
+            for dirpath, group in itertools.groupby(rows, key=lambda row: row[0]):
+                yield dirpath, [name for _, name in group]
+        except sqlite3.Error:
+            return
+
+    def _delete_subtree(self, conn, path):
+        scope, args = self._subtree_clause(path)
+        conn.execute(f'DELETE FROM entries WHERE dir_id IN (SELECT d.id FROM dirs d WHERE {scope})', args)
+        conn.execute(f'DELETE FROM dirs WHERE id IN (SELECT d.id FROM dirs d WHERE {scope})', args)
+
+    def _dir_id(self, conn, path):
+        conn.execute('INSERT OR IGNORE INTO dirs (path) VALUES (?)', (path,))
+        return conn.execute('SELECT id FROM dirs WHERE path = ?', (path,)).fetchone()[0]
+
+    def _index_tree(self, conn, root, is_cancelled=None, progress=None):
+        count = 0
+        batch = []
+        stack = [root]
+        while stack:
+            if is_cancelled and is_cancelled():
+                break
+            current = stack.pop()
+            dir_id = self._dir_id(conn, current)
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            stack.append(entry.path)
+                        batch.append((dir_id, entry.name, int(is_dir)))
+            except OSError:
+                pass
+            if len(batch) >= 5000:
+                with self._lock:
+                    conn.executemany('INSERT INTO entries (dir_id, name, is_dir) VALUES (?, ?, ?)', batch)
+                    conn.commit()
+                count += len(batch)
+                batch = []
+                if progress:
+                    progress(count)
+        with self._lock:
+            conn.executemany('INSERT INTO entries (dir_id, name, is_dir) VALUES (?, ?, ?)', batch)
+            conn.commit()
+        return count + len(batch)
+
+    def build(self, root, is_cancelled=None, progress=None):
+        root = os.path.normpath(root)
+        conn = self._conn()
+        with self._lock:
+            self._delete_subtree(conn, root)
+            conn.commit()
+        count = self._index_tree(conn, root, is_cancelled, progress)
+        if is_cancelled and is_cancelled():
+            return count
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._lock:
+            for old_root in [r for r in self.roots if r.startswith(prefix)]:
+                conn.execute('DELETE FROM roots WHERE path = ?', (old_root,))
+                del self.roots[old_root]
+            built = time.time()
+            conn.execute('INSERT OR REPLACE INTO roots VALUES (?, ?)', (root, built))
+            conn.commit()
+            self.roots[root] = built
+        return count
+
+    def refresh_directory(self, path):
+        # Bring one directory up to date after a filesystem event; new subfolders are indexed, removed ones dropped
+        path = os.path.normpath(path)
+        if not self.covers(path):
+            return
+        conn = self._conn()
+        try:
+            with os.scandir(path) as it:
+                current = {entry.name: entry.is_dir(follow_symlinks=False) for entry in it}
+        except OSError:
+            current = {}
+        with self._lock:
+            dir_id = self._dir_id(conn, path)
+            known = {name: bool(is_dir) for name, is_dir in conn.execute('SELECT name, is_dir FROM entries WHERE dir_id = ?', (dir_id,))}
+            for name in known.keys() - current.keys():
+                conn.execute('DELETE FROM entries WHERE dir_id = ? AND name = ?', (dir_id, name))
+                if known[name]:
+                    self._delete_subtree(conn, os.path.join(path, name))
+            added = [(dir_id, name, int(current[name])) for name in current.keys() - known.keys()]
+            conn.executemany('INSERT INTO entries (dir_id, name, is_dir) VALUES (?, ?, ?)', added)
+            conn.commit()
+        for _, name, is_dir in added:
+            if is_dir:
+                self._index_tree(conn, os.path.join(path, name))
+
+    def refresh_directory_async(self, path):
+        threading.Thread(target=self.refresh_directory, args=(path,), daemon=True).start()
+
+class FolderSizeEngine(QObject):
+    size_ready = Signal(str, object)
+    PRIORITY_VISIBLE = 0
+    PRIORITY_BACKGROUND = 1
+    SIZE_ENTRY_COST = 200
+
+    def __init__(self, parent=None, workers=None, cache=None, memory_budget=64 * 1024 * 1024):
+        super().__init__(parent)
+        self.cache = cache
+        self.memory_budget = memory_budget
+        self.sizes = {}
+        self.indexes = {}
+        # LRU over ('size', path) and ('index', root) keys, mapping to their estimated cost in bytes
+        self._lru = collections.OrderedDict()
+        self._memory = 0
+        self._pending = {}
+        self._active = set()
+        self._queue = []
+        self._seq = 0
+        self._generation = 0
+        self._running = True
+        self._cond = threading.Condition()
+        count = workers or min(8, (os.cpu_count() or 2) * 2)
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(count)]
+        for t in self._threads:
+            t.start()
+
+    def get(self, path):
+        with self._cond:
+            size = self.sizes.get(path)
+            if size is not None:
+                self._lru.move_to_end(('size', path))
+                return size
+        found = self.index_for(path)
+        if found:
+            index, node = found
+            return index.bytes[node]
+        return None
+
+    def index_for(self, path):
+        # Any scanned tree containing path answers for it (and all its descendants) from memory
+        path = os.path.normpath(path)
+        with self._cond:
+            candidate = path
+            while True:
+                index = self.indexes.get(candidate)
+                if index is not None:
+                    node = index.find(path)
+                    if node is not None:
+                        self._lru.move_to_end(('index', candidate))
+                        return index, node
+                parent = os.path.dirname(candidate)
+                if parent == candidate:
+                    return None
+                candidate = parent
+
+    def add_index(self, index):
+        prefix = index.root.rstrip(os.sep) + os.sep
+        with self._cond:
+            for root in list(self.indexes):
+                if root.startswith(prefix):
+                    self._discard(('index', root))
+            self.indexes[index.root] = index
+            self._charge(('index', index.root), index.memory_bytes())
+
+    def set_size(self, path, size):
+        with self._cond:
+            self.sizes[path] = size
+            self._charge(('size', path), self.SIZE_ENTRY_COST + len(path))
+
+    def set_memory_budget(self, memory_budget):
+        with self._cond:
+            self.memory_budget = memory_budget
+            self._trim()
+
+    def memory_usage(self):
+        with self._cond:
+            return self._memory, len(self.sizes), len(self.indexes), sum(len(index) for index in self.indexes.values())
+
+    def _charge(self, key, cost):
+        self._memory += cost - self._lru.pop(key, 0)
+        self._lru[key] = cost
+        self._trim()
+
+    def _discard(self, key):
+        self._memory -= self._lru.pop(key, 0)
+        kind, path = key
+        if kind == 'size':
+            self.sizes.pop(path, None)
+        else:
+            self.indexes.pop(path, None)
+
+    def _trim(self):
+        # Evict least recently used entries, but always keep the newest one even if it alone is over budget
+        while self._memory > self.memory_budget and len(self._lru) > 1:
+            self._discard(next(iter(self._lru)))
+
+    def request(self, path, priority=PRIORITY_VISIBLE):
+        with self._cond:
+            if self.get(path) is not None:
+                return
+            current = self._pending.get(path)
+            if current is not None and current <= priority:
+                return
+            self._pending[path] = priority
+            self._seq += 1
+            # Newest request first within a priority, so the rows painted last (on screen) win
+            heapq.heappush(self._queue, (priority, -self._seq, path))
+            self._cond.notify()
+
+    def cancel_pending(self):
+        with self._cond:
+            self._generation += 1
+            self._queue.clear()
+            self._pending.clear()
+
+    def size_of(self, path):
+        # Blocking lookup for dialogs that need a number right away
+        size = self.get(path)
+        if size is None:
+            index = DiskUsageIndex.build(path, cache=self.cache)
+            self.add_index(index)
+            size = index.bytes[0]
+        return size
+
+    def invalidate(self, path):
+        # Contents of path changed: forget it and every ancestor, in memory and on disk
+        path = os.path.normpath(path)
+        with self._cond:
+            for cached in list(self.sizes):
+                norm = os.path.normpath(cached)
+                if norm == path or path.startswith(norm.rstrip(os.sep) + os.sep):
+                    self._discard(('size', cached))
+            for root in list(self.indexes):
+                if root == path or path.startswith(root.rstrip(os.sep) + os.sep):
+                    self._discard(('index', root))
+        if self.cache:
+            self.cache.evict(path)
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._generation += 1
+            self._queue.clear()
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                priority, _, path = heapq.heappop(self._queue)
+                if self._pending.get(path) != priority or path in self._active:
+                    continue
+                self._active.add(path)
+                generation = self._generation
+            # Show the size saved by a previous session at once, then revalidate it
+            cached = self.cache.cached_total(path) if self.cache else None
+            if cached is not None:
+                self.set_size(path, cached)
+                self.size_ready.emit(path, cached)
+            index = DiskUsageIndex.build(path, lambda: self._generation != generation, self.cache)
+            with self._cond:
+                self._active.discard(path)
+                if index is None or self._generation != generation:
+                    continue
+                self._pending.pop(path, None)
+                self.add_index(index)
+                size = index.bytes[0]
+                self.set_size(path, size)
+            if size != cached:
+                self.size_ready.emit(path, size)
+
+class TransferCancelled(Exception):
+    pass
+
+class TransferJournal:
+    # Crash-safe record of unfinished transfers: each job, the destination files it completed and, for large
+    # files, the last offset whose data was fsynced. A job's rows go away when it finishes or is cancelled.
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'transfer_journal.db')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Completed files are written in batches; losing the last batch only means copying those files again
+        self._pending = []
+        self._flushed = time.monotonic()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, mode TEXT, dest_dir TEXT, sources TEXT, created REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS files (job INTEGER, path TEXT, PRIMARY KEY (job, path))')
+        conn.execute('CREATE TABLE IF NOT EXISTS chunks (job INTEGER, path TEXT, size INTEGER, mtime_ns INTEGER, '
+                     'offset INTEGER, PRIMARY KEY (job, path))')
+        # Sync options, added after the first journals were written
+        for column in ('use_hash', 'mirror'):
+            try:
+                conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} INTEGER DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # A committed offset has to survive a power failure just like the data it describes
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    def begin(self, job):
+        with self._lock:
+            try:
+                conn = self._conn()
+                cur = conn.execute('INSERT INTO jobs (mode, dest_dir, sources, created, use_hash, mirror) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', (job.mode, job.dest_dir, '\0'.join(job.sources),
+                                                                 time.time(), int(job.use_hash), int(job.mirror)))
+                conn.commit()
+                job.journal_id = cur.lastrowid
+            except sqlite3.Error:
+                pass
+
+    def file_done(self, job, path):
+        with self._lock:
+            self._pending.append((job.journal_id, path))
+            if time.monotonic() - self._flushed >= self.FLUSH_INTERVAL:
+                self._flush()
+
+    def commit_offset(self, job, path, st, offset):
+        with self._lock:
+            try:
+                conn = self._conn()
+                conn.execute('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)',
+                             (job.journal_id, path, st.st_size, st.st_mtime_ns, offset))
+                self._flush()
+            except sqlite3.Error:
+                pass
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._flushed = time.monotonic()
+        try:
+            conn = self._conn()
+            if self._pending:
+                conn.executemany('INSERT OR IGNORE INTO files VALUES (?, ?)', self._pending)
+                conn.executemany('DELETE FROM chunks WHERE job = ? AND path = ?', self._pending)
+            conn.commit()
+        except sqlite3.Error:
+            pass
+        self._pending = []
+
+    def state(self, job_id):
+        # (completed destination paths, {destination: (source size, source mtime_ns, committed offset)})
+        self.flush()
+        try:
+            conn = self._conn()
+            completed = {path for path, in conn.execute('SELECT path FROM files WHERE job = ?', (job_id,))}
+            offsets = {path: (size, mtime_ns, offset) for path, size, mtime_ns, offset in
+                       conn.execute('SELECT path, size, mtime_ns, offset FROM chunks WHERE job = ?', (job_id,))}
+        except sqlite3.Error:
+            return set(), {}
+        return completed, offsets
+
+    def unfinished(self):
+        try:
+            rows = self._conn().execute('SELECT id, mode, sources, dest_dir, use_hash, mirror FROM jobs ORDER BY id').fetchall()
+        except sqlite3.Error:
+            return []
+        return [(job_id, mode, sources.split('\0'), dest_dir, {'use_hash': bool(use_hash), 'mirror': bool(mirror)})
+                for job_id, mode, sources, dest_dir, use_hash, mirror in rows]
+
+    def finish(self, job_id):
+        # Returns the partially written large files, for callers that discard a job instead of resuming it
+        with self._lock:
+            self._pending = [row for row in self._pending if row[0] != job_id]
+            try:
+                conn = self._conn()
+                partial = [path for path, in conn.execute('SELECT path FROM chunks WHERE job = ?', (job_id,))]
+                for table, column in (('jobs', 'id'), ('files', 'job'), ('chunks', 'job')):
+                    conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (job_id,))
+                conn.commit()
+            except sqlite3.Error:
+                return []
+        return partial
+
+class TransferJob:
+    QUEUED, RUNNING, PAUSED, DONE, CANCELLED = 'Queued', 'Running', 'Paused', 'Done', 'Cancelled'
+    _ids = itertools.count(1)
+
+    def __init__(self, mode, sources, dest_dir):
+        self.id = next(self._ids)
+        self.mode = mode
+        self.sources = list(sources)
+        self.dest_dir = dest_dir
+        self.state = self.QUEUED
+        self.files_total = self.files_done = 0
+        self.bytes_total = self.bytes_done = 0
+        self.current_file = ''
+        self.current_size = self.current_done = 0
+        self.errors = []
+        # How many files each copy backend handled
+        self.backends = collections.Counter()
+        self.started_at = self.finished_at = None
+        self._was_running = False
+        self.lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancelled = False
+        # Stopped by shutdown rather than cancelled: partial files and the journal are kept for a resume
+        self._suspended = False
+        self.journal_id = None
+        self.resumed = False
+        # Restored from the journal when resuming
+        self.completed = set()
+        self.offsets = {}
+        # Sync jobs: the (action, source, destination, bytes) list shown in the preview, and the options it was
+        # planned with (needed again to re-plan a resumed sync)
+        self.plan = None
+        self.use_hash = False
+        self.mirror = False
+        # Verified copies: BLAKE2b digest per destination, written to a manifest when asked for
+        self.verify = False
+        self.manifest = False
+        self.digests = {}
+
+    def title(self):
+        names = ', '.join(os.path.basename(p.rstrip(os.sep)) for p in self.sources[:2])
+        more = f' and {len(self.sources) - 2} more' if len(self.sources) > 2 else ''
+        if self.mode == 'verify':
+            return f'Verify {names}{more}'
+        return f'{self.mode.capitalize()} {names}{more} to {self.dest_dir}'
+
+    def active(self):
+        return self.state in (self.QUEUED, self.RUNNING, self.PAUSED)
+
+    def backend_summary(self):
+        return ', '.join(name for name, _ in self.backends.most_common())
+
+    def speed(self):
+        if not self.started_at:
+            return 0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.bytes_done / elapsed if elapsed > 0 else 0
+
+    def checkpoint(self):
+        # Called between chunks: blocks while paused, raises once cancelled
+        self._resume.wait()
+        if self._cancelled:
+            raise TransferCancelled()
+
+class TransferEngine(QObject):
+    # Copy and move jobs run one at a time (per worker thread) in queue order. Jobs can be paused, resumed,
+    # cancelled and reordered while queued; a running job pauses and cancels between 8 MB chunks.
+    job_changed = Signal(object)
+    job_finished = Signal(object)
+    CHUNK_SIZE = 8 * 1024 * 1024
+    REPORT_INTERVAL = 0.1
+    SSD_THREADS = 16
+    HDD_THREADS = 2
+    METADATA_BATCH = 256
+    # Files at least this large record a committed offset in the journal every COMMIT_INTERVAL bytes
+    JOURNAL_MIN_SIZE = 64 * 1024 * 1024
+    COMMIT_INTERVAL = 64 * 1024 * 1024
+    # Sync treats equal sizes with modification times this close as unchanged (FAT stores 2 s steps)
+    MTIME_WINDOW_NS = 2 * 10**9
+    # b2sum-compatible manifest written into the destination folder
+    MANIFEST_NAME = 'checksums.b2sum'
+    SPARSE_MIN_SIZE = 1024 * 1024
+    FICLONE = 0x40049409
+    # errnos meaning "this backend cannot copy between these files", as opposed to a real I/O or permission error
+    UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.ENOTSOCK}
+    # copy_file_range also fails with EPERM or EBADF on some filesystems (CIFS, FUSE, O_APPEND quirks) where a plain
+    # read/write works; that only skips it for the file at hand, since the same errnos can be genuine elsewhere
+    CALL_UNSUPPORTED = {'copy_file_range': {errno.EPERM, errno.EBADF}}
+
+    def __init__(self, parent=None, workers=1, copy_threads=None, journal=None):
+        super().__init__(parent)
+        self.jobs = []
+        self.journal = journal
+        # Hash every copied file while reading it, then read the copy back and compare
+        self.verify_copies = False
+        self.write_manifest = False
+        # Files copied in parallel within a tree; None picks SSD_THREADS or HDD_THREADS from the devices
+        self.copy_threads = copy_threads
+        # (backend, source device, destination device) combinations that failed once are not tried again
+        self._unsupported = set()
+        self._running = True
+        self._cond = threading.Condition()
+        self._last_report = {}
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, mode, sources, dest_dir, resume_id=None, plan=None, use_hash=False, mirror=False):
+        job = TransferJob(mode, sources, dest_dir)
+        job.plan = plan
+        job.use_hash = use_hash
+        job.mirror = mirror
+        job.verify = self.verify_copies or self.write_manifest
+        job.manifest = self.write_manifest
+        if resume_id is not None:
+            job.journal_id = resume_id
+            job.resumed = True
+        elif self.journal:
+            self.journal.begin(job)
+        with self._cond:
+            self.jobs.append(job)
+            self._cond.notify_all()
+        self.job_changed.emit(job)
+        return job
+
+    def active_jobs(self):
+        return [job for job in self.jobs if job.active()]
+
+    def pause(self, job):
+        with self._cond:
+            if job.state in (TransferJob.QUEUED, TransferJob.RUNNING):
+                job._was_running = job.state == TransferJob.RUNNING
+                job.state = TransferJob.PAUSED
+                job._resume.clear()
+        self.job_changed.emit(job)
+
+    def resume(self, job):
+        with self._cond:
+            if job.state == TransferJob.PAUSED:
+                job.state = TransferJob.RUNNING if job._was_running else TransferJob.QUEUED
+                job._resume.set()
+                self._cond.notify_all()
+        self.job_changed.emit(job)
+
+    def cancel(self, job):
+        with self._cond:
+            if not job.active():
+                return
+            job._cancelled = True
+            job._resume.set()
+            if not job._was_running and job.state != TransferJob.RUNNING:
+                # Never started: nothing to clean up
+                job.state = TransferJob.CANCELLED
+                self._forget(job)
+                self.job_finished.emit(job)
+        self.job_changed.emit(job)
+
+    def move(self, job, offset):
+        with self._cond:
+            i = self.jobs.index(job)
+            j = max(0, min(len(self.jobs) - 1, i + offset))
+            self.jobs.insert(j, self.jobs.pop(i))
+        self.job_changed.emit(job)
+
+    def clear_finished(self):
+        with self._cond:
+            self.jobs = [job for job in self.jobs if job.active()]
+
+    def shutdown(self):
+        with self._cond:
+            for job in self.jobs:
+                if job.active():
+                    job._cancelled = True
+                    job._suspended = self.journal is not None and job.journal_id is not None
+                    job._resume.set()
+            self._running = False
+            self._cond.notify_all()
+        # Give running jobs a moment to remove their partial files
+        for t in self._threads:
+            t.join(timeout=2)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = None
+                while self._running:
+                    job = next((j for j in self.jobs if j.state == TransferJob.QUEUED and not j._cancelled), None)
+                    if job:
+                        break
+                    self._cond.wait()
+                if not self._running:
+                    return
+                job.state = TransferJob.RUNNING
+                job._was_running = True
+                job.started_at = time.monotonic()
+            self.job_changed.emit(job)
+            try:
+                self._run(job)
+                state = TransferJob.DONE
+            except TransferCancelled:
+                state = TransferJob.CANCELLED
+            except Exception as e:
+                job.errors.append(str(e))
+                state = TransferJob.DONE
+            if job.manifest and job.digests:
+                # Also after a cancel: the files that did arrive were verified
+                self._write_manifest(job)
+            # The journal is settled before the job shows up as finished
+            if job._suspended:
+                self.journal.flush()
+            else:
+                self._forget(job)
+            job.finished_at = time.monotonic()
+            job.current_file = ''
+            job.state = state
+            self.job_changed.emit(job)
+            self.job_finished.emit(job)
+
+    def _forget(self, job):
+        if self.journal and job.journal_id is not None:
+            self.journal.finish(job.journal_id)
+
+    def _report(self, job, force=False):
+        now = time.monotonic()
+        if force or now - self._last_report.get(job.id, 0) >= self.REPORT_INTERVAL:
+            self._last_report[job.id] = now
+            self.job_changed.emit(job)
+
+    def _plan(self, job):
+        # Top-level (source, destination) pairs; totals come from an lstat walk of everything that will be copied
+        items = []
+        for src in job.sources:
+            src = os.path.normpath(src)
+            dst = os.path.join(job.dest_dir, os.path.basename(src))
+            if os.path.normpath(dst) == src:
+                continue
+            if job.resumed and job.mode == 'move' and not os.path.lexists(src) and os.path.lexists(dst):
+                # Moved before the interruption
+                continue
+            if os.path.isdir(src) and not os.path.islink(src) and \
+                    os.path.commonpath([src, os.path.abspath(job.dest_dir)]) == src:
+                job.errors.append(f'{src}: cannot {job.mode} a folder into itself')
+                continue
+            items.append((src, dst))
+        if job.mode == 'move':
+            renames, copies = self._group_moves(items, job.dest_dir)
+            job.files_total += len(renames)
+        else:
+            renames, copies = [], items
+        for src, dst in copies:
+            job.checkpoint()
+            files, size = self._measure(src)
+            job.files_total += files
+            job.bytes_total += size
+            self._report(job)
+        return renames, copies
+
+    @staticmethod
+    def _group_moves(items, dest_dir):
+        # Items on the destination's device are renamed in place (one entry each, whatever their size);
+        # the rest stream through the copy pipeline
+        try:
+            dest_dev = os.stat(dest_dir).st_dev
+        except OSError:
+            return [], items
+        renames, copies = [], []
+        for src, dst in items:
+            try:
+                same = os.lstat(src).st_dev == dest_dev
+            except OSError:
+                # Let the rename report it
+                same = True
+            (renames if same else copies).append((src, dst))
+        return renames, copies
+
+    def _measure(self, path):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return 0, 0
+        if not stat.S_ISDIR(st.st_mode):
+            return 1, self.transfer_size(st)
+        files = size = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+                try:
+                    size += self.transfer_size(os.lstat(os.path.join(dirpath, name)))
+                    files += 1
+                except OSError:
+                    pass
+        return files, size
+
+    @classmethod
+    def is_sparse(cls, st):
+        return (stat.S_ISREG(st.st_mode) and st.st_size >= cls.SPARSE_MIN_SIZE
+                and getattr(st, 'st_blocks', None) is not None and st.st_blocks * 512 < st.st_size)
+
+    @classmethod
+    def transfer_size(cls, st):
+        # Sparse files only move their allocated bytes, so progress is measured against those
+        return st.st_blocks * 512 if cls.is_sparse(st) else st.st_size
+
+    def _run(self, job):
+        if job.resumed and self.journal:
+            job.completed, job.offsets = self.journal.state(job.journal_id)
+        if job.mode == 'sync':
+            self._run_sync(job)
+            return
+        if job.mode == 'verify':
+            self._run_verify(job)
+            return
+        renames, copies = self._plan(job)
+        for src, dst in renames:
+            job.checkpoint()
+            try:
+                self._rename(job, src, dst)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    job.errors.append(f'{src}: {e.strerror or e}')
+                    continue
+                # Same device but another mount (a bind mount, for one): it has to be copied after all
+                files, size = self._measure(src)
+                with job.lock:
+                    job.files_total += files - 1
+                    job.bytes_total += size
+                copies.append((src, dst))
+            self._report(job)
+        for src, dst in copies:
+            job.checkpoint()
+            try:
+                self._copy_tree(job, src, dst)
+            except OSError as e:
+                job.errors.append(f'{src}: {e.strerror or e}')
+            self._report(job, True)
+
+    def _rename(self, job, src, dst):
+        if os.path.isdir(dst) and not os.path.islink(dst) and not job.resumed:
+            raise OSError(errno.EEXIST, f'{dst} already exists')
+        os.rename(src, dst)
+        with job.lock:
+            job.files_done += 1
+
+    def plan_sync(self, sources, dest_dir, use_hash=False, mirror=False, checkpoint=None):
+        # Returns ([(action, source, destination, bytes)], unchanged file count). Actions are 'mkdir', 'copy' for
+        # new files, 'update' for changed ones and, when mirroring, 'delete' for destination entries that are
+        # not in the source; a folder's 'mkdir' always comes before its contents.
+        actions = []
+        unchanged = 0
+        for src in sources:
+            src = os.path.normpath(src)
+            dst = os.path.join(dest_dir, os.path.basename(src))
+            if os.path.normpath(dst) == src:
+                continue
+            stack = [(src, dst)]
+            while stack:
+                if checkpoint:
+                    checkpoint()
+                src, dst = stack.pop()
+                try:
+                    st = os.lstat(src)
+                except OSError:
+                    continue
+                try:
+                    dst_st = os.lstat(dst)
+                except FileNotFoundError:
+                    dst_st = None
+                if dst_st is not None and stat.S_ISDIR(dst_st.st_mode) != stat.S_ISDIR(st.st_mode):
+                    # A folder replaced by a file or the other way round
+                    actions.append(('delete', None, dst, self._measure(dst)[1]))
+                    dst_st = None
+                if not stat.S_ISDIR(st.st_mode):
+                    if dst_st is None:
+                        actions.append(('copy', src, dst, self.transfer_size(st)))
+                    elif self._same_file(src, dst, st, dst_st, use_hash, checkpoint):
+                        unchanged += 1
+                    else:
+                        actions.append(('update', src, dst, self.transfer_size(st)))
+                    continue
+                try:
+                    names = os.listdir(src)
+                except OSError:
+                    continue
+                if dst_st is None:
+                    actions.append(('mkdir', src, dst, 0))
+                elif mirror:
+                    try:
+                        extra = set(os.listdir(dst)).difference(names)
+                    except OSError:
+                        extra = ()
+                    for name in sorted(extra):
+                        path = os.path.join(dst, name)
+                        actions.append(('delete', None, path, self._measure(path)[1]))
+                # Reversed onto the stack so entries come out in name order
+                for name in sorted(names, reverse=True):
+                    stack.append((os.path.join(src, name), os.path.join(dst, name)))
+        return actions, unchanged
+
+    def _same_file(self, src, dst, st, dst_st, use_hash, checkpoint=None):
+        if stat.S_IFMT(st.st_mode) != stat.S_IFMT(dst_st.st_mode):
+            return False
+        if stat.S_ISLNK(st.st_mode):
+            return os.readlink(src) == os.readlink(dst)
+        if st.st_size != dst_st.st_size:
+            return False
+        if use_hash:
+            return self.file_digest(src, checkpoint) == self.file_digest(dst, checkpoint)
+        return abs(st.st_mtime_ns - dst_st.st_mtime_ns) < self.MTIME_WINDOW_NS
+
+    @classmethod
+    def file_digest(cls, path, checkpoint=None):
+        digest = hashlib.blake2b()
+        with open(path, 'rb') as f:
+            while True:
+                if checkpoint:
+                    checkpoint()
+                chunk = f.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _run_sync(self, job):
+        actions = job.plan
+        if actions is None:
+            # Resumed from the journal: compare again, finished files now match
+            actions, _ = self.plan_sync(job.sources, job.dest_dir, job.use_hash, job.mirror, job.checkpoint)
+        job.files_total = sum(1 for action in actions if action[0] != 'mkdir')
+        job.bytes_total = sum(size for action, _, _, size in actions if action in ('copy', 'update'))
+        self._report(job, True)
+        # Deletions first: they free space and clear the way where a file became a folder or back
+        dirs, files = [], []
+        for action, src, dst, size in actions:
+            if action == 'delete':
+                job.checkpoint()
+                try:
+                    if os.path.isdir(dst) and not os.path.islink(dst):
+                        shutil.rmtree(dst)
+                    else:
+                        os.remove(dst)
+                except OSError as e:
+                    job.errors.append(f'{dst}: {e.strerror or e}')
+                with job.lock:
+                    job.files_done += 1
+                self._report(job)
+            elif action == 'mkdir':
+                dirs.append((src, dst))
+            else:
+                files.append((action, src, dst))
+        for src, dst in dirs:
+            job.checkpoint()
+            try:
+                os.makedirs(dst, exist_ok=True)
+            except OSError as e:
+                job.errors.append(f'{dst}: {e.strerror or e}')
+        def sync_one(item):
+            action, src, dst = item
+            st = os.lstat(src)
+            if action == 'update':
+                # Written next to the old version and swapped in, so a failed update leaves the old one intact
+                part = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.part')
+                if os.path.lexists(part):
+                    os.remove(part)
+                self._copy_entry(job, src, part, st)
+                os.replace(part, dst)
+                with job.lock:
+                    if part in job.digests:
+                        job.digests[dst] = job.digests.pop(part)
+            else:
+                self._copy_entry(job, src, dst, st)
+            # Sync compares modification times next time, so they are set right away
+            self._copy_metadata([(src, dst)])
+        if files:
+            try:
+                devices = (os.lstat(files[0][1]).st_dev, os.stat(job.dest_dir).st_dev)
+            except OSError:
+                devices = (0, 0)
+            self._parallel(job, sync_one, files, self.pool_size(*devices))
+        self._copy_metadata(reversed(dirs))
+
+    def _write_manifest(self, job):
+        path = os.path.join(job.dest_dir, self.MANIFEST_NAME)
+        try:
+            with open(path, 'a', encoding='utf-8', errors='surrogateescape') as f:
+                for dst, digest in job.digests.items():
+                    name = os.path.relpath(dst, job.dest_dir)
+                    if '\\' in name or '\n' in name:
+                        # b2sum's escaping: a leading backslash, then \\ and \n in the name
+                        f.write('\\' + digest + '  ' + name.replace('\\', '\\\\').replace('\n', '\\n') + '\n')
+                    else:
+                        f.write(digest + '  ' + name + '\n')
+        except OSError as e:
+            job.errors.append(f'{path}: {e.strerror or e}')
+
+    @staticmethod
+    def read_manifest(path):
+        # {absolute path: digest}; a file listed twice (appended by a later copy) keeps its last digest
+        entries = {}
+        base = os.path.dirname(path)
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                escaped = line.startswith('\\')
+                digest, sep, name = line[escaped:].partition('  ')
+                if not sep or not digest:
+                    continue
+                if escaped:
+                    name = re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), name)
+                entries[os.path.join(base, name)] = digest
+        return entries
+
+    def _run_verify(self, job):
+        # Checks files against manifests written by earlier copies: only the files themselves are read
+        entries = {}
+        for manifest in job.sources:
+            try:
+                entries.update(self.read_manifest(manifest))
+            except OSError as e:
+                job.errors.append(f'{manifest}: {e.strerror or e}')
+        job.files_total = len(entries)
+        for path in entries:
+            try:
+                job.bytes_total += os.path.getsize(path)
+            except OSError:
+                pass
+        self._report(job, True)
+        def verify_one(item):
+            path, expected = item
+            job.current_file = path
+            digest = hashlib.blake2b()
+            with open(path, 'rb') as f:
+                while True:
+                    job.checkpoint()
+                    chunk = f.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    self._advance(job, len(chunk))
+            if digest.hexdigest() != expected:
+                raise OSError(errno.EIO, 'checksum mismatch', path)
+            with job.lock:
+                job.files_done += 1
+        devices = [os.stat(job.dest_dir).st_dev] * 2 if os.path.isdir(job.dest_dir) else [0, 0]
+        self._parallel(job, verify_one, entries.items(), self.pool_size(*devices))
+
+    @staticmethod
+    def is_rotational(dev):
+        # /sys/dev/block/MAJ:MIN points at the partition; the queue settings live on the whole disk
+        try:
+            path = os.path.realpath(f'/sys/dev/block/{os.major(dev)}:{os.minor(dev)}')
+        except (AttributeError, OSError):
+            return False
+        for candidate in (path, os.path.dirname(path)):
+            try:
+                with open(os.path.join(candidate, 'queue', 'rotational')) as f:
+                    return f.read().strip() == '1'
+            except OSError:
+                continue
+        return False
+
+    def pool_size(self, src_dev, dst_dev):
+        if self.copy_threads:
+            return self.copy_threads
+        # Parallel small-file copies hide per-file latency on SSDs but only add seeks on spinning disks
+        if self.is_rotational(src_dev) or self.is_rotational(dst_dev):
+            return self.HDD_THREADS
+        return self.SSD_THREADS
+
+    def _copy_tree(self, job, src, dst):
+        # Directory skeleton first, then files on a thread pool, then metadata in batches: files on the pool,
+        # directories last and deepest first so their times are not touched again by later writes.
+        # Moves remove each source file as soon as its copy is safely written, then the emptied source folders.
+        st = os.lstat(src)
+        if not stat.S_ISDIR(st.st_mode):
+            self._copy_entry(job, src, dst, st)
+            if job.mode != 'move':
+                self._copy_metadata([(src, dst)])
+            return
+        self._mkdir(job, dst)
+        dirs = [(src, dst)]
+        files = []
+        i = 0
+        while i < len(dirs):
+            job.checkpoint()
+            src_dir, dst_dir = dirs[i]
+            i += 1
+            try:
+                with os.scandir(src_dir) as it:
+                    entries = list(it)
+            except OSError as e:
+                job.errors.append(f'{src_dir}: {e.strerror or e}')
+                continue
+            for entry in entries:
+                target = os.path.join(dst_dir, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        self._mkdir(job, target)
+                        dirs.append((entry.path, target))
+                    else:
+                        files.append((entry.path, target, entry.stat(follow_symlinks=False)))
+                except OSError as e:
+                    job.errors.append(f'{entry.path}: {e.strerror or e}')
+        threads = self.pool_size(st.st_dev, os.stat(os.path.dirname(dst) or '.').st_dev)
+        copied = []
+        def copy_one(item):
+            self._copy_entry(job, *item)
+            if job.mode != 'move':
+                copied.append(item[:2])
+        self._parallel(job, copy_one, files, threads)
+        batches = [copied[k:k + self.METADATA_BATCH] for k in range(0, len(copied), self.METADATA_BATCH)]
+        self._parallel(job, self._copy_metadata, batches, threads)
+        self._copy_metadata(reversed(dirs))
+        if job.mode == 'move':
+            for src_dir, _ in reversed(dirs):
+                try:
+                    os.rmdir(src_dir)
+                except OSError:
+                    # Still holds files that failed to copy
+                    pass
+
+    def _mkdir(self, job, path):
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            if not (job.resumed and os.path.isdir(path) and not os.path.islink(path)):
+                raise
+
+    def _parallel(self, job, func, items, threads):
+        # A bounded number of tasks in flight keeps memory flat for trees with millions of files
+        if threads <= 1:
+            for item in items:
+                job.checkpoint()
+                try:
+                    func(item)
+                except OSError as e:
+                    job.errors.append(f'{e.filename or item}: {e.strerror or e}')
+            return
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            pending = set()
+            try:
+                for item in items:
+                    job.checkpoint()
+                    pending.add(pool.submit(func, item))
+                    if len(pending) >= threads * 4:
+                        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        self._collect(job, done)
+                done, pending = concurrent.futures.wait(pending)
+                self._collect(job, done)
+            except TransferCancelled:
+                for future in pending:
+                    future.cancel()
+                raise
+
+    def _collect(self, job, futures):
+        for future in futures:
+            try:
+                future.result()
+            except OSError as e:
+                job.errors.append(f'{e.filename}: {e.strerror or e}')
+
+    def _copy_metadata(self, pairs):
+        # Mode, times, flags and extended attributes; the link itself for symlinks
+        for src, dst in pairs:
+            try:
+                shutil.copystat(src, dst, follow_symlinks=False)
+            except (OSError, NotImplementedError):
+                pass
+
+    def _copy_entry(self, job, src, dst, st):
+        if dst in job.completed and self._intact(dst, st):
+            self._advance(job, self.transfer_size(st))
+        elif stat.S_ISLNK(st.st_mode):
+            if job.resumed and os.path.lexists(dst):
+                os.remove(dst)
+            os.symlink(os.readlink(src), dst)
+            self._advance(job, st.st_size)
+        elif stat.S_ISREG(st.st_mode):
+            self._copy_file(job, src, dst, st)
+        else:
+            raise OSError(errno.EINVAL, 'not a regular file', src)
+        if job.mode == 'move':
+            # The copy (fsynced by _copy_file) carries the metadata before the source goes away
+            self._copy_metadata([(src, dst)])
+            os.remove(src)
+        if self.journal and job.journal_id is not None:
+            self.journal.file_done(job, dst)
+        with job.lock:
+            job.files_done += 1
+        self._report(job)
+
+    @staticmethod
+    def _intact(dst, st):
+        try:
+            copy = os.lstat(dst)
+        except OSError:
+            return False
+        return stat.S_IFMT(copy.st_mode) == stat.S_IFMT(st.st_mode) and (
+            stat.S_ISLNK(st.st_mode) or copy.st_size == st.st_size)
+
+    def _resume_offset(self, job, fsrc, fdst, dst, st):
+        # The journal only trusts data that was fsynced; the last committed chunk is compared with the source
+        # before copying carries on after it
+        size, mtime_ns, offset = job.offsets.get(dst, (None, None, 0))
+        if not offset or (size, mtime_ns) != (st.st_size, st.st_mtime_ns) or os.fstat(fdst).st_size < offset:
+            return 0
+        length = min(self.CHUNK_SIZE, offset)
+        if os.pread(fsrc, length, offset - length) != os.pread(fdst, length, offset - length):
+            return 0
+        return offset
+
+    def _copy_file(self, job, src, dst, st):
+        job.current_file = src
+        job.current_size = self.transfer_size(st)
+        job.current_done = 0
+        copied = [0]
+        start = 0
+        # Large files commit their progress to the journal so an interrupted copy continues where it stopped.
+        # Sparse copies skip holes, so their byte count is no file offset and they always start over.
+        journaled = (self.journal is not None and job.journal_id is not None
+                     and st.st_size >= self.JOURNAL_MIN_SIZE and not self.is_sparse(st))
+        committed = [0]
+        def progress(n):
+            copied[0] += n
+            job.current_done = start + copied[0]
+            self._advance(job, n)
+            if journaled and start + copied[0] - committed[0] >= self.COMMIT_INTERVAL:
+                committed[0] = start + copied[0]
+                os.fsync(fdst)
+                self.journal.commit_offset(job, dst, st, committed[0])
+        flags = getattr(os, 'O_BINARY', 0)
+        resuming = dst in job.offsets
+        try:
+            # Raw descriptors: for trees of tiny files the per-file overhead is what matters
+            fsrc = os.open(src, os.O_RDONLY | flags)
+            try:
+                # Resumed and verified copies read the destination back
+                access = os.O_RDWR if resuming or job.verify else os.O_WRONLY
+                fdst = os.open(dst, access | (0 if resuming else os.O_TRUNC) | os.O_CREAT | flags, 0o666)
+                try:
+                    if resuming:
+                        start = committed[0] = self._resume_offset(job, fsrc, fdst, dst, st)
+                        os.ftruncate(fdst, start)
+                        job.current_done = start
+                        self._advance(job, start)
+                    if job.verify:
+                        backend = 'read/write, verified'
+                        digest = self._copy_hashed(job, fsrc, fdst, st, progress, start)
+                        self._verify_copy(job, fdst, digest)
+                        with job.lock:
+                            job.digests[dst] = digest.hexdigest()
+                    else:
+                        backend = self._copy_data(job, fsrc, fdst, st, progress, copied, start)
+                    # Sparse copies count the bytes of the data extents, which need not add up to the
+                    # allocated size the file was charged with; a finished file counts in full
+                    rest = job.current_size - start - copied[0]
+                    if rest > 0:
+                        copied[0] += rest
+                        job.current_done = job.current_size
+                        self._advance(job, rest)
+                    if job.mode == 'move':
+                        # The source is deleted next, so the copy has to be on disk first. Fsyncing a newly
+                        # created file also commits its directory entry on ext4, XFS and Btrfs.
+                        os.fsync(fdst)
+                finally:
+                    os.close(fdst)
+            finally:
+                os.close(fsrc)
+            with job.lock:
+                job.backends[backend] += 1
+        except BaseException as e:
+            if job._suspended:
+                # Stopped by shutdown: the journal knows how much of the file can be trusted
+                raise
+            # Never leave a truncated file behind
+            self._advance(job, -(start + copied[0]))
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            if isinstance(e, OSError) and not e.filename:
+                e.filename = src
+            raise
+
+    def _copy_data(self, job, fsrc, fdst, st, progress, copied, start=0):
+        # Backends in order of preference: a copy-on-write clone, in-kernel copies, then a userspace loop.
+        # A backend that fails before copying anything is skipped for this pair of devices from then on.
+        # A resumed copy continues at start in both files.
+        if st.st_size == 0:
+            return 'empty'
+        devices = (st.st_dev, os.fstat(fdst).st_dev)
+        backends = [('reflink', self._copy_reflink), ('copy_file_range', self._copy_range), ('sendfile', self._copy_sendfile)]
+        if start:
+            os.lseek(fsrc, start, os.SEEK_SET)
+            os.lseek(fdst, start, os.SEEK_SET)
+        elif self.is_sparse(st) and hasattr(os, 'SEEK_DATA'):
+            # After a clone (which keeps holes by itself), copy only the data extents of sparse files
+            backends[1:] = [('sparse', self._copy_sparse)]
+        for name, copy in backends:
+            if (name, devices) in self._unsupported:
+                continue
+            try:
+                copy(job, fsrc, fdst, st.st_size, progress, start)
+                return name
+            except OSError as e:
+                if copied[0]:
+                    raise
+                if e.errno in self.UNSUPPORTED:
+                    self._unsupported.add((name, devices))
+                elif e.errno not in self.CALL_UNSUPPORTED.get(name, ()):
+                    raise
+        self._copy_loop(job, fsrc, fdst, st.st_size, progress, start)
+        return 'read/write'
+
+    def _copy_hashed(self, job, fsrc, fdst, st, progress, start=0):
+        # Kernel copies never show the data to this process, so verified copies go through the userspace
+        # loops and hash the very buffers that are written; holes of sparse files hash as zeros.
+        digest = hashlib.blake2b()
+        if start:
+            # Data copied before a resume is hashed from the source once more
+            self._hash_fd(job, fsrc, digest, 0, start)
+            os.lseek(fsrc, start, os.SEEK_SET)
+            os.lseek(fdst, start, os.SEEK_SET)
+        elif self.is_sparse(st) and hasattr(os, 'SEEK_DATA'):
+            self._copy_sparse(job, fsrc, fdst, st.st_size, progress, 0, digest)
+            return digest
+        self._copy_loop(job, fsrc, fdst, st.st_size, progress, start, digest)
+        return digest
+
+    def _hash_fd(self, job, fd, digest, offset, end):
+        while offset < end:
+            job.checkpoint()
+            chunk = os.pread(fd, min(self.CHUNK_SIZE, end - offset), offset)
+            if not chunk:
+                break
+            digest.update(chunk)
+            offset += len(chunk)
+        return offset
+
+    def _verify_copy(self, job, fdst, digest):
+        # Read back from the disk rather than from the page cache that the writes just filled
+        os.fsync(fdst)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fdst, 0, 0, os.POSIX_FADV_DONTNEED)
+        check = hashlib.blake2b()
+        self._hash_fd(job, fdst, check, 0, os.fstat(fdst).st_size)
+        if check.digest() != digest.digest():
+            raise OSError(errno.EIO, 'the copy does not match the source (checksum mismatch)')
+
+    def _advance(self, job, n):
+        with job.lock:
+            job.bytes_done += n
+        self._report(job)
+
+    def _copy_reflink(self, job, fsrc, fdst, size, progress, start=0):
+        if not HAS_FCNTL:
+            raise OSError(errno.ENOSYS, 'reflink is not available')
+        job.checkpoint()
+        # A clone always covers the whole file, including any part copied before a resume. It is charged
+        # like any other copy, which for sparse files is their allocated size rather than their length.
+        fcntl.ioctl(fdst, self.FICLONE, fsrc)
+        progress(self.transfer_size(os.fstat(fsrc)) - start)
+
+    def _copy_sparse(self, job, fsrc, fdst, size, progress, start=0, digest=None):
+        offset = start
+        in_kernel = hasattr(os, 'copy_file_range') and digest is None
+        zeros = memoryview(bytes(self.CHUNK_SIZE)) if digest else None
+        hashed = offset
+        while offset < size:
+            job.checkpoint()
+            try:
+                data = os.lseek(fsrc, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # Only a hole is left
+                    break
+                raise
+            end = min(os.lseek(fsrc, data, os.SEEK_HOLE), size)
+            if digest:
+                hashed = self._hash_zeros(digest, zeros, hashed, data)
+            while data < end:
+                job.checkpoint()
+                count = min(self.CHUNK_SIZE, end - data)
+                n = 0
+                if in_kernel:
+                    try:
+                        n = os.copy_file_range(fsrc, fdst, count, data, data)
+                    except OSError as e:
+                        if e.errno not in self.UNSUPPORTED and e.errno not in self.CALL_UNSUPPORTED['copy_file_range']:
+                            raise
+                        in_kernel = False
+                if not n:
+                    chunk = os.pread(fsrc, count, data)
+                    if not chunk:
+                        break
+                    n = os.pwrite(fdst, chunk, data)
+                    if digest:
+                        digest.update(memoryview(chunk)[:n])
+                        hashed = data + n
+                data += n
+                progress(n)
+            offset = end
+        if digest:
+            self._hash_zeros(digest, zeros, hashed, size)
+        # Extends the file over a trailing hole without allocating it
+        os.ftruncate(fdst, size)
+
+    @staticmethod
+    def _hash_zeros(digest, zeros, offset, end):
+        while offset < end:
+            n = min(len(zeros), end - offset)
+            digest.update(zeros[:n])
+            offset += n
+        return offset
+
+    def _copy_range(self, job, fsrc, fdst, size, progress, start=0):
+        if not hasattr(os, 'copy_file_range'):
+            raise OSError(errno.ENOSYS, 'copy_file_range is not available')
+        done = start
+        # Copies the size seen by stat; stopping there saves the final zero-length call per file
+        while done < size:
+            job.checkpoint()
+            n = os.copy_file_range(fsrc, fdst, min(self.CHUNK_SIZE, size - done))
+            if n == 0:
+                # Some file systems (procfs, older FUSE) report end of file without copying anything
+                if done == start:
+                    raise OSError(errno.EINVAL, 'copy_file_range copied nothing')
+                break
+            done += n
+            progress(n)
+
+    def _copy_sendfile(self, job, fsrc, fdst, size, progress, start=0):
+        if not hasattr(os, 'sendfile'):
+            raise OSError(errno.ENOSYS, 'sendfile is not available')
+        offset = start
+        while offset < size:
+            job.checkpoint()
+            n = os.sendfile(fdst, fsrc, offset, min(self.CHUNK_SIZE, size - offset))
+            if n == 0:
+                if offset == start:
+                    raise OSError(errno.EINVAL, 'sendfile copied nothing')
+                break
+            offset += n
+            progress(n)
+
+    def _copy_loop(self, job, fsrc, fdst, size, progress, start=0, digest=None):
+        if hasattr(os, 'posix_fallocate') and size > start:
+            try:
+                # Reserve the space up front: fails early when the disk is full and limits fragmentation
+                os.posix_fallocate(fdst, start, size - start)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+        buf = bytearray(min(self.CHUNK_SIZE, max(size - start, 1)))
+        view = memoryview(buf)
+        reader = io.FileIO(fsrc, closefd=False)
+        writer = io.FileIO(fdst, 'w', closefd=False)
+        written = start
+        while True:
+            job.checkpoint()
+            n = reader.readinto(buf)
+            if not n:
+                break
+            chunk = view[:n]
+            if digest:
+                digest.update(chunk)
+            while chunk:
+                chunk = chunk[writer.write(chunk):]
+            written += n
+            progress(n)
+        # Preallocation may have reserved more than was read if the source shrank meanwhile
+        os.ftruncate(fdst, written)
+
 class FolderSizeDelegate(QStyledItemDelegate):
-    def __init__(self, model, parent=None):
+    def __init__(self, model, engine, parent=None):
         super().__init__(parent)
         self.model = model
-        self.folder_size_cache = {}
+        self.engine = engine
 
-    def displayText(self, value, locale):
-        # value is the default file size (for files), or blank for folders
-        index = self.parent().currentIndex()
-        if not index.isValid():
-            return value
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
         model = index.model()
         if hasattr(model, 'isDir') and model.isDir(index):
+            # Never walk the folder in the paint path: ask the engine and show a placeholder
             folder_path = model.filePath(index)
-            if folder_path in self.folder_size_cache:
-                size = self.folder_size_cache[folder_path]
+            size = self.engine.get(folder_path)
+            if size is None:
+                self.engine.request(folder_path)
+                option.text = 'Calculating…'
             else:
-                size = self.get_folder_size(folder_path)
-                self.folder_size_cache[folder_path] = size
-            return self.human_readable_size(size)
-        else:
-            # For files, use the default value
-            try:
-                size = int(value)
-                return self.human_readable_size(size)
-            except Exception:
-                return value
+                option.text = self.human_readable_size(size)
 
-    def get_folder_size(self, folder):
-        total = 0
-        for dirpath, dirnames, filenames in os.walk(folder):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                try:
-                    total += os.path.getsize(fp)
-                except Exception:
-                    pass
-        return total
+    def displayText(self, value, locale):
+        # value is the default file size (for files); folders are handled in initStyleOption
+        try:
+            size = int(value)
+            return self.human_readable_size(size)
+        except Exception:
+            return value
 
     def human_readable_size(self, size, decimal_places=2):
-        for unit in ['B','KB','MB','GB','TB']:
-            if size < 1024.0:
-                return f"{size:.{decimal_places}f} {unit}"
-            size /= 1024.0
-        return f"{size:.{decimal_places}f} PB"
+        return human_readable_size(size, decimal_places)
 class RecentHistoryDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -134,7 +1795,7 @@ class RecentHistoryDialog(QDialog):
                     json.dump(recent, f)
                 self.populate()
 class OptionsDialog(QDialog):
-    def __init__(self, parent=None, show_folder_sizes=False, current_theme=None, current_style=None):
+    def __init__(self, parent=None, show_folder_sizes=False, current_theme=None, current_style=None, size_cache_mb=64, model_folder_limit=200, search_threads=8, content_max_mb=16, content_extensions='', verify_copies=False, write_manifest=False):
         super().__init__(parent)
         self.setWindowTitle('Options')
         self.setMinimumWidth(300)
@@ -142,6 +1803,38 @@ class OptionsDialog(QDialog):
         self.folder_size_checkbox = QCheckBox('Show total size of folders')
         self.folder_size_checkbox.setChecked(show_folder_sizes)
         layout.addWidget(self.folder_size_checkbox)
+        # Memory limits
+        layout.addWidget(QLabel('Folder size cache limit (MB):'))
+        self.size_cache_spin = QSpinBox()
+        self.size_cache_spin.setRange(4, 8192)
+        self.size_cache_spin.setValue(size_cache_mb)
+        layout.addWidget(self.size_cache_spin)
+        layout.addWidget(QLabel('Release folder listings after loading (folders):'))
+        self.model_limit_spin = QSpinBox()
+        self.model_limit_spin.setRange(10, 100000)
+        self.model_limit_spin.setValue(model_folder_limit)
+        layout.addWidget(self.model_limit_spin)
+        layout.addWidget(QLabel('Search threads:'))
+        self.search_threads_spin = QSpinBox()
+        self.search_threads_spin.setRange(1, 64)
+        self.search_threads_spin.setValue(search_threads)
+        layout.addWidget(self.search_threads_spin)
+        layout.addWidget(QLabel('Content search: skip files larger than (MB):'))
+        self.content_max_spin = QSpinBox()
+        self.content_max_spin.setRange(1, 65536)
+        self.content_max_spin.setValue(content_max_mb)
+        layout.addWidget(self.content_max_spin)
+        layout.addWidget(QLabel('Content search: only these extensions (empty for all):'))
+        self.content_ext_edit = QLineEdit(content_extensions)
+        self.content_ext_edit.setPlaceholderText('txt, log, conf, ini')
+        layout.addWidget(self.content_ext_edit)
+        # Copy verification
+        self.verify_checkbox = QCheckBox('Verify copies (checksum the source while copying, then re-read the copy)')
+        self.verify_checkbox.setChecked(verify_copies)
+        layout.addWidget(self.verify_checkbox)
+        self.manifest_checkbox = QCheckBox(f'Write checksums to {TransferEngine.MANIFEST_NAME} in the destination')
+        self.manifest_checkbox.setChecked(write_manifest)
+        layout.addWidget(self.manifest_checkbox)
         # Theme toggle
         layout.addWidget(QLabel('Theme:'))
         self.theme_combo = QComboBox()
@@ -424,18 +2117,492 @@ class AboutDialog(QDialog):
             self.current_img = 'sierra'
         self.update_image()
 
-class SidebarSection:
-    FAVORITES = 'Favorites'
-    LIBRARIES = 'Libraries'
-    COMPUTER = 'Computer'
-    RECENT = 'Recent'
-    NETWORK = 'Network'
+def squarify(sizes, x, y, w, h):
+    # Squarified treemap layout; sizes must be sorted largest first
+    rects = []
+    total = sum(sizes)
+    if total <= 0 or w <= 0 or h <= 0:
+        return rects
+    scale = w * h / total
+    areas = [size * scale for size in sizes]
 
-class SidebarListWidget(QListWidget):
-    def __init__(self, parent=None, on_path_selected=None):
+    def worst(row, side):
+        row_sum = sum(row)
+        return max(max(row) * side * side / (row_sum * row_sum), row_sum * row_sum / (side * side * min(row)))
+
+    i = 0
+    while i < len(areas) and areas[i] > 0:
+        side = min(w, h)
+        row = [areas[i]]
+        i += 1
+        while i < len(areas) and areas[i] > 0 and worst(row + [areas[i]], side) <= worst(row, side):
+            row.append(areas[i])
+            i += 1
+        row_sum = sum(row)
+        if w >= h:
+            col_w = row_sum / h
+            cy = y
+            for area in row:
+                rects.append((x, cy, col_w, area / col_w))
+                cy += area / col_w
+            x += col_w
+            w -= col_w
+        else:
+            row_h = row_sum / w
+            cx = x
+            for area in row:
+                rects.append((cx, y, area / row_h, row_h))
+                cx += area / row_h
+            y += row_h
+            h -= row_h
+    return rects
+
+class TreemapWidget(QWidget):
+    activated = Signal(object)
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.setMaximumWidth(180)
-        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.setMinimumSize(300, 300)
+        self.setMouseTracking(True)
+        self.items = []
+        self.rects = []
+
+    def set_items(self, items):
+        # items: (label, size, payload) tuples, sorted largest first
+        self.items = [item for item in items if item[1] > 0]
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().color(QPalette.ColorRole.Base))
+        self.rects = squarify([item[1] for item in self.items], 0, 0, self.width(), self.height())
+        for i, ((label, size, payload), (x, y, w, h)) in enumerate(zip(self.items, self.rects)):
+            rect = QRectF(x, y, w, h)
+            color = QColor.fromHsv((i * 37) % 360, 110 if payload is not None else 30, 210)
+            painter.fillRect(rect, color)
+            painter.setPen(QColor(40, 40, 40))
+            painter.drawRect(rect)
+            if w > 60 and h > 18:
+                painter.drawText(rect.adjusted(4, 2, -4, -2), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, label)
+        painter.end()
+
+    def item_at(self, pos):
+        for item, (x, y, w, h) in zip(self.items, self.rects):
+            if x <= pos.x() < x + w and y <= pos.y() < y + h:
+                return item
+        return None
+
+    def mouseMoveEvent(self, event):
+        item = self.item_at(event.position())
+        if item:
+            QToolTip.showText(event.globalPosition().toPoint(), f'{item[0]}: {human_readable_size(item[1])}', self)
+        else:
+            QToolTip.hideText()
+
+    def mousePressEvent(self, event):
+        item = self.item_at(event.position())
+        if item and item[2] is not None:
+            self.activated.emit(item[2])
+
+class DiskUsageDialog(QDialog):
+    def __init__(self, path, engine, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Disk Usage')
+        self.setMinimumSize(900, 500)
+        self.engine = engine
+        self.index = None
+        self.node = 0
+        layout = QVBoxLayout()
+        nav_layout = QHBoxLayout()
+        self.up_btn = QPushButton('Up')
+        self.up_btn.clicked.connect(self.go_up)
+        self.path_label = QLabel(path)
+        nav_layout.addWidget(self.up_btn)
+        nav_layout.addWidget(self.path_label, 1)
+        layout.addLayout(nav_layout)
+        self.summary_label = QLabel('Scanning...')
+        layout.addWidget(self.summary_label)
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.list_widget = QTreeWidget()
+        self.list_widget.setRootIsDecorated(False)
+        self.list_widget.setHeaderLabels(['Name', 'Size', 'Allocated', 'Files', 'Share'])
+        self.list_widget.itemDoubleClicked.connect(self.on_item_double_clicked)
+        self.treemap = TreemapWidget()
+        self.treemap.activated.connect(self.show_node)
+        splitter.addWidget(self.list_widget)
+        splitter.addWidget(self.treemap)
+        splitter.setSizes([450, 450])
+        layout.addWidget(splitter)
+        btns = QDialogButtonBox(QDialogButtonBox.Close)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+        self.setLayout(layout)
+        found = engine.index_for(path)
+        if found:
+            self.index = found[0]
+            self.show_node(found[1])
+        else:
+            self.worker = DiskUsageWorker(path, engine.cache)
+            self.worker.found.connect(self.on_index_built)
+            self.worker.start()
+
+    def done(self, result):
+        if getattr(self, 'worker', None):
+            self.worker.stop()
+        super().done(result)
+
+    def on_index_built(self, index):
+        if index is None:
+            self.summary_label.setText('Scan failed.')
+            return
+        self.engine.add_index(index)
+        self.index = index
+        self.show_node(0)
+
+    def show_node(self, node):
+        index = self.index
+        self.node = node
+        total = index.bytes[node]
+        self.path_label.setText(index.path(node))
+        self.up_btn.setEnabled(node > 0)
+        self.summary_label.setText(
+            f'{human_readable_size(total)} in {index.files[node]} files, {len(index.children(node))} folders '
+            f'({human_readable_size(index.blocks[node] * 512)} allocated)'
+        )
+        entries = [(index.name(child), index.bytes[child], index.blocks[child], index.files[child], child) for child in index.children(node)]
+        if index.own_files[node]:
+            entries.append(('(files in this folder)', index.own_bytes[node], index.own_blocks[node], index.own_files[node], None))
+        entries.sort(key=lambda e: e[1], reverse=True)
+        self.list_widget.clear()
+        for name, size, blocks, files, child in entries:
+            share = f'{size * 100 / total:.1f} %' if total else '-'
+            item = QTreeWidgetItem([name, human_readable_size(size), human_readable_size(blocks * 512), str(files), share])
+            item.setData(0, Qt.ItemDataRole.UserRole, child)
+            for col in range(1, 5):
+                item.setTextAlignment(col, Qt.AlignmentFlag.AlignRight)
+            self.list_widget.addTopLevelItem(item)
+        self.list_widget.resizeColumnToContents(0)
+        self.treemap.set_items([(name, size, child) for name, size, blocks, files, child in entries])
+
+    def on_item_double_clicked(self, item, column):
+        child = item.data(0, Qt.ItemDataRole.UserRole)
+        if child is not None:
+            self.show_node(child)
+
+    def go_up(self):
+        if self.index and self.node > 0:
+            self.show_node(self.index.parent[self.node])
+
+class TransferQueueDialog(QDialog):
+    COLUMNS = ['Job', 'Status', 'Progress', 'Current file', 'Speed', 'Method']
+
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Transfers')
+        self.setMinimumSize(800, 300)
+        self.engine = engine
+        self.items = {}
+        layout = QVBoxLayout()
+        self.job_list = QTreeWidget()
+        self.job_list.setRootIsDecorated(False)
+        self.job_list.setHeaderLabels(self.COLUMNS)
+        self.job_list.setColumnWidth(0, 300)
+        self.job_list.setColumnWidth(2, 220)
+        self.job_list.itemSelectionChanged.connect(self.update_buttons)
+        layout.addWidget(self.job_list)
+        btn_layout = QHBoxLayout()
+        self.pause_btn = QPushButton('Pause')
+        self.resume_btn = QPushButton('Resume')
+        self.cancel_btn = QPushButton('Cancel')
+        self.up_btn = QPushButton('Move Up')
+        self.down_btn = QPushButton('Move Down')
+        self.clear_btn = QPushButton('Clear Finished')
+        self.pause_btn.clicked.connect(lambda: self.apply(engine.pause))
+        self.resume_btn.clicked.connect(lambda: self.apply(engine.resume))
+        self.cancel_btn.clicked.connect(lambda: self.apply(engine.cancel))
+        self.up_btn.clicked.connect(lambda: self.apply(lambda job: engine.move(job, -1)))
+        self.down_btn.clicked.connect(lambda: self.apply(lambda job: engine.move(job, 1)))
+        self.clear_btn.clicked.connect(self.clear_finished)
+        for btn in (self.pause_btn, self.resume_btn, self.cancel_btn, self.up_btn, self.down_btn):
+            btn_layout.addWidget(btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.clear_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+        engine.job_changed.connect(self.on_job_changed)
+        self.rebuild()
+
+    def selected_job(self):
+        item = self.job_list.currentItem()
+        return item.data(0, Qt.UserRole) if item else None
+
+    def apply(self, action):
+        job = self.selected_job()
+        if job:
+            action(job)
+
+    def clear_finished(self):
+        self.engine.clear_finished()
+        self.rebuild()
+
+    def rebuild(self):
+        # Rows follow the engine's queue order
+        selected = self.selected_job()
+        self.job_list.clear()
+        self.items = {}
+        for job in self.engine.jobs:
+            item = QTreeWidgetItem()
+            item.setData(0, Qt.UserRole, job)
+            self.job_list.addTopLevelItem(item)
+            self.items[job.id] = item
+            self.update_item(job)
+            if job is selected:
+                self.job_list.setCurrentItem(item)
+        self.update_buttons()
+
+    def on_job_changed(self, job):
+        order = [j.id for j in self.engine.jobs]
+        current = [self.job_list.topLevelItem(i).data(0, Qt.UserRole).id for i in range(self.job_list.topLevelItemCount())]
+        if order != current:
+            self.rebuild()
+        else:
+            self.update_item(job)
+            self.update_buttons()
+
+    def update_item(self, job):
+        item = self.items.get(job.id)
+        if item is None:
+            return
+        status = job.state
+        if job.errors:
+            status += f' ({len(job.errors)} error(s))'
+            item.setToolTip(1, '\n'.join(job.errors[:20]))
+        percent = int(job.bytes_done * 100 / job.bytes_total) if job.bytes_total else (100 if job.state == TransferJob.DONE else 0)
+        progress = (f'{percent}%  {human_readable_size(job.bytes_done)} / {human_readable_size(job.bytes_total)}  '
+                    f'({job.files_done}/{job.files_total} files)')
+        current = ''
+        if job.current_file:
+            file_percent = int(job.current_done * 100 / job.current_size) if job.current_size else 100
+            current = f'{os.path.basename(job.current_file)} ({file_percent}%)'
+        speed = f'{human_readable_size(job.speed())}/s' if job.started_at else ''
+        for column, text in enumerate([job.title(), status, progress, current, speed, job.backend_summary()]):
+            item.setText(column, text)
+        item.setToolTip(0, job.title())
+
+    def update_buttons(self):
+        job = self.selected_job()
+        active = bool(job and job.active())
+        self.pause_btn.setEnabled(active and job.state != TransferJob.PAUSED)
+        self.resume_btn.setEnabled(active and job.state == TransferJob.PAUSED)
+        self.cancel_btn.setEnabled(active)
+        self.up_btn.setEnabled(bool(job))
+        self.down_btn.setEnabled(bool(job))
+
+class SyncDialog(QDialog):
+    # Compares the sources with the destination in the background and lists what a sync would do
+    PREVIEW_LIMIT = 5000
+    LABELS = {'copy': 'New', 'update': 'Changed', 'delete': 'Delete'}
+
+    def __init__(self, engine, sources, dest_dir, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Sync')
+        self.setMinimumSize(750, 450)
+        self.engine = engine
+        self.sources = sources
+        self.dest_dir = dest_dir
+        self.actions = None
+        self.worker = None
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f'Sync {len(sources)} item(s) to {dest_dir}'))
+        self.hash_cb = QCheckBox('Compare file contents (slower, reads both sides)')
+        self.mirror_cb = QCheckBox('Delete files that are not in the source (mirror)')
+        for cb in (self.hash_cb, self.mirror_cb):
+            cb.toggled.connect(self.start_plan)
+            layout.addWidget(cb)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.action_list = QTreeWidget()
+        self.action_list.setRootIsDecorated(False)
+        self.action_list.setHeaderLabels(['Action', 'Path', 'Size'])
+        self.action_list.setColumnWidth(1, 520)
+        layout.addWidget(self.action_list)
+        self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.buttons.button(QDialogButtonBox.Ok).setText('Sync')
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+        self.setLayout(layout)
+        self.start_plan()
+
+    def start_plan(self):
+        self.stop_worker()
+        self.actions = None
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(False)
+        self.summary_label.setText('Comparing...')
+        self.action_list.clear()
+        self.worker = SyncPlanWorker(self.engine, self.sources, self.dest_dir, self.hash_cb.isChecked(), self.mirror_cb.isChecked())
+        self.worker.found.connect(self.on_plan_ready)
+        self.worker.start()
+
+    def stop_worker(self):
+        if self.worker:
+            self.worker.stop()
+            self.worker.wait()
+            self.worker = None
+
+    def done(self, result):
+        self.stop_worker()
+        super().done(result)
+
+    def on_plan_ready(self, actions, unchanged):
+        if self.sender() is not self.worker:
+            return
+        self.actions = actions
+        totals = collections.Counter()
+        counts = collections.Counter()
+        for action, _, _, size in actions:
+            counts[action] += 1
+            totals[action] += size
+        parts = [f'{counts[action]} {self.LABELS[action].lower()} ({human_readable_size(totals[action])})'
+                 for action in ('copy', 'update', 'delete') if counts[action]]
+        if not parts:
+            self.summary_label.setText(f'Everything is up to date ({unchanged} unchanged file(s)).')
+        else:
+            copy_bytes = totals['copy'] + totals['update']
+            self.summary_label.setText(', '.join(parts) + f', {unchanged} unchanged. '
+                                       f'{human_readable_size(copy_bytes)} to copy.')
+        shown = [a for a in actions if a[0] != 'mkdir'][:self.PREVIEW_LIMIT]
+        for action, src, dst, size in shown:
+            item = QTreeWidgetItem([self.LABELS[action], dst, human_readable_size(size)])
+            item.setTextAlignment(2, Qt.AlignmentFlag.AlignRight)
+            self.action_list.addTopLevelItem(item)
+        if len(shown) == self.PREVIEW_LIMIT:
+            self.action_list.addTopLevelItem(QTreeWidgetItem(['', f'(only the first {self.PREVIEW_LIMIT} actions are listed)', '']))
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(bool(parts))
+
+class TrashDialog(QDialog):
+    # Sizes come from the folder size engine (index or cache) and fill in as they are calculated
+    COLUMNS = ['Name', 'Original Location', 'Deleted', 'Size']
+
+    def __init__(self, trash, size_engine, purge, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Trash')
+        self.setMinimumSize(800, 400)
+        self.trash = trash
+        self.size_engine = size_engine
+        self.purge = purge
+        self.items = {}
+        layout = QVBoxLayout()
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.entry_list = QTreeWidget()
+        self.entry_list.setRootIsDecorated(False)
+        self.entry_list.setHeaderLabels(self.COLUMNS)
+        self.entry_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.entry_list.setColumnWidth(0, 220)
+        self.entry_list.setColumnWidth(1, 320)
+        self.entry_list.setSortingEnabled(True)
+        layout.addWidget(self.entry_list)
+        btn_layout = QHBoxLayout()
+        self.restore_btn = QPushButton('Restore')
+        self.delete_btn = QPushButton('Delete Permanently')
+        self.empty_btn = QPushButton('Empty Trash')
+        close_btn = QPushButton('Close')
+        self.restore_btn.clicked.connect(self.restore_selected)
+        self.delete_btn.clicked.connect(lambda: self.purge_entries(self.selected_entries()))
+        self.empty_btn.clicked.connect(lambda: self.purge_entries([self.entry_list.topLevelItem(i).data(0, Qt.UserRole)
+                                                                   for i in range(self.entry_list.topLevelItemCount())]))
+        close_btn.clicked.connect(self.close)
+        for btn in (self.restore_btn, self.delete_btn, self.empty_btn):
+            btn_layout.addWidget(btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+        size_engine.size_ready.connect(self.on_size_ready)
+        self.reload()
+
+    def reload(self):
+        self.entry_list.setSortingEnabled(False)
+        self.entry_list.clear()
+        self.items = {}
+        for entry in self.trash.entries():
+            item = QTreeWidgetItem([os.path.basename(entry.original), os.path.dirname(entry.original), entry.deleted, ''])
+            item.setData(0, Qt.UserRole, entry)
+            item.setTextAlignment(3, Qt.AlignmentFlag.AlignRight)
+            self.entry_list.addTopLevelItem(item)
+            self.items[entry.path] = item
+            if os.path.isdir(entry.path) and not os.path.islink(entry.path):
+                size = self.size_engine.get(entry.path)
+                if size is None:
+                    self.size_engine.request(entry.path, FolderSizeEngine.PRIORITY_BACKGROUND)
+            else:
+                try:
+                    size = os.lstat(entry.path).st_size
+                except OSError:
+                    size = 0
+            self.set_size(item, size)
+        self.entry_list.setSortingEnabled(True)
+        self.update_summary()
+
+    def set_size(self, item, size):
+        item.setData(3, Qt.UserRole, size)
+        item.setText(3, 'Calculating…' if size is None else human_readable_size(size))
+
+    def on_size_ready(self, path, size):
+        item = self.items.get(path)
+        if item is not None:
+            self.set_size(item, size)
+            self.update_summary()
+
+    def update_summary(self):
+        count = self.entry_list.topLevelItemCount()
+        sizes = [self.entry_list.topLevelItem(i).data(3, Qt.UserRole) for i in range(count)]
+        pending = ' (calculating…)' if None in sizes else ''
+        total = sum(size for size in sizes if size)
+        self.summary_label.setText(f'{count} item(s), {human_readable_size(total)}{pending}' if count else 'The trash is empty.')
+        self.empty_btn.setEnabled(bool(count))
+
+    def selected_entries(self):
+        return [item.data(0, Qt.UserRole) for item in self.entry_list.selectedItems()]
+
+    def restore_selected(self):
+        errors = []
+        for entry in self.selected_entries():
+            try:
+                self.trash.restore(entry)
+            except OSError as e:
+                errors.append(f'{entry.original}: {e.strerror or e}')
+        if errors:
+            QMessageBox.warning(self, 'Restore', 'Could not restore:\n' + '\n'.join(errors[:10]))
+        self.reload()
+
+    def purge_entries(self, entries):
+        if not entries:
+            return
+        reply = QMessageBox.question(self, 'Trash', f'Permanently delete {len(entries)} item(s)? This cannot be undone.',
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        for entry in entries:
+            item = self.items.pop(entry.path, None)
+            if item is not None:
+                self.entry_list.takeTopLevelItem(self.entry_list.indexOfTopLevelItem(item))
+        self.update_summary()
+        self.purge(entries)
+
+class SidebarSection:
+    FAVORITES = 'Favorites'
+    LIBRARIES = 'Libraries'
+    COMPUTER = 'Computer'
+    RECENT = 'Recent'
+    NETWORK = 'Network'
+
+class SidebarListWidget(QListWidget):
+    def __init__(self, parent=None, on_path_selected=None):
+        super().__init__(parent)
+        self.setMaximumWidth(180)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.on_context_menu)
         self.favorites = self.load_favorites()
         self.on_path_selected = on_path_selected
@@ -755,6 +2922,279 @@ class NotificationPopup(QWidget):
     def hide_with_animation(self):
         self.hide_anim.start()
 
+class SearchResultsModel(QAbstractTableModel):
+    # Results are stored compactly: each row is an interned parent folder id plus the end offset of its name in a
+    # per-batch name chunk. Size, date and type are stat'ed in a background thread only for rows the view asks
+    # about; sorting stats what it needs and builds the row permutation off the GUI thread.
+    COLUMNS = ['Name', 'Folder', 'Size', 'Modified', 'Type']
+    KIND_UNKNOWN, KIND_FILE, KIND_DIR, KIND_MISSING = range(4)
+    stats_ready = Signal(list)
+    sort_ready = Signal(int, object)
+
+    def __init__(self, results=None, message=None, content=False):
+        super().__init__()
+        self.message = message
+        self.content = content
+        # Content searches keep (line number, snippet) next to each row
+        self.hits = []
+        self._dirs = []
+        self._dir_ids = {}
+        self._row_dir = array('l')
+        self._name_ends = array('l')
+        self._chunks = []
+        self._chunk_rows = []
+        self._size = array('q')
+        self._mtime = array('d')
+        self._kind = bytearray()
+        self._order = None
+        self._position = None
+        self._sort_column = None
+        self._sort_order = Qt.AscendingOrder
+        self._sort_generation = 0
+        self._stat_queue = queue.Queue()
+        self._stat_pending = set()
+        self._stat_thread = None
+        self._stat_lock = threading.Lock()
+        self.stats_ready.connect(self._on_stats_ready)
+        self.sort_ready.connect(self._on_sort_ready)
+        if results:
+            self._add_rows(results, None)
+
+    def result_count(self):
+        return len(self._row_dir)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return max(1, len(self._row_dir))
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS) + (1 if self.content else 0)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section] if section < len(self.COLUMNS) else 'Match'
+
+    def _row_id(self, row):
+        return self._order[row] if self._order is not None else row
+
+    def name(self, rowid):
+        c = bisect.bisect_right(self._chunk_rows, rowid) - 1
+        start = 0 if rowid == self._chunk_rows[c] else self._name_ends[rowid - 1]
+        return self._chunks[c][start:self._name_ends[rowid]]
+
+    def folder(self, rowid):
+        return self._dirs[self._row_dir[rowid]]
+
+    def path(self, row):
+        rowid = self._row_id(row)
+        return os.path.join(self.folder(rowid), self.name(rowid))
+
+    def paths(self, count=None):
+        for rowid in range(len(self._row_dir) if count is None else count):
+            yield os.path.join(self.folder(rowid), self.name(rowid))
+
+    def filePath(self, index):
+        if not index.isValid() or index.row() >= len(self._row_dir):
+            return ''
+        return self.path(index.row())
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+        if not self._row_dir:
+            if role == Qt.DisplayRole and index.column() == 0:
+                return self.message or 'No results.'
+            return None
+        rowid = self._row_id(index.row())
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return self.name(rowid)
+            if column == 1:
+                return self.folder(rowid)
+            if column == 5:
+                line, snippet = self.hits[rowid]
+                return f'{line}:  {snippet}'
+            kind = self._kind[rowid]
+            if kind == self.KIND_UNKNOWN:
+                self._request_stat(rowid)
+                return ''
+            if kind == self.KIND_MISSING:
+                return ''
+            if column == 2:
+                return '' if kind == self.KIND_DIR else human_readable_size(self._size[rowid])
+            if column == 3:
+                return time.strftime('%Y-%m-%d %H:%M', time.localtime(self._mtime[rowid]))
+            if column == 4:
+                return self.type_name(rowid)
+        elif role == Qt.ToolTipRole:
+            if column == 5 or (self.content and column == 0):
+                return self.hits[rowid][1]
+            if column == 1:
+                return self.folder(rowid)
+        elif role == Qt.TextAlignmentRole and column == 2:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def type_name(self, rowid):
+        if self._kind[rowid] == self.KIND_DIR:
+            return 'Folder'
+        ext = os.path.splitext(self.name(rowid))[1]
+        return f'{ext[1:].upper()} File' if ext else 'File'
+
+    def _add_rows(self, paths, hits):
+        names = []
+        row_dir = []
+        dir_ids = self._dir_ids
+        for path in paths:
+            if os.altsep:
+                path = path.replace(os.altsep, os.sep)
+            # Unlike splitting at the last separator, this keeps the root's separator ('/', 'C:\\')
+            folder, name = os.path.split(path)
+            dir_id = dir_ids.get(folder)
+            if dir_id is None:
+                dir_id = dir_ids[folder] = len(self._dirs)
+                self._dirs.append(folder)
+            row_dir.append(dir_id)
+            names.append(name)
+        self._chunk_rows.append(len(self._row_dir))
+        self._row_dir.extend(row_dir)
+        self._name_ends.extend(itertools.accumulate(map(len, names)))
+        self._chunks.append(''.join(names))
+        self._size.extend([0] * len(paths))
+        self._mtime.extend([0.0] * len(paths))
+        self._kind.extend(bytes(len(paths)))
+        if hits:
+            self.hits.extend(hits)
+        if self._order is not None:
+            first = len(self._order)
+            self._order.extend(range(first, first + len(paths)))
+            self._position.extend(range(first, first + len(paths)))
+
+    def append_results(self, paths, hits=None):
+        if not paths:
+            return
+        start = len(self._row_dir)
+        if start == 0:
+            # Row 0 showed the message until now; it becomes the first result
+            if len(paths) > 1:
+                self.beginInsertRows(QModelIndex(), 1, len(paths) - 1)
+                self._add_rows(paths, hits)
+                self.endInsertRows()
+            else:
+                self._add_rows(paths, hits)
+            self.dataChanged.emit(self.index(0, 0), self.index(0, self.columnCount() - 1))
+        else:
+            self.beginInsertRows(QModelIndex(), start, start + len(paths) - 1)
+            self._add_rows(paths, hits)
+            self.endInsertRows()
+
+    def set_message(self, message):
+        self.message = message
+        if not self._row_dir:
+            self.dataChanged.emit(self.index(0, 0), self.index(0, 0))
+
+    def _stat_row(self, rowid):
+        try:
+            st = os.stat(os.path.join(self.folder(rowid), self.name(rowid)), follow_symlinks=False)
+        except OSError:
+            self._kind[rowid] = self.KIND_MISSING
+            return
+        self._size[rowid] = st.st_size
+        self._mtime[rowid] = st.st_mtime
+        self._kind[rowid] = self.KIND_DIR if stat.S_ISDIR(st.st_mode) else self.KIND_FILE
+
+    def _request_stat(self, rowid):
+        if rowid in self._stat_pending:
+            return
+        self._stat_pending.add(rowid)
+        self._stat_queue.put(rowid)
+        with self._stat_lock:
+            if self._stat_thread is None:
+                self._stat_thread = threading.Thread(target=self._stat_worker, daemon=True)
+                self._stat_thread.start()
+
+    def _stat_worker(self):
+        # Exits after a short idle period so an abandoned model does not keep a thread alive
+        while True:
+            try:
+                rows = [self._stat_queue.get(timeout=2)]
+            except queue.Empty:
+                with self._stat_lock:
+                    if self._stat_queue.empty():
+                        self._stat_thread = None
+                        return
+                continue
+            while len(rows) < 256:
+                try:
+                    rows.append(self._stat_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for rowid in rows:
+                if self._kind[rowid] == self.KIND_UNKNOWN:
+                    self._stat_row(rowid)
+            self.stats_ready.emit(rows)
+
+    def _on_stats_ready(self, rows):
+        self._stat_pending.difference_update(rows)
+        if self._position is not None:
+            rows = [self._position[rowid] for rowid in rows if rowid < len(self._position)]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 2), self.index(max(rows), 4))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort_column = column
+        self._sort_order = order
+        self._sort_generation += 1
+        count = len(self._row_dir)
+        if count > 1:
+            threading.Thread(target=self._sort_worker, args=(self._sort_generation, column, order, count), daemon=True).start()
+
+    def refresh_sort(self):
+        # Rows streamed in after the last sort sit at the end; sort again once the search is complete
+        if self._sort_column is not None:
+            self.sort(self._sort_column, self._sort_order)
+
+    def _sort_worker(self, generation, column, order, count):
+        if column in (2, 3, 4):
+            for rowid in range(count):
+                if generation != self._sort_generation:
+                    return
+                if self._kind[rowid] == self.KIND_UNKNOWN:
+                    self._stat_row(rowid)
+        if column == 0:
+            key = lambda rowid: (self.name(rowid).lower(), self.folder(rowid))
+        elif column == 1:
+            key = lambda rowid: (self.folder(rowid).lower(), self.name(rowid).lower())
+        elif column == 2:
+            key = lambda rowid: (self._kind[rowid] != self.KIND_DIR, self._size[rowid])
+        elif column == 3:
+            key = lambda rowid: self._mtime[rowid]
+        elif column == 4:
+            key = lambda rowid: (self._kind[rowid] != self.KIND_DIR, self.type_name(rowid), self.name(rowid).lower())
+        else:
+            key = lambda rowid: (self.hits[rowid][1].lower(), rowid)
+        rows = sorted(range(count), key=key, reverse=order == Qt.DescendingOrder)
+        if generation == self._sort_generation:
+            self.sort_ready.emit(generation, array('l', rows))
+
+    def _on_sort_ready(self, generation, rows):
+        if generation != self._sort_generation:
+            return
+        count = len(self._row_dir)
+        rows.extend(range(len(rows), count))
+        position = array('l', bytes(rows.itemsize * count))
+        for row, rowid in enumerate(rows):
+            position[rowid] = row
+        self.layoutAboutToBeChanged.emit()
+        for index in self.persistentIndexList():
+            if index.row() < count:
+                self.changePersistentIndex(index, self.index(position[self._row_id(index.row())], index.column()))
+        self._order = rows
+        self._position = position
+        self.layoutChanged.emit()
+
 class FileManager(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -768,6 +3208,12 @@ class FileManager(QMainWindow):
         self.setWindowTitle('Dolphy File Manager')
         self.setGeometry(100, 100, 1200, 600)
         self.show_folder_sizes = False
+        # Memory limits for cached folder sizes and loaded folder listings
+        self.size_cache_mb = 64
+        self.model_folder_limit = 200
+        self._model_loaded_dirs = set()
+        # Directory traversal threads for searches that are not answered by the index
+        self.search_threads = min(8, (os.cpu_count() or 2) * 2)
         # Theme and style state
         self.selected_theme = 'System'
         self.selected_style = 'Fusion'
@@ -775,11 +3221,58 @@ class FileManager(QMainWindow):
         self.history = []
         self.history_index = -1
 
-        # File system model (only create once)
-        self.model = QFileSystemModel()
-        self.model.setFilter(QDir.Filter.AllDirs | QDir.Filter.Files | QDir.Filter.NoDotAndDotDot)
+        # File system model (recreated by prune_model once too many folders are loaded)
         self.root_path = os.path.expanduser("~")
-        self.model.setRootPath(self.root_path)
+        self.model = self.create_model(self.root_path)
+        # Background folder sizes for the Size column
+        try:
+            size_cache = FolderSizeCache()
+        except sqlite3.Error:
+            size_cache = None
+        self.folder_size_engine = FolderSizeEngine(self, cache=size_cache, memory_budget=self.size_cache_mb * 1024 * 1024)
+        self.folder_size_engine.size_ready.connect(self.on_folder_size_ready)
+        # Persistent filename index for search; stale roots are rebuilt shortly after startup
+        try:
+            self.filename_index = FilenameIndex()
+        except sqlite3.Error:
+            self.filename_index = None
+        self.index_worker = None
+        self.fuzzy_worker = None
+        self.fuzzy_index = None
+        self.search_worker = None
+        self.search_query = None
+        self._retired_workers = []
+        # Live search: debounced keystrokes, superseded scans stopped, extended queries narrowed in memory
+        self.search_session = SearchSession(self)
+        self.search_session.triggered.connect(lambda: self.on_search(live=True))
+        # Content search limits; the process pool is created on the first content search
+        self.content_max_mb = 16
+        self.content_extensions = ''
+        self.content_pool = None
+        QTimer.singleShot(5000, self.refresh_stale_search_index)
+        self.cache_status_label = QLabel()
+        self.statusBar().addPermanentWidget(self.cache_status_label)
+        self.cache_status_timer = QTimer(self)
+        self.cache_status_timer.timeout.connect(self.update_cache_status)
+        self.cache_status_timer.start(2000)
+        # Copy and move jobs from paste and drag-and-drop; the journal lets interrupted jobs resume after a restart
+        try:
+            self.transfer_journal = TransferJournal()
+        except sqlite3.Error:
+            self.transfer_journal = None
+        self.transfer_engine = TransferEngine(self, journal=self.transfer_journal)
+        self.transfer_engine.job_changed.connect(self.update_transfer_status)
+        self.transfer_engine.job_finished.connect(self.on_transfer_finished)
+        self.transfer_dialog = None
+        # Move to Trash renames into the freedesktop trash; emptying it runs as a niced background delete
+        self.trash = Trash()
+        self.trash_dialog = None
+        self.purge_workers = []
+        # Archives being built or extracted in the background
+        self.archive_workers = []
+        self.transfer_status_label = QLabel()
+        self.statusBar().addPermanentWidget(self.transfer_status_label)
+        QTimer.singleShot(0, self.offer_transfer_resume)
 
         # Toolbar
         self.toolbar = QToolBar()
@@ -816,16 +3309,26 @@ class FileManager(QMainWindow):
 
         # --- Search UI ---
         self.search_bar = QLineEdit()
-        self.search_bar.setPlaceholderText('Search files...')
+        self.search_bar.setPlaceholderText('Search files... (e.g. ext:mkv size:>1G modified:<7d)')
         self.search_bar.setMinimumWidth(200)
         self.toolbar.addWidget(self.search_bar)
         self.recursive_checkbox = QCheckBox('Recursive')
         self.toolbar.addWidget(self.recursive_checkbox)
+        self.fuzzy_checkbox = QCheckBox('Fuzzy')
+        self.fuzzy_checkbox.setToolTip('Also list similar names, ranked by similarity')
+        self.toolbar.addWidget(self.fuzzy_checkbox)
+        self.content_checkbox = QCheckBox('Contents')
+        self.content_checkbox.setToolTip('Search inside files instead of file names')
+        self.toolbar.addWidget(self.content_checkbox)
+        self.regex_checkbox = QCheckBox('Regex')
+        self.regex_checkbox.setToolTip('Treat the content search text as a regular expression')
+        self.toolbar.addWidget(self.regex_checkbox)
         self.clear_search_btn = QPushButton('Clear Search')
         self.toolbar.addWidget(self.clear_search_btn)
         self.clear_search_btn.setVisible(False)
         # Connect search events
         self.search_bar.returnPressed.connect(self.on_search)
+        self.search_bar.textEdited.connect(self.on_search_text_edited)
         self.clear_search_btn.clicked.connect(self.on_clear_search)
 
         self.action_back.triggered.connect(self.go_back)
@@ -846,6 +3349,7 @@ class FileManager(QMainWindow):
         self.file_view = QTreeView()
         self.file_view.setModel(self.model)
         self.file_view.setRootIsDecorated(False)
+        self.file_view.setUniformRowHeights(True)
         self.file_view.setSortingEnabled(True)
         self.file_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.file_view.doubleClicked.connect(self.on_file_double_clicked)
@@ -868,6 +3372,21 @@ class FileManager(QMainWindow):
         self.action_options = QAction('Options', self)
         self.action_options.triggered.connect(self.show_options_dialog)
         tools_menu.addAction(self.action_options)
+        self.action_prune_model = QAction('Release Cached Folder Listings', self)
+        self.action_prune_model.triggered.connect(lambda: self.prune_model())
+        tools_menu.addAction(self.action_prune_model)
+        self.action_index_folder = QAction('Index Current Folder for Search', self)
+        self.action_index_folder.triggered.connect(lambda: self.build_search_index([self.address_bar.text()]))
+        tools_menu.addAction(self.action_index_folder)
+        self.action_rebuild_index = QAction('Rebuild Search Index', self)
+        self.action_rebuild_index.triggered.connect(lambda: self.build_search_index(list(self.filename_index.roots) if self.filename_index else []))
+        tools_menu.addAction(self.action_rebuild_index)
+        self.action_transfers = QAction('Transfers...', self)
+        self.action_transfers.triggered.connect(self.show_transfers)
+        tools_menu.addAction(self.action_transfers)
+        self.action_trash = QAction('Trash...', self)
+        self.action_trash.triggered.connect(self.show_trash)
+        tools_menu.addAction(self.action_trash)
         menubar.addMenu(tools_menu)
         # Add Help menu with About
         help_menu = QMenu('Help', self)
@@ -891,17 +3410,9 @@ class FileManager(QMainWindow):
         self.setCentralWidget(container)
 
         # Set up file view header
-        resize_mode = getattr(QHeaderView, 'ResizeToContents', 0)
-        self.file_view.header().setSectionResizeMode(0, resize_mode)
-        self.file_view.header().setSectionResizeMode(1, resize_mode)
-        self.file_view.header().setSectionResizeMode(2, resize_mode)
-        self.file_view.header().setSectionResizeMode(3, resize_mode)
-        self.file_view.setColumnWidth(0, 250)
-        self.file_view.setColumnWidth(1, 120)
-        self.file_view.setColumnWidth(2, 100)
-        self.file_view.setColumnWidth(3, 120)
+        self.setup_file_view_header()
 
-        self.folder_size_delegate = FolderSizeDelegate(self.model, self.file_view)
+        self.folder_size_delegate = FolderSizeDelegate(self.model, self.folder_size_engine, self.file_view)
         self.clipboard_paths = []
         self.clipboard_mode = None
         self.shortcut_favorite = QShortcut(QKeySequence('Ctrl+X,L'), self)
@@ -923,12 +3434,53 @@ class FileManager(QMainWindow):
         except Exception:
             pass
 
+    def setup_file_view_header(self):
+        resize_mode = getattr(QHeaderView, 'ResizeToContents', 0)
+        self.file_view.header().setSectionResizeMode(0, resize_mode)
+        self.file_view.header().setSectionResizeMode(1, resize_mode)
+        self.file_view.header().setSectionResizeMode(2, resize_mode)
+        self.file_view.header().setSectionResizeMode(3, resize_mode)
+        self.file_view.setColumnWidth(0, 250)
+        self.file_view.setColumnWidth(1, 120)
+        self.file_view.setColumnWidth(2, 100)
+        self.file_view.setColumnWidth(3, 120)
+
+    def create_model(self, root_path):
+        model = QFileSystemModel()
+        model.setFilter(QDir.Filter.AllDirs | QDir.Filter.Files | QDir.Filter.NoDotAndDotDot)
+        model.setRootPath(root_path)
+        model.directoryLoaded.connect(self.on_model_directory_loaded)
+        return model
+
+    def prune_model(self, root_path=None):
+        # QFileSystemModel keeps every folder it ever loaded; replace it with a fresh one around the current root
+        if self.file_view.model() is not self.model:
+            return
+        root_path = root_path or self.address_bar.text()
+        old_model = self.model
+        self._model_loaded_dirs = set()
+        self.model = self.create_model(root_path)
+        self.file_view.setModel(self.model)
+        self.file_view.setRootIndex(self.model.index(root_path))
+        self.folder_size_delegate.model = self.model
+        self.setup_file_view_header()
+        old_model.deleteLater()
+        self.update_cache_status()
+
+    def update_cache_status(self):
+        memory, sizes, indexes, nodes = self.folder_size_engine.memory_usage()
+        self.cache_status_label.setText(
+            f'Size cache: {human_readable_size(memory, 1)} of {self.size_cache_mb} MB '
+            f'({sizes} totals, {nodes} indexed folders) | Listings: {len(self._model_loaded_dirs)} folders'
+        )
+
     def toggle_folder_size(self, checked):
         self.show_folder_sizes = checked
         if checked:
             self.file_view.setItemDelegateForColumn(1, self.folder_size_delegate)
         else:
             self.file_view.setItemDelegateForColumn(1, None)
+        self.update_folder_sizes()
 
     def update_folder_sizes(self):
         if not self.show_folder_sizes:
@@ -938,32 +3490,28 @@ class FileManager(QMainWindow):
         model = self.file_view.model()
         if not isinstance(model, QFileSystemModel):
             return
+        # Queue every folder behind the visible rows, which the delegate requests as they paint
         for row in range(model.rowCount(root_index)):
             idx = model.index(row, 0, root_index)
             if model.isDir(idx):
-                folder_path = model.filePath(idx)
-                size = self.get_folder_size(folder_path)
-                size_str = self.human_readable_size(size)
-                size_idx = model.index(row, 1, root_index)
-                model.setData(size_idx, size_str)
-
-    def get_folder_size(self, folder):
-        total = 0
-        for dirpath, dirnames, filenames in os.walk(folder):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                try:
-                    total += os.path.getsize(fp)
-                except Exception:
-                    pass
-        return total
+                self.folder_size_engine.request(model.filePath(idx), FolderSizeEngine.PRIORITY_BACKGROUND)
+        self.file_view.viewport().update()
+
+    def on_folder_size_ready(self, path, size):
+        model = self.file_view.model()
+        if not self.show_folder_sizes or not isinstance(model, QFileSystemModel):
+            return
+        idx = model.index(path, 1)
+        if idx.isValid():
+            self.file_view.update(idx)
+
+    def on_model_directory_loaded(self, path):
+        self._model_loaded_dirs.add(path)
+        if self.show_folder_sizes and os.path.normpath(path) == os.path.normpath(self.model.rootPath()):
+            self.update_folder_sizes()
 
     def human_readable_size(self, size, decimal_places=2):
-        for unit in ['B','KB','MB','GB','TB']:
-            if size < 1024.0:
-                return f"{size:.{decimal_places}f} {unit}"
-            size /= 1024.0
-        return f"{size:.{decimal_places}f} PB"
+        return human_readable_size(size, decimal_places)
 
     def set_path(self, path):
         if not os.path.exists(path):
@@ -975,6 +3523,11 @@ class FileManager(QMainWindow):
         # Add new watch
         if os.path.isdir(path):
             self.watcher.addPath(path)
+        if os.path.normpath(path) != os.path.normpath(self.model.rootPath()):
+            # Sizes queued for the folder we are leaving are no longer on screen
+            self.folder_size_engine.cancel_pending()
+            if len(self._model_loaded_dirs) > self.model_folder_limit:
+                self.prune_model(path)
         self.model.setRootPath(path)
         idx = self.model.index(path)
         self.file_view.setRootIndex(idx)
@@ -1015,7 +3568,9 @@ class FileManager(QMainWindow):
         self.set_path(path)
 
     def on_file_double_clicked(self, index):
-        file_path = self.model.filePath(index)
+        file_path = self.file_view.model().filePath(index)
+        if not file_path:
+            return
         if os.path.isdir(file_path):
             self.set_path(file_path)
         else:
@@ -1045,14 +3600,27 @@ class FileManager(QMainWindow):
         return {k: v for k, v in folders.items() if os.path.exists(v)}
 
     def show_options_dialog(self):
-        dlg = OptionsDialog(self, self.show_folder_sizes, current_theme=self.selected_theme, current_style=self.selected_style)
+        dlg = OptionsDialog(self, self.show_folder_sizes, current_theme=self.selected_theme, current_style=self.selected_style,
+                            size_cache_mb=self.size_cache_mb, model_folder_limit=self.model_folder_limit, search_threads=self.search_threads,
+                            content_max_mb=self.content_max_mb, content_extensions=self.content_extensions,
+                            verify_copies=self.transfer_engine.verify_copies, write_manifest=self.transfer_engine.write_manifest)
         if dlg.exec() == QDialog.Accepted:
+            self.size_cache_mb = dlg.size_cache_spin.value()
+            self.folder_size_engine.set_memory_budget(self.size_cache_mb * 1024 * 1024)
+            self.model_folder_limit = dlg.model_limit_spin.value()
+            self.search_threads = dlg.search_threads_spin.value()
+            self.content_max_mb = dlg.content_max_spin.value()
+            self.content_extensions = dlg.content_ext_edit.text().strip()
+            self.transfer_engine.verify_copies = dlg.verify_checkbox.isChecked()
+            self.transfer_engine.write_manifest = dlg.manifest_checkbox.isChecked()
+            self.update_cache_status()
             checked = dlg.folder_size_checkbox.isChecked()
             self.show_folder_sizes = checked
             if checked:
                 self.file_view.setItemDelegateForColumn(1, self.folder_size_delegate)
             else:
                 self.file_view.setItemDelegateForColumn(1, None)
+            self.update_folder_sizes()
             # Theme
             selected_theme = dlg.get_selected_theme()
             self.selected_theme = selected_theme
@@ -1096,7 +3664,7 @@ class FileManager(QMainWindow):
 
         # Get all selected paths
         selected_indexes = self.file_view.selectionModel().selectedRows(0)
-        selected_paths = [model.filePath(idx) for idx in selected_indexes if idx.isValid()]
+        selected_paths = [model.filePath(idx) for idx in selected_indexes if idx.isValid() and model.filePath(idx)]
         if not selected_paths and file_path:
             selected_paths = [file_path]
 
@@ -1121,12 +3689,20 @@ class FileManager(QMainWindow):
             paste_action.triggered.connect(lambda: self.paste_item(file_path))
             menu.addAction(paste_action)
 
+            sync_action = QAction('Paste as Sync...', self)
+            sync_action.triggered.connect(lambda: self.paste_item(file_path, sync=True))
+            menu.addAction(sync_action)
+
             rename_action = QAction('Rename', self)
             # Only enable rename if one item is selected
             rename_action.setEnabled(len(selected_paths) == 1)
             rename_action.triggered.connect(lambda: self.rename_item(file_path))
             menu.addAction(rename_action)
 
+            trash_action = QAction('Move to Trash', self)
+            trash_action.triggered.connect(lambda: self.trash_items(selected_paths))
+            menu.addAction(trash_action)
+
             delete_action = QAction('Delete', self)
             delete_action.triggered.connect(lambda: self.delete_item(selected_paths))
             menu.addAction(delete_action)
@@ -1148,6 +3724,9 @@ class FileManager(QMainWindow):
                 new_folder_action = QAction('New Folder', self)
                 new_folder_action.triggered.connect(lambda: self.new_folder(file_path))
                 menu.addAction(new_folder_action)
+                usage_action = QAction('Analyze Disk Usage...', self)
+                usage_action.triggered.connect(lambda: self.show_disk_usage(file_path))
+                menu.addAction(usage_action)
 
             if is_file and self.is_video_file(file_path):
                 peek_action = QAction('Peek', self)
@@ -1163,6 +3742,10 @@ class FileManager(QMainWindow):
                 extract_action = QAction('Extract Here', self)
                 extract_action.triggered.connect(lambda: self.extract_item(file_path, os.path.dirname(file_path)))
                 menu.addAction(extract_action)
+            if is_file and file_path.endswith('.b2sum'):
+                verify_action = QAction('Verify Checksums', self)
+                verify_action.triggered.connect(lambda: self.verify_manifest(file_path))
+                menu.addAction(verify_action)
         else:
             if is_folder:
                 new_folder_action = QAction('New Folder', self)
@@ -1171,6 +3754,12 @@ class FileManager(QMainWindow):
                 paste_action = QAction('Paste', self)
                 paste_action.triggered.connect(lambda: self.paste_item(file_path))
                 menu.addAction(paste_action)
+                sync_action = QAction('Paste as Sync...', self)
+                sync_action.triggered.connect(lambda: self.paste_item(file_path, sync=True))
+                menu.addAction(sync_action)
+                usage_action = QAction('Analyze Disk Usage...', self)
+                usage_action.triggered.connect(lambda: self.show_disk_usage(file_path))
+                menu.addAction(usage_action)
 
         menu.exec(self.file_view.viewport().mapToGlobal(pos))
 
@@ -1207,25 +3796,84 @@ class FileManager(QMainWindow):
         self.clipboard_mode = 'cut'
         QMessageBox.information(self, 'Cut', f'{len(file_paths)} item(s) ready to paste.')
 
-    def paste_item(self, folder_path):
+    def paste_item(self, folder_path, sync=False):
         if not self.clipboard_paths or not self.clipboard_mode:
             QMessageBox.information(self, 'Paste', 'Nothing to paste.')
             return
-        for src in self.clipboard_paths:
-            dst = os.path.join(folder_path, os.path.basename(src))
-            try:
-                if self.clipboard_mode == 'copy':
-                    if os.path.isdir(src):
-                        shutil.copytree(src, dst)
-                    else:
-                        shutil.copy2(src, dst)
-                elif self.clipboard_mode == 'cut':
-                    shutil.move(src, dst)
-            except Exception as e:
-                QMessageBox.warning(self, 'Paste', f'Could not paste: {e}')
+        if sync:
+            # Copies only what is new or changed; the sources stay even after Cut
+            if not self.sync_items(self.clipboard_paths, folder_path):
+                return
+        else:
+            mode = 'move' if self.clipboard_mode == 'cut' else 'copy'
+            self.transfer_engine.submit(mode, self.clipboard_paths, folder_path)
         self.clipboard_paths = []
         self.clipboard_mode = None
+        self.show_transfers()
+
+    def offer_transfer_resume(self):
+        jobs = self.transfer_journal.unfinished() if self.transfer_journal else []
+        if not jobs:
+            return
+        lines = [f'{mode.capitalize()} {len(sources)} item(s) to {dest_dir}' for _, mode, sources, dest_dir, _ in jobs[:10]]
+        reply = QMessageBox.question(self, 'Resume Transfers',
+                                     f'{len(jobs)} transfer(s) did not finish last time:\n' + '\n'.join(lines) +
+                                     '\n\nResume them? Files that were already copied are skipped.',
+                                     QMessageBox.Yes | QMessageBox.No)
+        for job_id, mode, sources, dest_dir, options in jobs:
+            if reply == QMessageBox.Yes:
+                self.transfer_engine.submit(mode, sources, dest_dir, resume_id=job_id, **options)
+                continue
+            # Large files the interrupted job had only partly written
+            for path in self.transfer_journal.finish(job_id):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if reply == QMessageBox.Yes:
+            self.show_transfers()
+
+    def sync_items(self, paths, folder_path):
+        if os.path.isfile(folder_path):
+            folder_path = os.path.dirname(folder_path)
+        dlg = SyncDialog(self.transfer_engine, paths, folder_path, self)
+        if dlg.exec() != QDialog.Accepted or not dlg.actions:
+            return False
+        self.transfer_engine.submit('sync', paths, folder_path, plan=dlg.actions, use_hash=dlg.hash_cb.isChecked(),
+                                    mirror=dlg.mirror_cb.isChecked())
+        return True
+
+    def verify_manifest(self, manifest_path):
+        self.transfer_engine.submit('verify', [manifest_path], os.path.dirname(manifest_path))
+        self.show_transfers()
+
+    def show_transfers(self):
+        if self.transfer_dialog is None:
+            self.transfer_dialog = TransferQueueDialog(self.transfer_engine, self)
+        self.transfer_dialog.rebuild()
+        self.transfer_dialog.show()
+        self.transfer_dialog.raise_()
+
+    def update_transfer_status(self, job=None):
+        jobs = self.transfer_engine.active_jobs()
+        if not jobs:
+            self.transfer_status_label.setText('')
+            return
+        done = sum(j.bytes_done for j in jobs)
+        total = sum(j.bytes_total for j in jobs)
+        percent = f' – {int(done * 100 / total)}%' if total else ''
+        self.transfer_status_label.setText(f'Transfers: {len(jobs)} active{percent}')
+
+    def on_transfer_finished(self, job):
+        self.update_transfer_status()
         self.refresh()
+        if job.state == TransferJob.CANCELLED:
+            self.show_notification(f'{job.mode.capitalize()} cancelled.')
+        elif job.errors:
+            QMessageBox.warning(self, job.mode.capitalize(), f'Could not {job.mode} some items:\n' + '\n'.join(job.errors[:10]))
+        else:
+            method = f' ({job.backend_summary()})' if job.backends else ''
+            self.show_notification(f'{job.mode.capitalize()} completed: {job.files_done} file(s), {human_readable_size(job.bytes_done)}{method}.')
 
     def rename_item(self, file_path):
         new_name, ok = QInputDialog.getText(self, 'Rename', 'Enter new name:', text=os.path.basename(file_path))
@@ -1237,27 +3885,81 @@ class FileManager(QMainWindow):
             except Exception as e:
                 QMessageBox.warning(self, 'Rename', f'Could not rename: {e}')
 
-    def delete_item(self, file_paths):
+    def delete_item(self, file_paths, confirm=True):
         if isinstance(file_paths, str):
             file_paths = [file_paths]
-        reply = QMessageBox.question(self, 'Delete', f'Are you sure you want to delete {len(file_paths)} item(s)?', QMessageBox.Yes | QMessageBox.No)
-        if reply != QMessageBox.Yes:
-            return
+        if confirm:
+            reply = QMessageBox.question(self, 'Delete', f'Are you sure you want to delete {len(file_paths)} item(s)?', QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
         self.progress_dialog = QProgressDialog('Deleting files...', 'Cancel', 0, 100, self)
         self.progress_dialog.setWindowTitle('Deleting')
         self.progress_dialog.setWindowModality(Qt.WindowModal)
         self.progress_dialog.setValue(0)
-        self.delete_worker = DeleteWorker(file_paths)
+        self.delete_worker = DeleteWorker(file_paths, self.folder_size_engine)
         self.delete_worker.progress.connect(self.progress_dialog.setValue)
+        self.delete_worker.status.connect(self.progress_dialog.setLabelText)
         self.delete_worker.error.connect(lambda msg: QMessageBox.warning(self, 'Delete', msg))
         self.delete_worker.finished.connect(self.on_delete_finished)
         self.progress_dialog.canceled.connect(self.delete_worker.interrupt)
         self.delete_worker.start()
         self.progress_dialog.exec()
+    def trash_items(self, file_paths):
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        failed = []
+        for path in file_paths:
+            try:
+                self.trash.trash(path)
+            except OSError as e:
+                failed.append((path, e))
+        self.refresh()
+        moved = len(file_paths) - len(failed)
+        if moved:
+            self.show_notification(f'Moved {moved} item(s) to the trash.')
+        if self.trash_dialog and self.trash_dialog.isVisible():
+            self.trash_dialog.reload()
+        if failed:
+            details = '\n'.join(f'{path}: {e.strerror or e}' for path, e in failed[:10])
+            reply = QMessageBox.question(self, 'Move to Trash', f'{len(failed)} item(s) cannot be moved to the trash:\n{details}'
+                                         '\n\nDelete them permanently instead?', QMessageBox.Yes | QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                self.delete_item([path for path, _ in failed], confirm=False)
+
+    def show_trash(self):
+        if self.trash_dialog is None:
+            self.trash_dialog = TrashDialog(self.trash, self.folder_size_engine, self.purge_trash, self)
+        else:
+            self.trash_dialog.reload()
+        self.trash_dialog.show()
+        self.trash_dialog.raise_()
+
+    def purge_trash(self, entries):
+        worker = DeleteWorker([entry.path for entry in entries], self.folder_size_engine, threads=2, low_priority=True)
+        worker.finished.connect(lambda: self.on_trash_purged(worker, entries))
+        worker.error.connect(lambda msg: QMessageBox.warning(self, 'Trash', msg))
+        self.purge_workers.append(worker)
+        worker.start(QThread.LowestPriority)
+
+    def on_trash_purged(self, worker, entries):
+        # Both the worker's finished signal and QThread's arrive here
+        if worker not in self.purge_workers:
+            return
+        self.purge_workers.remove(worker)
+        self.retire_worker(worker)
+        self.trash.forget(entries)
+        self.show_notification(f'Permanently deleted {len(entries)} item(s) from the trash.')
+        if self.trash_dialog and self.trash_dialog.isVisible():
+            self.trash_dialog.reload()
+
     def on_delete_finished(self):
         self.progress_dialog.close()
         self.refresh()
-        self.show_notification('Delete operation completed.')
+        worker = self.delete_worker
+        if worker.is_interrupted():
+            self.show_notification(f'Delete cancelled – {worker.removed:,} of {max(worker.total, worker.removed):,} entries removed.')
+        else:
+            self.show_notification('Delete operation completed.')
 
     def show_properties(self, file_path_or_paths):
         if isinstance(file_path_or_paths, str):
@@ -1315,7 +4017,7 @@ class FileManager(QMainWindow):
                 size = os.path.getsize(file_path)
                 form.addRow('<b>Size:</b>', QLabel(f'{size} bytes ({self.human_readable_size(size)})'))
             elif os.path.isdir(file_path):
-                size = self.get_folder_size(file_path)
+                size = self.folder_size_engine.size_of(file_path)
                 form.addRow('<b>Size:</b>', QLabel(f'{size} bytes ({self.human_readable_size(size)})'))
             # Location
             form.addRow('<b>Location:</b>', QLabel(os.path.dirname(file_path)))
@@ -1483,7 +4185,7 @@ class FileManager(QMainWindow):
                     total_size += os.path.getsize(p)
                     file_count += 1
                 elif os.path.isdir(p):
-                    total_size += self.get_folder_size(p)
+                    total_size += self.folder_size_engine.size_of(p)
                     folder_count += 1
             general_widget = QWidget()
             general_layout = QFormLayout()
@@ -1542,6 +4244,10 @@ class FileManager(QMainWindow):
         dlg = VideoPeekDialog(file_path, self)
         dlg.exec()
 
+    def show_disk_usage(self, folder_path):
+        dlg = DiskUsageDialog(folder_path, self.folder_size_engine, self)
+        dlg.exec()
+
     def go_to_desktop(self):
         self.set_path(r'C:/Users/fmjje/OneDrive/Desktop')
 
@@ -1551,11 +4257,43 @@ class FileManager(QMainWindow):
             self.sidebar.add_to_favorites(path)
             QMessageBox.information(self, 'Favorites', f'Added to Favorites: {path}')
 
-    def on_search(self):
+    def on_search_text_edited(self, text):
+        if not text.strip():
+            self.search_session.cancel()
+            if not self.clear_search_btn.isHidden():
+                self.on_clear_search()
+            return
+        # Content searches read every file, so they only start on Enter
+        if not self.content_checkbox.isChecked():
+            self.search_session.schedule()
+
+    def stop_search(self):
+        self.search_session.cancel()
+        self.stop_fuzzy_search()
+        if self.search_worker:
+            self.search_worker.stop()
+            self.retire_worker(self.search_worker)
+        self.search_worker = None
+
+    def on_search(self, live=False):
         query = self.search_bar.text().strip()
         recursive = self.recursive_checkbox.isChecked()
         if not query:
             return
+        search_query = None
+        if not self.content_checkbox.isChecked():
+            try:
+                search_query = SearchQuery(query)
+            except ValueError as e:
+                # Half-typed queries are common while typing; only Enter gets a dialog
+                if live:
+                    self.statusBar().showMessage(str(e), 3000)
+                else:
+                    QMessageBox.warning(self, 'Search', str(e))
+                return
+        previous_query = self.search_query
+        self.search_query = search_query
+        self.stop_search()
         # Start search worker
         self.clear_search_btn.setVisible(True)
         self.address_stack.setCurrentWidget(self.progress_bar)
@@ -1564,69 +4302,202 @@ class FileManager(QMainWindow):
         self.progress_ring.setVisible(True)
         self.progress_ring.setText('Searching...')
         self.search_results = []
-        self.search_worker = SearchWorker(self.address_bar.text(), query, recursive)
+        self.fuzzy_index = None
+        root = self.address_bar.text()
+        if self.content_checkbox.isChecked():
+            self.search_session.invalidate()
+            self.start_content_search(root, query, recursive)
+            return
+        if search_query.plain is not None and self.filename_index and self.filename_index.covers(root):
+            # Indexed roots are answered from the filename index without touching the disk
+            started = time.perf_counter()
+            results = self.filename_index.search(root, search_query.plain, recursive)
+            self.on_search_found(results)
+            self.on_search_finished()
+            self.statusBar().showMessage(f'{len(results)} result(s) from the search index in {(time.perf_counter() - started) * 1000:.0f} ms', 5000)
+            if results and self.fuzzy_checkbox.isChecked():
+                self.start_fuzzy_search(search_query.plain, exclude=set(results))
+            return
+        self.begin_search_results()
+        session = self.search_session
+        # Enter on an unchanged query rescans; anything narrower filters the last complete result set
+        if session.narrows(root, recursive, search_query) and (live or previous_query is None or previous_query.text != query):
+            self.fuzzy_index = session.fuzzy_index
+            self.search_worker = SearchWorker(root, search_query, recursive, fuzzy_index=self.fuzzy_index,
+                                              candidates=session.candidates(), candidate_count=session.count)
+        else:
+            session.invalidate()
+            # For plain words the scan also collects every basename for the fuzzy fallback and typo-tolerant ranking
+            self.fuzzy_index = FuzzyIndex() if search_query.plain is not None else None
+            self.search_worker = SearchWorker(root, search_query, recursive, self.search_threads, self.fuzzy_index)
         self.search_worker.progress.connect(self.on_search_progress)
-        self.search_worker.found.connect(self.on_search_found)
+        self.search_worker.found.connect(self.on_search_batch)
         self.search_worker.started.connect(lambda: self.progress_ring.setText('Searching...'))
-        self.search_worker.finished.connect(self.on_search_finished)
+        self.search_worker.finished.connect(self.on_search_worker_finished)
+        self.search_worker.start()
+
+    def start_content_search(self, root, query, recursive):
+        if self.regex_checkbox.isChecked():
+            try:
+                re.compile(query)
+            except re.error as e:
+                self.on_search_finished()
+                QMessageBox.warning(self, 'Search', f'Invalid regular expression: {e}')
+                return
+        workers = os.cpu_count() or 2
+        if self.content_pool is None:
+            try:
+                # forkserver keeps the GUI process and its threads out of the workers
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+                self.content_pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            except (OSError, ValueError):
+                self.content_pool = None
+        extensions = {('.' + e.strip().lstrip('.')).lower() for e in self.content_extensions.split(',') if e.strip()}
+        self.begin_search_results(content=True)
+        self.search_worker = ContentSearchWorker(root, query, self.regex_checkbox.isChecked(), recursive, self.content_pool,
+                                                 workers, self.content_max_mb * 1024 * 1024, extensions)
+        self.search_worker.progress.connect(self.on_search_progress)
+        self.search_worker.found.connect(self.on_content_batch)
+        self.search_worker.finished.connect(self.on_content_search_finished)
         self.search_worker.start()
 
+    def on_content_batch(self, batch):
+        if self.sender() is self.search_worker and self._search_results_model is not None:
+            self._search_results_model.append_results([hit[0] for hit in batch], [hit[1:] for hit in batch])
+
+    def on_content_search_finished(self):
+        if self.sender() is not self.search_worker:
+            return
+        self.on_search_finished()
+        model = self._search_results_model
+        if model is not None and not model.result_count():
+            model.set_message(f"No files contain '{self.search_bar.text().strip()}'.")
+        elif model is not None:
+            model.refresh_sort()
+
+    def build_search_index(self, roots):
+        if not self.filename_index or not roots:
+            return
+        if self.index_worker and self.index_worker.isRunning():
+            self.show_notification('The search index is already being built.')
+            return
+        self.index_worker = IndexBuildWorker(self.filename_index, roots)
+        self.index_worker.progress.connect(lambda count: self.statusBar().showMessage(f'Indexing for search: {count} entries...'))
+        self.index_worker.finished.connect(lambda: self.statusBar().showMessage('Search index updated.', 3000))
+        self.index_worker.start()
+
+    def refresh_stale_search_index(self):
+        if self.filename_index:
+            stale = [root for root, built in self.filename_index.roots.items() if time.time() - built > 24 * 3600]
+            self.build_search_index(stale)
+
     def on_search_progress(self, value):
         self.progress_bar.setValue(value)
 
+    def begin_search_results(self, content=False):
+        # Streaming searches fill this model batch by batch while the scan runs
+        self.show_search_results(SearchResultsModel(None, 'Searching...', content))
+
+    def show_search_results(self, model):
+        header = self.file_view.header()
+        if self.file_view.model() is self.model:
+            self._file_view_sort = (header.sortIndicatorSection(), header.sortIndicatorOrder())
+        # Results open sorted by name; the sort runs again when the search completes
+        header.setSortIndicator(0, Qt.AscendingOrder)
+        self.file_view.setModel(model)
+        # Sizing columns to their contents would query (and stat) every row; results use fixed widths
+        for column in range(model.columnCount()):
+            header.setSectionResizeMode(column, QHeaderView.Interactive)
+        for column, width in enumerate([250, 300, 90, 130, 100, 400][:model.columnCount()]):
+            self.file_view.setColumnWidth(column, width)
+        self.file_view.viewport().installEventFilter(self)
+        self._search_results_model = model
+
+    def restore_file_view(self):
+        if self.file_view.model() is not self.model and getattr(self, '_file_view_sort', None):
+            self.file_view.header().setSortIndicator(*self._file_view_sort)
+        self.file_view.setModel(self.model)
+        self.setup_file_view_header()
+        self.file_view.viewport().removeEventFilter(self)
+        self._search_results_model = None
+
+    def on_search_batch(self, batch):
+        if self.sender() is self.search_worker and self._search_results_model is not None:
+            self._search_results_model.append_results(batch)
+
+    def on_search_worker_finished(self):
+        worker = self.sender()
+        if worker is not self.search_worker:
+            return
+        self.on_search_finished()
+        model = self._search_results_model
+        if model is not None and worker._is_running:
+            self.search_session.complete(worker.root_path, worker.recursive, worker.query, model, self.fuzzy_index)
+        if model is not None and not model.result_count():
+            self.on_search_found([])
+            return
+        if model is not None:
+            model.refresh_sort()
+        if (model is not None and self.fuzzy_index is not None and self.fuzzy_checkbox.isChecked()
+                and self.search_query is not None and self.search_query.plain is not None):
+            # Typo-tolerant ranking: exact matches first, then similar names by score
+            self.start_fuzzy_search(self.search_query.plain, exclude=set(model.paths()))
+
+    def start_fuzzy_search(self, query, exclude=None):
+        self.stop_fuzzy_search()
+        self.progress_ring.setVisible(True)
+        self.progress_ring.setText('Ranking similar names...')
+        self.fuzzy_worker = FuzzySearchWorker(query, self.fuzzy_index, self.address_bar.text(), self.recursive_checkbox.isChecked(),
+                                              self.filename_index, exclude)
+        self.fuzzy_worker.found.connect(self.on_fuzzy_found)
+        self.fuzzy_worker.start()
+
+    def stop_fuzzy_search(self):
+        if self.fuzzy_worker:
+            self.fuzzy_worker.stop()
+            self.retire_worker(self.fuzzy_worker)
+        self.fuzzy_worker = None
+
+    def retire_worker(self, worker):
+        # Keep a reference until the thread has really ended; a QThread collected while running aborts the app
+        if not worker.isRunning():
+            return
+        self._retired_workers.append(worker)
+        def release():
+            worker.wait()
+            if worker in self._retired_workers:
+                self._retired_workers.remove(worker)
+        worker.finished.connect(release)
+
+    def on_fuzzy_found(self, results):
+        if self.sender() is not self.fuzzy_worker:
+            return
+        self.progress_ring.setVisible(False)
+        model = self._search_results_model
+        if model is None:
+            return
+        query = self.search_bar.text().strip()
+        if model.result_count():
+            model.append_results(results)
+        elif results:
+            model.message = f"Showing similar results for '{query}'."
+            model.append_results(results)
+        else:
+            model.set_message("We couldn't find anything matching your search.")
+
     def on_search_found(self, results):
         self.search_results = results
         query = self.search_bar.text().strip()
-        from PySide6.QtCore import QAbstractListModel, QModelIndex
-        class SearchResultsModel(QAbstractListModel):
-            def __init__(self, results, message=None):
-                super().__init__()
-                self.results = results
-                self.message = message
-            def rowCount(self, parent=QModelIndex()):
-                return max(1, len(self.results))
-            def data(self, index, role):
-                if role == Qt.DisplayRole:
-                    if self.results:
-                        return self.results[index.row()]
-                    elif self.message:
-                        return self.message
-                    else:
-                        return 'No results.'
         if results:
-            model = SearchResultsModel(results)
-            self.file_view.setModel(model)
-            # Install event filter for middle-click
-            self.file_view.viewport().installEventFilter(self)
-            self._search_results_model = model
-            self._search_results_paths = results
+            self.show_search_results(SearchResultsModel(results))
+        elif self.search_query is None or self.search_query.plain is None:
+            # Structured queries have no sensible "similar names"
+            self.show_search_results(SearchResultsModel(None, f"No results found for '{query}'."))
         else:
-            # No exact matches, try fuzzy search
-            self.file_view.setModel(SearchResultsModel([], f"No results found for '{query}'. Trying similar names..."))
-            QApplication.processEvents()
-            # Gather all files/folders in search scope
-            all_names = []
-            for dirpath, dirnames, filenames in os.walk(self.address_bar.text()):
-                for d in dirnames:
-                    all_names.append(os.path.join(dirpath, d))
-                for f in filenames:
-                    all_names.append(os.path.join(dirpath, f))
-                if not self.recursive_checkbox.isChecked():
-                    break
-            # Use difflib to find close matches
-            base_query = os.path.basename(query).lower()
-            similar = [p for p in all_names if difflib.get_close_matches(base_query, [os.path.basename(p).lower()], n=1, cutoff=0.6)]
-            if similar:
-                model = SearchResultsModel(similar, f"Showing similar results for '{query}'.")
-                self.file_view.setModel(model)
-                self.file_view.viewport().installEventFilter(self)
-                self._search_results_model = model
-                self._search_results_paths = similar
-            else:
-                self.file_view.setModel(SearchResultsModel([], "We couldn't find anything matching your search."))
-                self.file_view.viewport().removeEventFilter(self)
-                self._search_results_model = None
-                self._search_results_paths = None
+            # No exact matches, rank similar names in the background
+            self.show_search_results(SearchResultsModel(None, f"No results found for '{query}'. Trying similar names..."))
+            self.start_fuzzy_search(self.search_query.plain)
 
     def eventFilter(self, obj, event):
         from PySide6.QtCore import QEvent
@@ -1635,11 +4506,12 @@ class FileManager(QMainWindow):
             mouse_event = event
             if mouse_event.button() == Qt.MiddleButton:
                 index = self.file_view.indexAt(mouse_event.pos())
-                if index.isValid() and hasattr(self, '_search_results_paths') and self._search_results_paths:
-                    path = self._search_results_paths[index.row()]
+                results = getattr(self, '_search_results_model', None)
+                if index.isValid() and results is not None and results.result_count():
+                    path = results.path(index.row())
                     parent_dir = os.path.dirname(path)
                     # Restore normal file view for parent_dir
-                    self.file_view.setModel(self.model)
+                    self.restore_file_view()
                     self.set_path(parent_dir)
                     # Select the file/folder in the new view
                     model = self.model
@@ -1648,10 +4520,6 @@ class FileManager(QMainWindow):
                         if model.filePath(idx) == path:
                             self.file_view.setCurrentIndex(idx)
                             break
-                    # Remove event filter since we're back to normal view
-                    self.file_view.viewport().removeEventFilter(self)
-                    self._search_results_model = None
-                    self._search_results_paths = None
                     return True
         return super().eventFilter(obj, event)
 
@@ -1661,18 +4529,15 @@ class FileManager(QMainWindow):
         self.address_stack.setCurrentWidget(self.address_bar)
 
     def on_clear_search(self):
+        self.stop_search()
         self.search_bar.clear()
         self.clear_search_btn.setVisible(False)
         self.progress_bar.setVisible(False)
         self.progress_ring.setVisible(False)
         self.address_stack.setCurrentWidget(self.address_bar)
         # Restore normal file view
-        self.file_view.setModel(self.model)
+        self.restore_file_view()
         self.set_path(self.address_bar.text())
-        # Remove event filter if present
-        self.file_view.viewport().removeEventFilter(self)
-        self._search_results_model = None
-        self._search_results_paths = None
 
     def file_view_dropEvent(self, event):
         # Custom drop event to move/copy files/folders
@@ -1690,9 +4555,18 @@ class FileManager(QMainWindow):
         else:
             event.ignore()
             return
-        # Determine operation: copy (default), move if Ctrl is held
+        # Determine operation: copy (default), move if Ctrl is held, sync if Shift is held
         from PySide6.QtCore import Qt
         modifiers = event.keyboardModifiers() if hasattr(event, 'keyboardModifiers') else Qt.NoModifier
+        if modifiers & Qt.ShiftModifier:
+            paths = [src for src in paths if src != target_path]
+            if paths and self.sync_items(paths, target_path):
+                self.show_transfers()
+                event.setDropAction(Qt.CopyAction)
+                event.accept()
+            else:
+                event.ignore()
+            return
         if modifiers & Qt.ControlModifier:
             op = 'move'
             drop_action = Qt.MoveAction
@@ -1704,26 +4578,17 @@ class FileManager(QMainWindow):
         if reply != QMessageBox.Yes:
             event.ignore()
             return
-        import shutil
-        for src in paths:
-            if src == target_path or os.path.dirname(src) == target_path:
-                continue  # Don't move/copy into itself or same folder
-            dst = os.path.join(target_path, os.path.basename(src))
-            try:
-                if op == 'move':
-                    shutil.move(src, dst)
-                else:
-                    if os.path.isdir(src):
-                        shutil.copytree(src, dst)
-                    else:
-                        shutil.copy2(src, dst)
-            except Exception as e:
-                QMessageBox.warning(self, op.capitalize(), f'Could not {op} {src}: {e}')
-        self.refresh()
+        # Don't move/copy into itself or same folder
+        paths = [src for src in paths if src != target_path and os.path.dirname(src) != target_path]
+        if paths:
+            self.transfer_engine.submit(op, paths, target_path)
+            self.show_transfers()
         event.setDropAction(drop_action)
         event.accept()
 
     def is_supported_archive(self, file_path):
+        if archive_volumes(file_path):
+            return True
         ext = os.path.splitext(file_path)[1].lower()
         if ext in ['.zip', '.tar', '.gz', '.bz2', '.xz', '.7z', '.rar', '.iso', '.cab', '.lzma', '.zst', '.arj', '.ace', '.tar.lzma', '.tar.zst']:
             if ext == '.7z' and not HAS_PY7ZR:
@@ -1737,8 +4602,6 @@ class FileManager(QMainWindow):
 
     def compress_items(self, paths):
         from PySide6.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QComboBox, QDialogButtonBox, QLabel, QCheckBox, QSpinBox, QHBoxLayout, QFileDialog
-        import shutil
-        import fnmatch
         dlg = QDialog(self)
         dlg.setWindowTitle('Compress')
         layout = QVBoxLayout()
@@ -1771,6 +4634,14 @@ class FileManager(QMainWindow):
         level_combo = QComboBox()
         level_combo.addItems(['Store (no compression)', 'Fast', 'Normal', 'Best'])
         layout.addWidget(level_combo)
+        # Threads for parallel deflate (ZIP, GZ and TAR.GZ); 1 uses the standard library's single-threaded writers
+        threads_layout = QHBoxLayout()
+        threads_layout.addWidget(QLabel('Compression threads:'))
+        threads_spin = QSpinBox()
+        threads_spin.setRange(1, 256)
+        threads_spin.setValue(os.cpu_count() or 1)
+        threads_layout.addWidget(threads_spin)
+        layout.addLayout(threads_layout)
         # Password
         password_box = QLineEdit()
         password_box.setPlaceholderText('Password (optional)')
@@ -1821,109 +4692,90 @@ class FileManager(QMainWindow):
         password = password_box.text()
         split = split_checkbox.isChecked()
         split_mb = split_size.value() if split else None
+        volume_size = split_mb * 1024 * 1024 if split_mb else 0
         exclude_patterns = [p.strip() for p in exclude_edit.text().split(',') if p.strip()]
         add_existing = add_to_existing.isChecked()
         comment = comment_edit.text().strip()
         store_paths = store_full_paths.isChecked()
         encrypt = encrypt_names.isChecked()
-        # Actual compression logic
-        try:
-            ext = os.path.splitext(archive_name)[1].lower()
-            if fmt.startswith('ZIP'):
-                compression = zipfile.ZIP_DEFLATED if level != 'Store (no compression)' else zipfile.ZIP_STORED
-                with zipfile.ZipFile(archive_name, 'a' if add_existing and os.path.exists(archive_name) else 'w', compression) as zf:
-                    if comment:
-                        zf.comment = comment.encode('utf-8')
-                    for path in paths:
-                        if os.path.isdir(path):
-                            for root, dirs, files in os.walk(path):
-                                for file in files:
-                                    full_path = os.path.join(root, file)
-                                    rel_path = os.path.relpath(full_path, os.path.dirname(path)) if store_paths else file
-                                    if any(fnmatch.fnmatch(full_path, pat) for pat in exclude_patterns):
-                                        continue
-                                    zf.write(full_path, rel_path)
-                        else:
-                            if any(fnmatch.fnmatch(path, pat) for pat in exclude_patterns):
-                                continue
-                            arcname = os.path.basename(path) if not store_paths else os.path.relpath(path, os.path.dirname(paths[0]))
-                            zf.write(path, arcname)
-                QMessageBox.information(self, 'Compress', f'Created ZIP archive: {archive_name}')
-            elif fmt.startswith('TAR'):
-                mode = 'w'
-                if fmt == 'TAR (.tar)':
-                    mode = 'w'
-                elif fmt == 'TAR.GZ (.tar.gz)':
-                    mode = 'w:gz'
-                elif fmt == 'TAR.BZ2 (.tar.bz2)':
-                    mode = 'w:bz2'
-                elif fmt == 'TAR.XZ (.tar.xz)':
-                    mode = 'w:xz'
-                with tarfile.open(archive_name, mode) as tf:
-                    for path in paths:
-                        if os.path.isdir(path):
-                            tf.add(path, arcname=os.path.basename(path) if not store_paths else path, filter=lambda x: None if any(fnmatch.fnmatch(x.name, pat) for pat in exclude_patterns) else x)
-                        else:
-                            if any(fnmatch.fnmatch(path, pat) for pat in exclude_patterns):
-                                continue
-                            arcname = os.path.basename(path) if not store_paths else path
-                            tf.add(path, arcname=arcname)
-                QMessageBox.information(self, 'Compress', f'Created TAR archive: {archive_name}')
-            elif fmt.startswith('7z') and HAS_PY7ZR:
-                filters = {}
-                if level == 'Store (no compression)':
-                    filters['compression'] = 'copy'
-                elif level == 'Fast':
-                    filters['compression'] = 'fast'
-                elif level == 'Normal':
-                    filters['compression'] = 'normal'
-                elif level == 'Best':
-                    filters['compression'] = 'ultra'
-                with py7zr.SevenZipFile(archive_name, 'w', password=password if password else None, filters=filters, encrypt_header=encrypt) as zf:
-                    for path in paths:
-                        if os.path.isdir(path):
-                            zf.writeall(path, arcname=os.path.basename(path) if not store_paths else path)
-                        else:
-                            zf.write(path, arcname=os.path.basename(path) if not store_paths else path)
-                QMessageBox.information(self, 'Compress', f'Created 7z archive: {archive_name}')
-            elif fmt.startswith('GZ'):
-                import gzip
-                if len(paths) == 1 and os.path.isfile(paths[0]):
-                    with open(paths[0], 'rb') as f_in, gzip.open(archive_name, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                    QMessageBox.information(self, 'Compress', f'Created GZ archive: {archive_name}')
-                else:
-                    QMessageBox.warning(self, 'Compress', 'GZ only supports single files.')
-            elif fmt.startswith('BZ2'):
-                import bz2
-                if len(paths) == 1 and os.path.isfile(paths[0]):
-                    with open(paths[0], 'rb') as f_in, bz2.open(archive_name, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                    QMessageBox.information(self, 'Compress', f'Created BZ2 archive: {archive_name}')
-                else:
-                    QMessageBox.warning(self, 'Compress', 'BZ2 only supports single files.')
-            elif fmt.startswith('XZ'):
-                import lzma
-                if len(paths) == 1 and os.path.isfile(paths[0]):
-                    with open(paths[0], 'rb') as f_in, lzma.open(archive_name, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                    QMessageBox.information(self, 'Compress', f'Created XZ archive: {archive_name}')
-                else:
-                    QMessageBox.warning(self, 'Compress', 'XZ only supports single files.')
-            elif fmt.startswith('RAR') and HAS_RAR:
-                with rarfile.RarFile(archive_name, 'w') as rf:
-                    for path in paths:
-                        rf.write(path)
-                QMessageBox.information(self, 'Compress', f'Created RAR archive: {archive_name}')
-            elif fmt.startswith('ISO') and HAS_ISO:
-                with pycdlib.PyCdlib() as iso:
-                    iso.open(archive_name)
-                    # Extract all files (stub: just show message)
-                    QMessageBox.information(self, 'Compress', f'ISO compression not fully implemented.')
-            else:
-                QMessageBox.warning(self, 'Compress', 'Unsupported format or missing library.')
-        except Exception as e:
-            QMessageBox.critical(self, 'Compress', f'Error: {e}')
+        threads = threads_spin.value()
+        if not os.path.isabs(archive_name):
+            # Relative names are meant for the folder of the selected items, not the process's working directory
+            archive_name = os.path.join(os.path.dirname(os.path.abspath(paths[0])), archive_name)
+        worker = CompressWorker(paths, archive_name, fmt, level, password, exclude_patterns, add_existing, comment,
+                                store_paths, encrypt, threads, volume_size)
+        progress = QProgressDialog(f'Preparing {os.path.basename(archive_name)}...', 'Cancel', 0, 1000, self)
+        progress.setWindowTitle('Compress')
+        progress.setMinimumWidth(450)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.canceled.connect(worker.cancel)
+        worker.progress.connect(lambda: self.on_compress_progress(worker, progress))
+        worker.completed.connect(lambda status, message: self.on_compress_finished(worker, progress, status, message))
+        self.archive_workers.append(worker)
+        worker.start()
+        progress.show()
+
+    def on_compress_progress(self, worker, progress):
+        if worker.bytes_total:
+            progress.setValue(int(worker.bytes_in * 1000 / worker.bytes_total))
+        ratio = f'{worker.ratio() * 100:.0f}%' if worker.bytes_in else '-'
+        progress.setLabelText(
+            f'{os.path.basename(worker.current_file)}\n'
+            f'{worker.files_done} of {worker.files_total} file(s) – {human_readable_size(worker.bytes_in)} in, '
+            f'{human_readable_size(worker.bytes_out)} out (ratio {ratio}) – {worker.speed() / (1024 * 1024):.1f} MB/s'
+        )
+
+    def on_compress_finished(self, worker, progress, status, message):
+        if worker in self.archive_workers:
+            self.archive_workers.remove(worker)
+            self.retire_worker(worker)
+        progress.close()
+        self.refresh()
+        if status == CompressWorker.DONE:
+            summary = (f'{human_readable_size(worker.bytes_in)} → {human_readable_size(worker.bytes_out)}'
+                       f' in {time.monotonic() - worker.started_at:.1f} s')
+            QMessageBox.information(self, 'Compress', f'{message}\n{summary}')
+        elif status == CompressWorker.CANCELLED:
+            self.show_notification(message)
+        else:
+            QMessageBox.critical(self, 'Compress', message)
+
+    def extract_volumes(self, volumes, dest_dir, password=None):
+        worker = ExtractVolumesWorker(volumes, dest_dir, password)
+        progress = QProgressDialog(f'Reading {os.path.basename(volumes[0])}...', 'Cancel', 0, 1000, self)
+        progress.setWindowTitle('Extract')
+        progress.setMinimumWidth(450)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.canceled.connect(worker.cancel)
+        worker.progress.connect(lambda: self.on_extract_progress(worker, progress))
+        worker.completed.connect(lambda status, message: self.on_extract_finished(worker, progress, status, message))
+        self.archive_workers.append(worker)
+        worker.start()
+        progress.show()
+
+    def on_extract_progress(self, worker, progress):
+        reader = worker.reader
+        if not reader or not reader.size:
+            return
+        progress.setValue(int(reader.pos * 1000 / reader.size))
+        volume = os.path.basename(reader.paths[reader.index]) if reader.index is not None else ''
+        progress.setLabelText(f'{worker.current_file}\n{worker.files_done} item(s) – reading {volume}'
+                              f' (volume {(reader.index or 0) + 1} of {len(reader.paths)})')
+
+    def on_extract_finished(self, worker, progress, status, message):
+        if worker in self.archive_workers:
+            self.archive_workers.remove(worker)
+            self.retire_worker(worker)
+        progress.close()
+        self.refresh()
+        if status == ExtractVolumesWorker.DONE:
+            QMessageBox.information(self, 'Extract', message)
+        elif status == ExtractVolumesWorker.CANCELLED:
+            self.show_notification(message)
+        else:
+            QMessageBox.critical(self, 'Extract', message)
 
     def extract_item(self, archive_path, dest_dir):
         from PySide6.QtWidgets import QInputDialog, QFileDialog
@@ -1941,6 +4793,10 @@ class FileManager(QMainWindow):
         dest_dir = QFileDialog.getExistingDirectory(self, 'Extract to...', dest_dir)
         if not dest_dir:
             return
+        volumes = archive_volumes(archive_path)
+        if volumes:
+            self.extract_volumes(volumes, dest_dir, password)
+            return
         try:
             if ext == '.zip':
                 with zipfile.ZipFile(archive_path, 'r') as zf:
@@ -1979,6 +4835,11 @@ class FileManager(QMainWindow):
             QMessageBox.critical(self, 'Extract', f'Error: {e}')
 
     def on_directory_changed(self, path):
+        # Cached folder sizes of path and its ancestors are stale now
+        self.folder_size_engine.invalidate(path)
+        self.search_session.invalidate()
+        if self.filename_index:
+            self.filename_index.refresh_directory_async(path)
         # Refresh file view when directory changes
         self.refresh()
         self.show_notification(f'Directory changed: {path}', 2000)
@@ -1992,6 +4853,27 @@ class FileManager(QMainWindow):
         popup = NotificationPopup(self, message, duration)
         popup.show()
 
+    def closeEvent(self, event):
+        if self.transfer_engine.active_jobs():
+            resumable = ' They can be resumed on the next start.' if self.transfer_journal else ''
+            reply = QMessageBox.question(self, 'Transfers', f'Transfers are still running. Stop them and quit?{resumable}', QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+        self.transfer_engine.shutdown()
+        for worker in self.purge_workers:
+            # Whatever is left stays in the trash and is listed again next time
+            worker.interrupt()
+            worker.wait()
+        for worker in self.archive_workers:
+            worker.cancel()
+            worker.wait()
+        if self.search_worker:
+            self.search_worker.stop()
+        if self.content_pool is not None:
+            self.content_pool.shutdown(cancel_futures=True)
+        super().closeEvent(event)
+
     def show_about_dialog(self):
         dlg = AboutDialog(self)
         dlg.exec()
@@ -2073,56 +4955,779 @@ def detect_system_theme():
             pass
         return 'light'
 
+class FuzzyIndex:
+    # Basenames collected by a scan (interned directory table + names). The trigram inverted index over them
+    # is built on the first query, in the worker that asks; candidates sharing enough trigrams with the query
+    # are ranked by difflib similarity against the whole name and each of its words.
+    MAX_ENTRIES = 2000000
+
+    def __init__(self):
+        self.dirs = []
+        self._dir_ids = {}
+        self.dir_of = array('I')
+        self.names = []
+        self._grams = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_directory(self, dirpath, names):
+        with self._lock:
+            if not names or len(self.names) >= self.MAX_ENTRIES:
+                return
+            dir_id = self._dir_ids.get(dirpath)
+            if dir_id is None:
+                dir_id = self._dir_ids[dirpath] = len(self.dirs)
+                self.dirs.append(dirpath)
+            self.dir_of.extend([dir_id] * len(names))
+            self.names.extend(names)
+            self._grams = None
+
+    def path(self, i):
+        return os.path.join(self.dirs[self.dir_of[i]], self.names[i])
+
+    @staticmethod
+    def trigrams(text):
+        text = f'${text}$'
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def score(query, name):
+        name = name.lower()
+        best = difflib.SequenceMatcher(None, query, name).ratio()
+        for word in re.split(r'[\W_]+', name):
+            if word and word != name:
+                best = max(best, difflib.SequenceMatcher(None, query, word).ratio())
+        return best
+
+    def _build(self, is_cancelled):
+        grams = {}
+        for i, name in enumerate(self.names):
+            if i % 10000 == 0 and is_cancelled():
+                return None
+            for gram in self.trigrams(name.lower()):
+                postings = grams.get(gram)
+                if postings is None:
+                    postings = grams[gram] = array('I')
+                postings.append(i)
+        self._grams = grams
+        return grams
+
+    def query(self, text, limit=500, cutoff=0.6, is_cancelled=None, exclude=None):
+        is_cancelled = is_cancelled or (lambda: False)
+        text = os.path.basename(text).lower()
+        grams = self._grams or self._build(is_cancelled)
+        if not grams or not text:
+            return []
+        query_grams = self.trigrams(text)
+        counts = collections.Counter()
+        for gram in query_grams:
+            postings = grams.get(gram)
+            if postings:
+                counts.update(postings)
+        needed = max(1, len(query_grams) // 4)
+        scored = []
+        for n, (i, hits) in enumerate(counts.items()):
+            if n % 5000 == 0 and is_cancelled():
+                return []
+            if hits < needed:
+                continue
+            similarity = self.score(text, self.names[i])
+            if similarity >= cutoff:
+                path = self.path(i)
+                if not exclude or path not in exclude:
+                    scored.append((-similarity, path))
+        scored.sort()
+        return [path for _, path in scored[:limit]]
+
+class SearchQuery:
+    # Query syntax: plain words (substring), globs (*.mkv), /regex/ or re:regex, name:, ext:mkv,mp4, type:dir|file|link,
+    # size:>1G, modified:<7d or modified:>2024-01-01, combined with AND (implicit), OR, NOT / -term and parentheses.
+    # Each term compiles to a predicate over an os.DirEntry with a cost: 0 looks at the name only, 1 at the entry type
+    # (free from readdir on most systems), 2 needs stat. AND/OR evaluate cheaper terms first, so stat is only called
+    # for entries that already passed every name test, and DirEntry caches the stat result it gets.
+    TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|((?:[^\s()"]|"[^"]*")+))')
+    SIZE_RE = re.compile(r'^(>=|<=|>|<|=)?(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?$', re.IGNORECASE)
+    AGE_RE = re.compile(r'^(>=|<=|>|<|=)?(\d+(?:\.\d+)?)\s*(s|m|min|h|d|w|y)$', re.IGNORECASE)
+    DATE_RE = re.compile(r'^(>=|<=|>|<|=)?(\d{4}-\d{2}-\d{2})$')
+    SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+    AGE_UNITS = {'s': 1, 'm': 60, 'min': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+    COMPARE = {'>': lambda a, b: a > b, '>=': lambda a, b: a >= b, '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+               '=': lambda a, b: a == b}
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            m = self.TOKEN_RE.match(text, pos)
+            if not m or m.end() == pos:
+                raise ValueError(f'Could not read the search query near: {text[pos:]}')
+            self.tokens.append(m.group(1) or m.group(2) or m.group(3))
+            pos = m.end()
+        self._pos = 0
+        if not self.tokens:
+            raise ValueError('The search query is empty.')
+        # A single plain word keeps the fast paths: the filename index and the fuzzy fallback
+        self.plain = None
+        if len(self.tokens) == 1 and not self._is_special(self.tokens[0]):
+            self.plain = self.tokens[0].replace('"', '').lower()
+        fn, cost = self._parse_or()
+        if self._pos < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self._pos]}' in the search query.")
+        self.matches = fn
+        self.needs_stat = cost >= 2
+
+    def _is_special(self, token):
+        if token in ('AND', 'OR', 'NOT') or token.startswith('-') or any(c in token for c in '*?['):
+            return True
+        if len(token) > 2 and token.startswith('/') and token.endswith('/'):
+            return True
+        field = token.split(':', 1)[0].lower()
+        return ':' in token and field in ('name', 'ext', 'type', 'size', 'modified', 're', 'regex')
+
+    def _peek(self):
+        return self.tokens[self._pos] if self._pos < len(self.tokens) else None
+
+    def _parse_or(self):
+        terms = [self._parse_and()]
+        while self._peek() == 'OR':
+            self._pos += 1
+            terms.append(self._parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        terms.sort(key=lambda term: term[1])
+        fns = [fn for fn, _ in terms]
+        return (lambda entry: any(fn(entry) for fn in fns)), max(cost for _, cost in terms)
+
+    def _parse_and(self):
+        terms = [self._parse_not()]
+        while self._peek() not in (None, 'OR', ')'):
+            if self._peek() == 'AND':
+                self._pos += 1
+            terms.append(self._parse_not())
+        if len(terms) == 1:
+            return terms[0]
+        terms.sort(key=lambda term: term[1])
+        fn = terms[0][0]
+        for term, _ in terms[1:]:
+            fn = (lambda a, b: lambda entry: a(entry) and b(entry))(fn, term)
+        return fn, max(cost for _, cost in terms)
+
+    def _parse_not(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError('The search query ends too early.')
+        if token == 'NOT' or (token.startswith('-') and len(token) > 1):
+            if token == 'NOT':
+                self._pos += 1
+                fn, cost = self._parse_not()
+            else:
+                self.tokens[self._pos] = token[1:]
+                fn, cost = self._parse_not()
+            return (lambda entry: not fn(entry)), cost
+        if token == '(':
+            self._pos += 1
+            term = self._parse_or()
+            if self._peek() != ')':
+                raise ValueError('Missing ) in the search query.')
+            self._pos += 1
+            return term
+        if token == ')':
+            raise ValueError("Unexpected ')' in the search query.")
+        self._pos += 1
+        return self._term(token)
+
+    def _term(self, token):
+        field, sep, value = token.partition(':')
+        field = field.lower()
+        value = value.replace('"', '')
+        if sep and field in ('re', 'regex'):
+            return self._regex(value), 0
+        if sep and field == 'name':
+            return self._name(value), 0
+        if sep and field == 'ext':
+            exts = tuple('.' + e.strip().lstrip('.').lower() for e in value.split(',') if e.strip())
+            if not exts:
+                raise ValueError('ext: needs at least one extension.')
+            return (lambda entry: entry.name.lower().endswith(exts)), 0
+        if sep and field == 'type':
+            kind = value.lower()
+            if kind in ('dir', 'folder', 'directory'):
+                return (lambda entry: entry.is_dir(follow_symlinks=False)), 1
+            if kind == 'file':
+                return (lambda entry: entry.is_file(follow_symlinks=False)), 1
+            if kind in ('link', 'symlink'):
+                return (lambda entry: entry.is_symlink()), 1
+            raise ValueError(f'Unknown type: {value} (use dir, file or link).')
+        if sep and field == 'size':
+            m = self.SIZE_RE.match(value)
+            if not m:
+                raise ValueError(f'Invalid size: {value} (for example size:>1G or size:<500k).')
+            compare = self.COMPARE[m.group(1) or '=']
+            limit = float(m.group(2)) * self.SIZE_UNITS[m.group(3).lower()]
+            # Folder sizes from stat are meaningless here, so size terms only match files
+            return (lambda entry: not entry.is_dir(follow_symlinks=False)
+                    and compare(entry.stat(follow_symlinks=False).st_size, limit)), 2
+        if sep and field == 'modified':
+            return self._modified(value), 2
+        value = token.replace('"', '')
+        if len(value) > 2 and value.startswith('/') and value.endswith('/'):
+            return self._regex(value[1:-1]), 0
+        return self._name(value), 0
+
+    def _name(self, value):
+        if any(c in value for c in '*?['):
+            pattern = re.compile(fnmatch.translate(value), re.IGNORECASE)
+            return lambda entry: pattern.match(entry.name) is not None
+        needle = value.lower()
+        return lambda entry: needle in entry.name.lower()
+
+    def _regex(self, value):
+        try:
+            pattern = re.compile(value, re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f'Invalid regular expression {value}: {e}')
+        return lambda entry: pattern.search(entry.name) is not None
+
+    def _modified(self, value):
+        now = time.time()
+        m = self.AGE_RE.match(value)
+        if m:
+            # Ages: modified:<7d is newer than 7 days, modified:>1y older than a year; no operator means within
+            age = float(m.group(2)) * self.AGE_UNITS[m.group(3).lower()]
+            op = m.group(1) if m.group(1) not in (None, '=') else '<'
+            compare = self.COMPARE[op]
+            return lambda entry: compare(now - entry.stat(follow_symlinks=False).st_mtime, age)
+        m = self.DATE_RE.match(value)
+        if m:
+            # Dates: modified:>2024-01-01 is after that day, no operator means on that day
+            try:
+                day = time.mktime(time.strptime(m.group(2), '%Y-%m-%d'))
+            except ValueError:
+                raise ValueError(f'Invalid date: {m.group(2)}')
+            op = m.group(1)
+            if not op or op == '=':
+                return lambda entry: day <= entry.stat(follow_symlinks=False).st_mtime < day + 86400
+            bound = day + 86400 if op in ('>', '<=') else day
+            compare = self.COMPARE['>=' if op in ('>', '>=') else '<']
+            return lambda entry: compare(entry.stat(follow_symlinks=False).st_mtime, bound)
+        raise ValueError(f'Invalid modified value: {value} (for example modified:<7d or modified:>2024-01-01).')
+
+class PathEntry:
+    # The os.DirEntry subset SearchQuery uses, for paths that come from a previous result set
+    __slots__ = ('path', 'name', '_lstat', '_stat')
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._lstat = self._stat = None
+
+    def stat(self, follow_symlinks=True):
+        if not follow_symlinks:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def _mode(self, follow_symlinks):
+        try:
+            return self.stat(follow_symlinks).st_mode
+        except OSError:
+            return 0
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self._mode(follow_symlinks))
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self._mode(follow_symlinks))
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._mode(False))
+
+class SearchSession(QObject):
+    # Debounces live searches and remembers the last completed result set. A query that can only match a subset
+    # of it (a longer plain word, or extra AND terms) is answered by filtering those paths instead of rescanning.
+    DEBOUNCE_MS = 250
+    triggered = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.triggered)
+        self.invalidate()
+
+    def schedule(self):
+        self.timer.start(self.DEBOUNCE_MS)
+
+    def cancel(self):
+        self.timer.stop()
+
+    def invalidate(self):
+        self.root = self.recursive = self.query = self.model = self.fuzzy_index = None
+        self.count = 0
+
+    def complete(self, root, recursive, query, model, fuzzy_index=None):
+        self.root = root
+        self.recursive = recursive
+        self.query = query
+        self.model = model
+        self.count = model.result_count()
+        self.fuzzy_index = fuzzy_index
+
+    def narrows(self, root, recursive, query):
+        previous = self.query
+        if previous is None or root != self.root or recursive != self.recursive:
+            return False
+        if previous.plain is not None and query.plain is not None:
+            return previous.plain in query.plain
+        # Appending whole terms ANDs them with the previous query, unless OR changes the grouping
+        extra = query.text[len(previous.text):]
+        return (query.text.startswith(previous.text) and extra[:1].isspace()
+                and 'OR' not in previous.tokens and 'OR' not in query.tokens)
+
+    def candidates(self):
+        return self.model.paths(self.count)
+
+class ParallelWalker:
+    # Work-stealing traversal: every thread pops directories from the back of its own deque and, when that is
+    # empty, steals from the front of another thread's deque (deque pop/popleft are atomic). Each directory's
+    # matches are sorted and handed to a single result queue; directories arrive in the order they finish, so the
+    # stream is ordered within a directory only.
+    def __init__(self, root, match, workers=8, recursive=True, is_cancelled=None, collect=None):
+        self.root = root
+        self.match = match
+        self.collect = collect
+        self.workers = max(1, workers)
+        self.recursive = recursive
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.results = queue.Queue()
+        self.dirs_done = 0
+        self._deques = [collections.deque() for _ in range(self.workers)]
+        self._outstanding = 0
+        self._cond = threading.Condition()
+
+    def pending(self):
+        return self._outstanding
+
+    def _next_dir(self, i):
+        try:
+            return self._deques[i].pop()
+        except IndexError:
+            pass
+        for k in range(1, self.workers):
+            try:
+                return self._deques[(i + k) % self.workers].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _work(self, i):
+        own = self._deques[i]
+        while True:
+            if self.is_cancelled():
+                return
+            path = self._next_dir(i)
+            if path is None:
+                with self._cond:
+                    if self._outstanding == 0:
+                        return
+                    self._cond.wait(0.05)
+                continue
+            matches = []
+            subdirs = []
+            names = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        names.append(entry.name)
+                        try:
+                            # A stat-based term on an entry that vanished or can't be stat'ed only loses that entry
+                            if self.match(entry):
+                                matches.append(entry.path)
+                        except OSError:
+                            pass
+                        if self.recursive:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.path)
+                            except OSError:
+                                pass
+            except OSError:
+                pass
+            if self.collect:
+                self.collect(path, names)
+            if matches:
+                matches.sort()
+                self.results.put(matches)
+            # Count new directories before they become stealable, so the total never reaches zero early
+            with self._cond:
+                self._outstanding += len(subdirs)
+            own.extend(subdirs)
+            with self._cond:
+                self._outstanding -= 1
+                self.dirs_done += 1
+                if subdirs or self._outstanding == 0:
+                    self._cond.notify_all()
+
+    def iter_matches(self):
+        self._deques[0].append(self.root)
+        self._outstanding = 1
+        threads = [threading.Thread(target=self._work, args=(i,), daemon=True) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads) or not self.results.empty():
+            try:
+                yield self.results.get(timeout=0.05)
+            except queue.Empty:
+                # Heartbeat: lets the consumer report progress and flush held results while nothing matches
+                yield []
+
 class SearchWorker(QThread):
     progress = Signal(int)
     found = Signal(list)
     started = Signal()
     finished = Signal()
+    BATCH_SIZE = 1000
+    BATCH_INTERVAL = 0.1
+    PROGRESS_INTERVAL = 0.25
 
-    def __init__(self, root_path, query, recursive=True):
+    def __init__(self, root_path, query, recursive=True, workers=1, fuzzy_index=None, candidates=None, candidate_count=0):
         super().__init__()
         self.root_path = root_path
-        self.query = query.lower()
+        self.query = query if isinstance(query, SearchQuery) else SearchQuery(query)
         self.recursive = recursive
+        self.workers = workers
+        self.fuzzy_index = fuzzy_index
+        # Paths from a previous result set to filter instead of scanning the tree
+        self.candidates = candidates
+        self.candidate_count = candidate_count
         self._is_running = True
 
     def run(self):
+        # One os.scandir pass; matches go out in batches bounded by count and time, progress a few times a second
         self.started.emit()
-        results = []
-        total = 0
-        matches = 0
-        # Count total files/folders for progress
-        for dirpath, dirnames, filenames in os.walk(self.root_path):
-            total += len(dirnames) + len(filenames)
-            if not self.recursive:
+        self._batch = []
+        self._percent = 0
+        self._last_flush = self._last_progress = 0.0
+        if self.candidates is not None:
+            self._run_candidates()
+        elif self.recursive and self.workers > 1:
+            self._run_parallel()
+        else:
+            self._run_serial()
+        self._flush()
+        if self._is_running:
+            self.progress.emit(100)
+        self.finished.emit()
+
+    def _run_serial(self):
+        stack = [self.root_path]
+        dirs_done = 0
+        while stack and self._is_running:
+            current = stack.pop()
+            names = []
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if not self._is_running:
+                            break
+                        names.append(entry.name)
+                        try:
+                            # A stat-based term on an entry that vanished or can't be stat'ed only loses that entry
+                            if self.query.matches(entry):
+                                self._add_matches([entry.path])
+                        except OSError:
+                            pass
+                        if self.recursive:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    stack.append(entry.path)
+                            except OSError:
+                                pass
+            except OSError:
+                pass
+            if self.fuzzy_index is not None:
+                self.fuzzy_index.add_directory(current, names)
+            dirs_done += 1
+            self._flush_due()
+            self._report_progress(dirs_done, len(stack))
+
+    def _run_parallel(self):
+        walker = ParallelWalker(self.root_path, self.query.matches, self.workers,
+                                is_cancelled=lambda: not self._is_running,
+                                collect=self.fuzzy_index.add_directory if self.fuzzy_index is not None else None)
+        for matches in walker.iter_matches():
+            self._add_matches(matches)
+            self._flush_due()
+            self._report_progress(walker.dirs_done, walker.pending())
+        self._report_progress(walker.dirs_done, walker.pending())
+
+    def _run_candidates(self):
+        matches = self.query.matches
+        for i, path in enumerate(self.candidates):
+            if not self._is_running:
                 break
-        if total == 0:
-            total = 1
-        processed = 0
-        for dirpath, dirnames, filenames in os.walk(self.root_path):
-            # Search folders
-            for d in dirnames:
-                if not self._is_running:
-                    self.finished.emit()
-                    return
-                processed += 1
-                if self.query in d.lower():
-                    results.append(os.path.join(dirpath, d))
-                self.progress.emit(int(processed * 100 / total))
-            # Search files
-            for f in filenames:
-                if not self._is_running:
-                    self.finished.emit()
-                    return
-                processed += 1
-                if self.query in f.lower():
-                    results.append(os.path.join(dirpath, f))
-                self.progress.emit(int(processed * 100 / total))
-            if not self.recursive:
+            try:
+                matched = matches(PathEntry(path))
+            except OSError:
+                # Deleted or renamed since the previous search: no longer a match
+                matched = False
+            if matched:
+                self._add_matches([path])
+            if i % 4096 == 0:
+                self._report_progress(i, self.candidate_count - i)
+
+    def _add_matches(self, paths):
+        self._batch.extend(paths)
+        self._flush_due(len(self._batch) >= self.BATCH_SIZE)
+
+    def _flush_due(self, full=False):
+        # Held matches go out once the batch is full or BATCH_INTERVAL has passed, checked per match and per
+        # directory, so a match never waits for the next one to be delivered
+        now = time.monotonic()
+        if self._batch and (full or now - self._last_flush >= self.BATCH_INTERVAL):
+            self._flush()
+            self._last_flush = now
+
+    def _flush(self):
+        if self._batch:
+            self.found.emit(self._batch)
+            self._batch = []
+
+    def _report_progress(self, dirs_done, dirs_queued):
+        now = time.monotonic()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL:
+            # The total is unknown up front; estimate it from finished vs. still queued directories
+            self._percent = max(self._percent, int(dirs_done * 100 / max(1, dirs_done + dirs_queued)))
+            self.progress.emit(self._percent)
+            self._last_progress = now
+
+    def stop(self):
+        self._is_running = False
+
+GREP_SNIFF_BYTES = 8192
+GREP_MMAP_THRESHOLD = 1024 * 1024
+GREP_SNIPPET_BYTES = 200
+_grep_patterns = {}
+
+def grep_file(path, pattern, max_hits=100):
+    # Binary files are skipped after sniffing the first block; large files are searched through mmap
+    hits = []
+    try:
+        with open(path, 'rb') as f:
+            if b'\0' in f.read(GREP_SNIFF_BYTES):
+                return hits
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return hits
+            if size >= GREP_MMAP_THRESHOLD:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                f.seek(0)
+                data = f.read()
+    except (OSError, ValueError):
+        return hits
+    try:
+        line = 1
+        counted = 0
+        next_line = -1
+        for m in pattern.finditer(data):
+            start = m.start()
+            if start < next_line:
+                continue
+            line += data[counted:start].count(b'\n')
+            counted = start
+            line_start = data.rfind(b'\n', 0, start) + 1
+            line_end = data.find(b'\n', start)
+            if line_end < 0:
+                line_end = len(data)
+            snippet = data[line_start:min(line_end, line_start + GREP_SNIPPET_BYTES)]
+            hits.append((path, line, snippet.decode('utf-8', 'replace').strip()))
+            if len(hits) >= max_hits:
                 break
-        self.found.emit(results)
+            # One hit per line
+            next_line = line_end + 1
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return hits
+
+def grep_files(paths, text, regex=False):
+    # Runs in the content search process pool; patterns are compiled once per process
+    key = (text, regex)
+    pattern = _grep_patterns.get(key)
+    if pattern is None:
+        source = text.encode('utf-8') if regex else re.escape(text.encode('utf-8'))
+        pattern = _grep_patterns[key] = re.compile(source, re.IGNORECASE | re.MULTILINE)
+    hits = []
+    for path in paths:
+        hits.extend(grep_file(path, pattern))
+    return hits
+
+class ContentSearchWorker(QThread):
+    progress = Signal(int)
+    found = Signal(list)
+    finished = Signal()
+    BATCH_INTERVAL = 0.1
+    CHUNK_FILES = 64
+    CHUNK_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, root_path, text, regex=False, recursive=True, pool=None, workers=1, max_size=16 * 1024 * 1024,
+                 extensions=None):
+        super().__init__()
+        self.root_path = root_path
+        self.text = text
+        self.regex = regex
+        self.recursive = recursive
+        self.pool = pool
+        self.workers = workers
+        self.max_size = max_size
+        self.extensions = extensions
+        self._is_running = True
+
+    def run(self):
+        # The walk stays in this thread and hands chunks of files to the process pool; results stream back as they finish
+        self._batch = []
+        self._last_flush = 0.0
+        self._submitted = self._completed = 0
+        self._chunks = {}
+        self._percent = 0
+        pending = set()
+        limit = 4 * max(1, self.workers)
+        chunk, chunk_bytes = [], 0
+        for path, size in self._iter_files():
+            chunk.append(path)
+            chunk_bytes += size
+            if len(chunk) >= self.CHUNK_FILES or chunk_bytes >= self.CHUNK_BYTES:
+                pending.add(self._submit(chunk))
+                chunk, chunk_bytes = [], 0
+                while len(pending) >= limit and self._is_running:
+                    pending = self._drain(pending, concurrent.futures.FIRST_COMPLETED)
+        if chunk and self._is_running:
+            pending.add(self._submit(chunk))
+        while pending and self._is_running:
+            pending = self._drain(pending, concurrent.futures.FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+        self._flush()
+        if self._is_running:
+            self.progress.emit(100)
         self.finished.emit()
 
+    def _iter_files(self):
+        stack = [self.root_path]
+        while stack and self._is_running:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive:
+                                    stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            if self.extensions and os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                                continue
+                            size = entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+                        if 0 < size <= self.max_size:
+                            yield entry.path, size
+            except OSError:
+                pass
+
+    def _submit(self, chunk):
+        self._submitted += 1
+        if self.pool is not None:
+            try:
+                future = self.pool.submit(grep_files, chunk, self.text, self.regex)
+                self._chunks[future] = chunk
+                return future
+            except RuntimeError:
+                # The pool was shut down or broke; search in this thread instead
+                self.pool = None
+        future = concurrent.futures.Future()
+        future.set_result(grep_files(chunk, self.text, self.regex))
+        return future
+
+    def _drain(self, pending, return_when):
+        done, pending = concurrent.futures.wait(pending, timeout=0.1, return_when=return_when)
+        for future in done:
+            self._completed += 1
+            chunk = self._chunks.pop(future, None)
+            try:
+                self._batch.extend(future.result())
+            except concurrent.futures.BrokenExecutor:
+                self.pool = None
+                self._batch.extend(grep_files(chunk, self.text, self.regex))
+            except Exception:
+                pass
+        now = time.monotonic()
+        if now - self._last_flush >= self.BATCH_INTERVAL:
+            self._flush()
+            self._last_flush = now
+            # The total is unknown while the walk runs; report finished chunks against those submitted so far
+            self._percent = max(self._percent, int(self._completed * 100 / max(1, self._submitted + 1)))
+            self.progress.emit(self._percent)
+        return pending
+
+    def _flush(self):
+        if self._batch:
+            self.found.emit(self._batch)
+            self._batch = []
+
+    def stop(self):
+        self._is_running = False
+
+class FuzzySearchWorker(QThread):
+    found = Signal(list)
+
+    def __init__(self, query, fuzzy_index=None, root_path=None, recursive=True, filename_index=None, exclude=None):
+        super().__init__()
+        self.query = query
+        self.fuzzy_index = fuzzy_index
+        self.root_path = root_path
+        self.recursive = recursive
+        self.filename_index = filename_index
+        self.exclude = exclude
+        self._is_running = True
+
+    def run(self):
+        index = self.fuzzy_index
+        if index is None:
+            # No scan collected names for us (the search came from the filename index): gather them now
+            index = FuzzyIndex()
+            if self.filename_index and self.filename_index.covers(self.root_path):
+                for dirpath, names in self.filename_index.iter_directories(self.root_path, self.recursive):
+                    if not self._is_running:
+                        return
+                    index.add_directory(dirpath, names)
+            else:
+                stack = [self.root_path]
+                while stack and self._is_running:
+                    current = stack.pop()
+                    names = []
+                    try:
+                        with os.scandir(current) as it:
+                            for entry in it:
+                                names.append(entry.name)
+                                if self.recursive and entry.is_dir(follow_symlinks=False):
+                                    stack.append(entry.path)
+                    except OSError:
+                        pass
+                    index.add_directory(current, names)
+        results = index.query(self.query, is_cancelled=lambda: not self._is_running, exclude=self.exclude)
+        if self._is_running:
+            self.found.emit(results)
+
     def stop(self):
         self._is_running = False
 
@@ -2162,31 +5767,1391 @@ def get_recent(limit=None):
     except Exception:
         return []
 
+class IndexBuildWorker(QThread):
+    progress = Signal(int)
+
+    def __init__(self, index, roots):
+        super().__init__()
+        self.index = index
+        self.roots = roots
+        self._is_running = True
+
+    def run(self):
+        for root in self.roots:
+            if not self._is_running:
+                break
+            self.index.build(root, lambda: not self._is_running, self.progress.emit)
+
+    def stop(self):
+        self._is_running = False
+
+COMPRESS_LEVELS = {'Store (no compression)': 0, 'Fast': 1, 'Normal': 6, 'Best': 9}
+
+def deflate_block(data, zdict, level, last):
+    # One pigz-style block: raw deflate primed with the previous block's tail, ended on a byte boundary
+    # (sync flush) so blocks concatenate into a single stream; only the last block finishes it
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 8, zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+class DeflatePipeline:
+    # Compresses blocks on a thread pool (zlib releases the GIL) and writes the results strictly in submission
+    # order, interleaved with the headers queued through call(). Only a few blocks per thread are in flight,
+    # so memory stays small however large the input is.
+    BLOCK_SIZE = 128 * 1024
+    DICT_SIZE = 32 * 1024
+
+    def __init__(self, write, level, threads):
+        self.sink = write
+        self.offset = 0
+        self.level = level
+        self.threads = threads
+        self.window = threads * 4
+        self.pending = collections.deque()
+        self.pool = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='deflate')
+
+    def write(self, data):
+        self.sink(data)
+        self.offset += len(data)
+
+    def call(self, fn):
+        self.pending.append((None, fn))
+        self.drain(self.window)
+
+    def submit(self, callback, *args):
+        self.pending.append((self.pool.submit(deflate_block, *args), callback))
+        self.drain(self.window)
+
+    def drain(self, keep=0):
+        while len(self.pending) > keep:
+            future, callback = self.pending.popleft()
+            callback(future.result() if future is not None else None)
+
+    def close(self):
+        try:
+            self.drain()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+    def abort(self):
+        self.pending.clear()
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class DeflateStream:
+    # One deflate (or stored) stream fed through a pipeline; crc and sizes are ready once finish() is written
+    def __init__(self, pipeline, stored=False):
+        self.pipeline = pipeline
+        self.stored = stored
+        self.buffer = bytearray()
+        self.tail = b''
+        self.crc = self.size = self.compressed = 0
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.buffer += data
+        while len(self.buffer) >= DeflatePipeline.BLOCK_SIZE:
+            block = bytes(self.buffer[:DeflatePipeline.BLOCK_SIZE])
+            del self.buffer[:DeflatePipeline.BLOCK_SIZE]
+            self._submit(block, False)
+        return len(data)
+
+    def finish(self):
+        block = bytes(self.buffer)
+        self.buffer = bytearray()
+        self._submit(block, True)
+
+    def _submit(self, block, last):
+        if self.stored:
+            if block:
+                self.pipeline.call(lambda _: self._emit(block))
+            return
+        self.pipeline.submit(self._emit, block, self.tail, self.pipeline.level, last)
+        self.tail = block[-DeflatePipeline.DICT_SIZE:]
+
+    def _emit(self, data):
+        self.compressed += len(data)
+        self.pipeline.write(data)
+
+class ParallelGzipFile:
+    # Write-only gzip file whose single member is deflated block-parallel; any gunzip reads it
+    def __init__(self, pipeline, name='', mtime=None):
+        self.pipeline = pipeline
+        self.stream = DeflateStream(pipeline)
+        name = os.path.basename(name).encode('latin-1', 'replace')
+        if name.endswith(b'.gz'):
+            name = name[:-3]
+        xfl = 2 if pipeline.level == 9 else 4 if pipeline.level == 1 else 0
+        header = struct.pack('<BBBBLBB', 0x1f, 0x8b, 8, 0x08 if name else 0,
+                             int(time.time() if mtime is None else mtime) & 0xFFFFFFFF, xfl, 3)
+        pipeline.call(lambda _: pipeline.write(header + (name + b'\0' if name else b'')))
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def close(self):
+        stream = self.stream
+        stream.finish()
+        self.pipeline.call(lambda _: self.pipeline.write(struct.pack('<LL', stream.crc, stream.size & 0xFFFFFFFF)))
+        self.pipeline.drain()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+
+class ZipStreamWriter:
+    # Streaming ZIP writer for the parallel and split paths. Entries use data descriptors (crc and sizes follow
+    # the data), so nothing already written is revisited and entries can be compressed ahead of being written.
+    # Given a VolumeWriter it writes a spanned archive: offsets are relative to the volume (disk) they are on,
+    # and headers and directory records are never cut across volumes.
+    ZIP64_LIMIT = 0xFFFFFFFF
+    # Entries at least this large get ZIP64 sizes up front; deflate's worst case overhead never gets close
+    ZIP64_ENTRY = 0xF0000000
+
+    def __init__(self, pipeline, volumes=None):
+        self.pipeline = pipeline
+        self.write = pipeline.write
+        self.volumes = volumes
+        self.entries = []
+        if volumes:
+            # Split archive signature; rewritten as the single-volume marker if everything fits in one volume
+            self.write(b'PK\x07\x08')
+
+    def position(self):
+        # (disk, offset) of the next byte written
+        if self.volumes:
+            return self.volumes.index, self.volumes.position
+        return 0, self.pipeline.offset
+
+    def record(self, data):
+        # Writes a header or directory record and returns the (disk, offset) it starts at
+        if self.volumes:
+            self.volumes.reserve(len(data))
+        position = self.position()
+        self.write(data)
+        return position
+
+    def copy_existing(self, path):
+        # Appending: keep the existing archive's records byte for byte, only the central directory is rebuilt.
+        # Returns the archive's comment.
+        with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+            infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+            ends = [info.header_offset for info in infos[1:]] + [zf.start_dir]
+            for info, end in zip(infos, ends):
+                f.seek(info.header_offset)
+                header = f.read(30)
+                if len(header) < 30 or header[:4] != b'PK\x03\x04':
+                    raise zipfile.BadZipFile(f'bad local header for {info.filename}')
+                name_length, extra_length = struct.unpack('<HH', header[26:30])
+                header += f.read(name_length + extra_length)
+                entry = {'name': info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'cp437'),
+                         'flags': info.flag_bits, 'method': info.compress_type, 'dostime': self.dostime(info.date_time),
+                         'attr': info.external_attr, 'crc': info.CRC, 'size': info.file_size,
+                         'compressed': info.compress_size}
+                entry['disk'], entry['offset'] = self.record(header)
+                remaining = end - info.header_offset - len(header)
+                while remaining > 0:
+                    data = f.read(min(remaining, 1024 * 1024))
+                    if not data:
+                        raise zipfile.BadZipFile(f'truncated entry {info.filename}')
+                    self.write(data)
+                    remaining -= len(data)
+                self.entries.append(entry)
+            return zf.comment
+
+    @staticmethod
+    def dostime(date_time):
+        year, month, day, hour, minute, second = date_time[:6]
+        if year < 1980:
+            year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+        elif year > 2107:
+            year, month, day, hour, minute, second = 2107, 12, 31, 23, 59, 58
+        return ((year - 1980) << 9 | month << 5 | day) << 16 | hour << 11 | minute << 5 | second // 2
+
+    def begin(self, arcname, st, stored):
+        try:
+            name = arcname.encode('ascii')
+            flags = 0x08
+        except UnicodeEncodeError:
+            name = arcname.encode('utf-8')
+            flags = 0x08 | 0x800
+        entry = {'name': name, 'flags': flags, 'method': zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED,
+                 'dostime': self.dostime(time.localtime(st.st_mtime)), 'attr': (st.st_mode & 0xFFFF) << 16,
+                 'zip64': st.st_size >= self.ZIP64_ENTRY}
+        self.pipeline.call(lambda _: self._local_header(entry))
+        return entry
+
+    def _local_header(self, entry):
+        extra = struct.pack('<HHQQ', 1, 16, 0, 0) if entry['zip64'] else b''
+        version = 45 if entry['zip64'] else 20
+        sizes = self.ZIP64_LIMIT if entry['zip64'] else 0
+        entry['disk'], entry['offset'] = self.record(
+            struct.pack('<4sBBHHLLLLHH', b'PK\x03\x04', version, 0, entry['flags'], entry['method'], entry['dostime'],
+                        0, sizes, sizes, len(entry['name']), len(extra)) + entry['name'] + extra)
+
+    def end(self, entry, stream):
+        def descriptor(_):
+            entry.update(crc=stream.crc, size=stream.size, compressed=stream.compressed)
+            if entry['zip64']:
+                self.record(struct.pack('<4sLQQ', b'PK\x07\x08', stream.crc, entry['compressed'], stream.size))
+            elif max(entry['compressed'], stream.size) >= self.ZIP64_LIMIT:
+                raise OSError(errno.EFBIG, f'{entry["name"].decode("utf-8", "replace")} grew past 4 GiB while compressing')
+            else:
+                self.record(struct.pack('<4sLLL', b'PK\x07\x08', stream.crc, entry['compressed'], stream.size))
+        self.pipeline.call(descriptor)
+        self.entries.append(entry)
+
+    def close(self, comment=b''):
+        self.pipeline.drain()
+        start = None
+        size = 0
+        per_disk = collections.Counter()
+        for entry in self.entries:
+            zip64 = []
+            file_size, compressed, offset, disk = entry['size'], entry['compressed'], entry['offset'], entry['disk']
+            if file_size >= self.ZIP64_LIMIT:
+                zip64.append(file_size)
+                file_size = self.ZIP64_LIMIT
+            if compressed >= self.ZIP64_LIMIT:
+                zip64.append(compressed)
+                compressed = self.ZIP64_LIMIT
+            if offset >= self.ZIP64_LIMIT:
+                zip64.append(offset)
+                offset = self.ZIP64_LIMIT
+            extra = struct.pack(f'<HH{len(zip64)}Q', 1, 8 * len(zip64), *zip64) if zip64 else b''
+            if disk >= 0xFFFF:
+                extra = struct.pack(f'<HH{len(zip64)}QL', 1, 8 * len(zip64) + 4, *zip64, disk)
+                disk = 0xFFFF
+            version = 45 if extra else 20
+            data = struct.pack('<4sBBBBHHLLLLHHHHHLL', b'PK\x01\x02', version, 3, version, 0, entry['flags'],
+                               entry['method'], entry['dostime'], entry['crc'], compressed, file_size, len(entry['name']),
+                               len(extra), 0, disk, 0, entry['attr'], offset) + entry['name'] + extra
+            record_disk, record_offset = self.record(data)
+            if start is None:
+                start = (record_disk, record_offset)
+            per_disk[record_disk] += 1
+            size += len(data)
+        if start is None:
+            start = self.position()
+        start_disk, start_offset = start
+        count = len(self.entries)
+        comment = comment[:0xFFFF]
+        eocd_size = 22 + len(comment)
+        zip64_needed = (count > 0xFFFF or start_offset >= self.ZIP64_LIMIT or size >= self.ZIP64_LIMIT
+                        or start_disk >= 0xFFFF)
+        # The end records stay together on the last volume
+        if self.volumes:
+            self.volumes.reserve(eocd_size + (76 if zip64_needed else 0))
+        disk, offset = self.position()
+        on_last_disk = per_disk[disk]
+        if zip64_needed:
+            self.write(struct.pack('<4sQHHLLQQQQ', b'PK\x06\x06', 44, 45, 45, disk, start_disk, on_last_disk, count,
+                                   size, start_offset))
+            self.write(struct.pack('<4sLQL', b'PK\x06\x07', disk, offset, disk + 1))
+        self.write(struct.pack('<4sHHHHLLH', b'PK\x05\x06', min(disk, 0xFFFF), min(start_disk, 0xFFFF),
+                               min(on_last_disk, 0xFFFF), min(count, 0xFFFF), min(size, self.ZIP64_LIMIT),
+                               min(start_offset, self.ZIP64_LIMIT), len(comment)) + comment)
+        self.pipeline.drain()
+        if self.volumes and self.volumes.index == 0:
+            self.volumes.rewrite_start(b'PK00')
+
+class VolumeWriter:
+    # Write-only file that cuts its output into volumes of volume_size bytes as it is written, so a split archive
+    # never exists in one piece. Volumes go to hidden .part files until commit() gives them their names (the last
+    # one last_name, when set); discard() removes them.
+    def __init__(self, name_for, volume_size, last_name=None):
+        self.name_for = name_for
+        self.volume_size = volume_size
+        self.last_name = last_name
+        self.parts = []
+        self.index = -1
+        self.position = 0
+        self.written = 0
+        self.f = None
+        self.next_volume()
+
+    @staticmethod
+    def part_name(path):
+        return os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.part')
+
+    def next_volume(self):
+        if self.f:
+            self.f.close()
+        self.index += 1
+        part = self.part_name(self.name_for(self.index))
+        self.parts.append(part)
+        self.f = open(part, 'wb')
+        self.position = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self.position >= self.volume_size:
+                self.next_volume()
+            n = min(len(view), self.volume_size - self.position)
+            self.f.write(view[:n])
+            self.position += n
+            view = view[n:]
+        self.written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.written
+
+    def reserve(self, size):
+        # Starts a new volume unless size more bytes fit in the current one
+        if self.position and self.position + size > self.volume_size:
+            self.next_volume()
+
+    def rewrite_start(self, data):
+        # Only the current volume's beginning can still be changed
+        self.f.seek(0)
+        self.f.write(data)
+        self.f.seek(0, os.SEEK_END)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def commit(self):
+        self.close()
+        names = [self.name_for(i) for i in range(len(self.parts))]
+        if self.last_name:
+            names[-1] = self.last_name
+        for part, name in zip(self.parts, names):
+            os.replace(part, name)
+        # Volumes left over from an earlier, longer archive of the same name would be read as part of this one
+        i = len(self.parts) - 1 if self.last_name else len(self.parts)
+        while os.path.exists(self.name_for(i)):
+            os.remove(self.name_for(i))
+            i += 1
+        return names
+
+    def discard(self):
+        self.close()
+        for part in self.parts:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+
+def archive_volumes(path):
+    # Every volume of a split archive, in order, given any one of them: name.z01, name.z02, ... name.zip for a
+    # spanned ZIP, or name.001, name.002, ... for an archive cut into plain byte ranges. None if path isn't one.
+    m = re.match(r'(.*)\.(z\d{2,}|zip)$', path, re.IGNORECASE)
+    if m:
+        base = m.group(1)
+        volumes = []
+        while os.path.exists(f'{base}.z{len(volumes) + 1:02d}'):
+            volumes.append(f'{base}.z{len(volumes) + 1:02d}')
+        if volumes and os.path.exists(f'{base}.zip'):
+            return volumes + [f'{base}.zip']
+        return None
+    m = re.match(r'(.*)\.\d{3}$', path)
+    if m:
+        volumes = []
+        while os.path.exists(f'{m.group(1)}.{len(volumes) + 1:03d}'):
+            volumes.append(f'{m.group(1)}.{len(volumes) + 1:03d}')
+        return volumes or None
+    return None
+
+class VolumeReader:
+    # Read-only, seekable view of a split archive's volumes as one file; only the volume being read is open
+    def __init__(self, paths, on_read=None):
+        self.paths = paths
+        self.on_read = on_read
+        self.starts = []
+        self.size = 0
+        for path in paths:
+            self.starts.append(self.size)
+            self.size += os.path.getsize(path)
+        self.pos = 0
+        self.index = None
+        self.f = None
+        self.name = paths[0]
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.pos
+        chunks = []
+        while size > 0 and self.pos < self.size:
+            index = bisect.bisect_right(self.starts, self.pos) - 1
+            if index != self.index:
+                if self.f:
+                    self.f.close()
+                self.f = open(self.paths[index], 'rb')
+                self.index = index
+            end = self.starts[index + 1] if index + 1 < len(self.starts) else self.size
+            self.f.seek(self.pos - self.starts[index])
+            data = self.f.read(min(size, end - self.pos))
+            if not data:
+                raise OSError(errno.EIO, f'{self.paths[index]} is shorter than when it was opened')
+            chunks.append(data)
+            self.pos += len(data)
+            size -= len(data)
+        if self.on_read:
+            self.on_read()
+        return b''.join(chunks)
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+class SpannedZipReader:
+    # Reads ZIP archives spanned across .z01, .z02, ... .zip volumes, which zipfile cannot open: offsets there are
+    # relative to the volume (disk) a record is on. Entries are streamed out of the volumes one at a time.
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.entries, self.comment = self.read_directory()
+
+    def at(self, disk, offset):
+        if disk >= len(self.reader.starts):
+            raise zipfile.BadZipFile(f'volume {disk + 1} of the archive is missing')
+        return self.reader.starts[disk] + offset
+
+    def read_directory(self):
+        reader = self.reader
+        tail_start = max(reader.starts[-1], reader.size - 22 - 0xFFFF)
+        reader.seek(tail_start)
+        tail = reader.read()
+        i = tail.rfind(b'PK\x05\x06')
+        if i < 0 or len(tail) - i < 22:
+            raise zipfile.BadZipFile('end of central directory not found in the last volume')
+        _, disk, start_disk, _, count, size, start_offset, comment_length = struct.unpack('<4sHHHHLLH', tail[i:i + 22])
+        comment = tail[i + 22:i + 22 + comment_length]
+        locator = tail[i - 20:i] if i >= 20 else b''
+        if locator[:4] == b'PK\x06\x07':
+            _, zip64_disk, zip64_offset, _ = struct.unpack('<4sLQL', locator)
+            reader.seek(self.at(zip64_disk, zip64_offset))
+            record = reader.read(56)
+            if record[:4] != b'PK\x06\x06':
+                raise zipfile.BadZipFile('bad ZIP64 end of central directory')
+            _, _, _, _, disk, start_disk, _, count, size, start_offset = struct.unpack('<4sQHHLLQQQQ', record)
+        reader.seek(self.at(start_disk, start_offset))
+        directory = reader.read(size)
+        entries = []
+        pos = 0
+        for _ in range(count):
+            fields = struct.unpack('<4sBBBBHHLLLLHHHHHLL', directory[pos:pos + 46])
+            if fields[0] != b'PK\x01\x02':
+                raise zipfile.BadZipFile('bad central directory record')
+            flags, method, crc, compressed, file_size = fields[5], fields[6], fields[8], fields[9], fields[10]
+            name_length, extra_length, comment_length, entry_disk = fields[11], fields[12], fields[13], fields[14]
+            offset = fields[17]
+            name = directory[pos + 46:pos + 46 + name_length]
+            extra = directory[pos + 46 + name_length:pos + 46 + name_length + extra_length]
+            pos += 46 + name_length + extra_length + comment_length
+            # ZIP64 extra field: only the fields that overflowed, in this order
+            j = 0
+            while j + 4 <= len(extra):
+                tag, length = struct.unpack('<HH', extra[j:j + 4])
+                if tag == 1:
+                    values = extra[j + 4:j + 4 + length]
+                    k = 0
+                    if file_size == 0xFFFFFFFF:
+                        file_size, = struct.unpack('<Q', values[k:k + 8])
+                        k += 8
+                    if compressed == 0xFFFFFFFF:
+                        compressed, = struct.unpack('<Q', values[k:k + 8])
+                        k += 8
+                    if offset == 0xFFFFFFFF:
+                        offset, = struct.unpack('<Q', values[k:k + 8])
+                        k += 8
+                    if entry_disk == 0xFFFF:
+                        entry_disk, = struct.unpack('<L', values[k:k + 4])
+                j += 4 + length
+            entries.append({'name': name.decode('utf-8' if flags & 0x800 else 'cp437'), 'flags': flags,
+                            'method': method, 'crc': crc, 'compressed': compressed, 'size': file_size,
+                            'position': self.at(entry_disk, offset)})
+        return entries, comment
+
+    def extract(self, entry, dest_dir):
+        # Member names are sanitized like zipfile does: no absolute paths, no '..'
+        parts = [p for p in entry['name'].replace('\\', '/').split('/') if p not in ('', '.', '..')]
+        if not parts:
+            return
+        target = os.path.join(dest_dir, *parts)
+        if entry['name'].endswith('/'):
+            os.makedirs(target, exist_ok=True)
+            return
+        if entry['flags'] & 0x1:
+            raise OSError(errno.ENOTSUP, f'{entry["name"]} is encrypted')
+        if entry['method'] not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise OSError(errno.ENOTSUP, f'{entry["name"]}: unsupported compression method {entry["method"]}')
+        reader = self.reader
+        reader.seek(entry['position'])
+        header = reader.read(30)
+        if header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f'bad local header for {entry["name"]}')
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        reader.seek(entry['position'] + 30 + name_length + extra_length)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if entry['method'] == zipfile.ZIP_DEFLATED else None
+        crc = 0
+        remaining = entry['compressed']
+        with open(target, 'wb') as out:
+            while remaining:
+                chunk = reader.read(min(remaining, self.CHUNK_SIZE))
+                if not chunk:
+                    raise zipfile.BadZipFile(f'{entry["name"]} is truncated')
+                remaining -= len(chunk)
+                while chunk:
+                    if decompressor:
+                        # Bounded output: highly compressed data doesn't inflate into one huge buffer
+                        data = decompressor.decompress(chunk, self.CHUNK_SIZE)
+                        chunk = decompressor.unconsumed_tail
+                    else:
+                        data, chunk = chunk, b''
+                    crc = zlib.crc32(data, crc)
+                    out.write(data)
+            if decompressor:
+                data = decompressor.flush()
+                crc = zlib.crc32(data, crc)
+                out.write(data)
+        if crc != entry['crc']:
+            raise zipfile.BadZipFile(f'CRC mismatch in {entry["name"]}')
+
+class CountingReader:
+    # Source file wrapper: counts bytes for the worker's statistics and stops the archiver once cancelled
+    def __init__(self, f, worker):
+        self.f = f
+        self.worker = worker
+
+    def read(self, size=-1):
+        self.worker.checkpoint()
+        data = self.f.read(size)
+        self.worker.add_input(len(data))
+        return data
+
+class CountingWriter:
+    # Archive file wrapper: counts what the format library writes; everything else goes to the file
+    def __init__(self, f, worker):
+        self.f = f
+        self.worker = worker
+        # Format libraries record this name (gzip headers), not the temporary file's
+        self.name = worker.archive_path
+
+    def write(self, data):
+        n = self.f.write(data)
+        self.worker.bytes_out += len(data) if n is None else n
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+class CompressWorker(QThread):
+    # Builds an archive off the GUI thread. The archive is written to a hidden .part file next to the target
+    # and renamed over it when complete, so a cancelled or failed run leaves nothing behind (and appending
+    # never damages the existing archive).
+    progress = Signal()
+    completed = Signal(str, str)
+    CHUNK_SIZE = 1024 * 1024
+    REPORT_INTERVAL = 0.1
+    DONE, CANCELLED, FAILED = 'done', 'cancelled', 'failed'
+
+    def __init__(self, paths, archive_path, fmt, level='Normal', password=None, exclude_patterns=(), add_existing=False,
+                 comment='', store_paths=True, encrypt_names=False, threads=1, volume_size=0):
+        super().__init__()
+        self.paths = list(paths)
+        self.archive_path = archive_path
+        self.fmt = fmt
+        self.level = level
+        self.password = password
+        self.exclude_patterns = list(exclude_patterns)
+        self.add_existing = add_existing
+        self.comment = comment
+        self.store_paths = store_paths
+        self.encrypt_names = encrypt_names
+        # More than one thread selects the block-parallel deflate path for ZIP, .gz and .tar.gz
+        self.threads = max(1, threads)
+        self.compresslevel = COMPRESS_LEVELS.get(level, 6)
+        # Non-zero: cut the archive into volumes of this many bytes while writing it
+        self.volume_size = volume_size
+        self.volumes = None
+        self.bytes_total = self.bytes_in = self.bytes_out = 0
+        self.files_total = self.files_done = 0
+        self.current_file = ''
+        self.started_at = None
+        self._cancelled = False
+        self._last_report = 0
+
+    def cancel(self):
+        self._cancelled = True
+
+    def checkpoint(self):
+        if self._cancelled:
+            raise TransferCancelled()
+
+    def add_input(self, n):
+        self.bytes_in += n
+        now = time.monotonic()
+        if now - self._last_report >= self.REPORT_INTERVAL:
+            self._last_report = now
+            self.progress.emit()
+
+    def ratio(self):
+        return self.bytes_out / self.bytes_in if self.bytes_in else 0
+
+    def speed(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return self.bytes_in / elapsed if elapsed > 0 else 0
+
+    def excluded(self, path):
+        return any(fnmatch.fnmatch(path, pat) for pat in self.exclude_patterns)
+
+    def entries(self, arcname_for):
+        # (path, arcname, lstat) for each top-level item and, inside folders, every entry below it
+        items = []
+        for path in self.paths:
+            if self.excluded(path):
+                continue
+            try:
+                items.append((path, arcname_for(path, path), os.lstat(path)))
+            except OSError:
+                continue
+            if not os.path.isdir(path) or os.path.islink(path):
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in dirs + sorted(files):
+                    full_path = os.path.join(root, name)
+                    if self.excluded(full_path):
+                        continue
+                    try:
+                        items.append((full_path, arcname_for(path, full_path), os.lstat(full_path)))
+                    except OSError:
+                        continue
+        for _, _, st in items:
+            if stat.S_ISREG(st.st_mode):
+                self.files_total += 1
+                self.bytes_total += st.st_size
+        return items
+
+    def run(self):
+        self.started_at = time.monotonic()
+        target = self.archive_path
+        part = os.path.join(os.path.dirname(target), f'.{os.path.basename(target)}.part')
+        try:
+            label = self.build(target, part)
+            if self.volumes:
+                names = self.volumes.commit()
+                message = f'Created {label} archive in {len(names)} volume(s): {names[0]}'
+            else:
+                os.replace(part, target)
+                message = f'Created {label} archive: {target}'
+            self.progress.emit()
+            self.completed.emit(self.DONE, message)
+        except BaseException as e:
+            if self.volumes:
+                self.volumes.discard()
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            if isinstance(e, TransferCancelled):
+                self.completed.emit(self.CANCELLED, 'Compression cancelled.')
+            else:
+                self.completed.emit(self.FAILED, f'Error: {e}')
+
+    def open_output(self, target, part):
+        # The archive file, or a VolumeWriter when splitting: name.z01, name.z02, ... name.zip for ZIP (spanned),
+        # name.001, name.002, ... for the other formats
+        if not self.volume_size:
+            return open(part, 'wb')
+        if self.fmt.startswith('ZIP'):
+            root = target[:-4] if target.lower().endswith('.zip') else target
+            self.volumes = VolumeWriter(lambda i: f'{root}.z{i + 1:02d}', self.volume_size, target)
+        else:
+            self.volumes = VolumeWriter(lambda i: f'{target}.{i + 1:03d}', self.volume_size)
+        return self.volumes
+
+    def build(self, target, part):
+        fmt = self.fmt
+        if fmt.startswith('ZIP'):
+            self.write_zip(target, part)
+            return 'ZIP'
+        if fmt.startswith('TAR'):
+            self.write_tar(target, part)
+            return 'TAR'
+        if fmt.startswith('7z') and HAS_PY7ZR:
+            self.write_7z(part)
+            return '7z'
+        for prefix, opener in (('GZ', 'gzip'), ('BZ2', 'bz2'), ('XZ', 'lzma')):
+            if fmt.startswith(prefix):
+                self.write_single(part, prefix, opener)
+                return prefix
+        if fmt.startswith('RAR'):
+            raise OSError(errno.ENOTSUP, 'creating RAR archives is not supported')
+        if fmt.startswith('ISO'):
+            raise OSError(errno.ENOTSUP, 'ISO compression not fully implemented')
+        raise OSError(errno.ENOTSUP, 'unsupported format or missing library')
+
+    def write_zip(self, target, part):
+        appending = self.add_existing and os.path.exists(target)
+        level = self.compresslevel
+        compression = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+        first = os.path.dirname(self.paths[0]) if self.paths else ''
+        def arcname_for(top, path):
+            if path == top:
+                return os.path.relpath(path, first) if self.store_paths else os.path.basename(path)
+            return os.path.relpath(path, os.path.dirname(top)) if self.store_paths else os.path.basename(path)
+        entries = self.entries(arcname_for)
+        for path, _, st in entries:
+            if stat.S_ISLNK(st.st_mode) and os.path.isfile(path):
+                self.files_total += 1
+                self.bytes_total += os.path.getsize(path)
+        # Like ZipFile.write, links are stored as the file they point to; links to folders and dangling links are
+        # left out
+        files = [(path, arcname) for path, arcname, st in entries
+                 if not stat.S_ISDIR(st.st_mode) and not (stat.S_ISLNK(st.st_mode) and not os.path.isfile(path))]
+        if self.threads > 1 or self.volume_size:
+            with self.open_output(target, part) as raw, \
+                    DeflatePipeline(CountingWriter(raw, self).write, level, self.threads) as pipeline:
+                writer = ZipStreamWriter(pipeline, self.volumes)
+                comment = self.comment.encode('utf-8')
+                if appending:
+                    existing_comment = writer.copy_existing(target)
+                    comment = comment or existing_comment
+                for path, arcname in files:
+                    self.checkpoint()
+                    self.current_file = path
+                    entry = writer.begin(arcname, os.stat(path), not level)
+                    stream = DeflateStream(pipeline, not level)
+                    with open(path, 'rb') as src:
+                        shutil.copyfileobj(CountingReader(src, self), stream, self.CHUNK_SIZE)
+                    stream.finish()
+                    writer.end(entry, stream)
+                    self.files_done += 1
+                writer.close(comment)
+        else:
+            if appending:
+                shutil.copyfile(target, part)
+            with open(part, 'r+b' if appending else 'wb') as raw:
+                with zipfile.ZipFile(CountingWriter(raw, self), 'a' if appending else 'w', compression,
+                                     compresslevel=level) as zf:
+                    if self.comment:
+                        zf.comment = self.comment.encode('utf-8')
+                    for path, arcname in files:
+                        self.checkpoint()
+                        self.current_file = path
+                        # ZipFile applies its compression level only to the entries it creates itself, not to a
+                        # ZipInfo passed to open(), so each file is added whole and counted once it is in
+                        zf.write(path, arcname)
+                        self.add_input(os.path.getsize(path))
+                        self.files_done += 1
+            if appending:
+                self.bytes_out = os.path.getsize(part)
+        if appending:
+            # Report what the new entries added, not the copied records and rewritten central directory
+            self.bytes_out -= os.path.getsize(target)
+
+    def write_tar(self, target, part):
+        mode = {'TAR.GZ (.tar.gz)': 'w:gz', 'TAR.BZ2 (.tar.bz2)': 'w:bz2', 'TAR.XZ (.tar.xz)': 'w:xz'}.get(self.fmt, 'w')
+        level = self.compresslevel
+        options = {'w:gz': {'compresslevel': level}, 'w:bz2': {'compresslevel': max(1, level)},
+                   'w:xz': {'preset': level}}.get(mode, {})
+        def arcname_for(top, path):
+            if not self.store_paths:
+                return os.path.basename(top) if path == top else os.path.join(os.path.basename(top), os.path.relpath(path, top))
+            return path
+        entries = self.entries(arcname_for)
+        with self.open_output(target, part) as raw:
+            if mode == 'w:gz' and self.threads > 1:
+                with DeflatePipeline(CountingWriter(raw, self).write, level, self.threads) as pipeline, \
+                        ParallelGzipFile(pipeline, target) as gz, tarfile.open(fileobj=gz, mode='w|') as tf:
+                    self.add_tar_entries(tf, entries)
+            else:
+                with tarfile.open(fileobj=CountingWriter(raw, self), mode=mode, **options) as tf:
+                    self.add_tar_entries(tf, entries)
+
+    def add_tar_entries(self, tf, entries):
+        for path, arcname, st in entries:
+            self.checkpoint()
+            self.current_file = path
+            info = tf.gettarinfo(path, arcname)
+            if info.isreg():
+                with open(path, 'rb') as src:
+                    tf.addfile(info, CountingReader(src, self))
+                self.files_done += 1
+            else:
+                tf.addfile(info)
+
+    def write_7z(self, part):
+        if self.volume_size:
+            # py7zr seeks back to the start of the archive to finish it, which a volume stream can't do
+            raise OSError(errno.ENOTSUP, 'split 7z archives are not supported')
+        filters = None
+        preset = {'Store (no compression)': None, 'Fast': 1, 'Normal': 6, 'Best': 9}.get(self.level)
+        if self.level == 'Store (no compression)':
+            filters = [{'id': py7zr.FILTER_COPY}]
+        elif preset is not None:
+            filters = [{'id': py7zr.FILTER_LZMA2, 'preset': preset}]
+        def arcname_for(top, path):
+            if not self.store_paths:
+                return os.path.basename(top) if path == top else os.path.join(os.path.basename(top), os.path.relpath(path, top))
+            return path
+        entries = self.entries(arcname_for)
+        with py7zr.SevenZipFile(part, 'w', password=self.password or None, filters=filters,
+                                header_encryption=self.encrypt_names and bool(self.password)) as zf:
+            for path, arcname, st in entries:
+                self.checkpoint()
+                self.current_file = path
+                # py7zr reads the file itself, so 7z progress moves one file at a time
+                zf.write(path, arcname)
+                if stat.S_ISREG(st.st_mode):
+                    self.files_done += 1
+                    self.add_input(st.st_size)
+                self.bytes_out = os.path.getsize(part)
+
+    def write_single(self, part, label, module_name):
+        if len(self.paths) != 1 or not os.path.isfile(self.paths[0]):
+            raise OSError(errno.EINVAL, f'{label} only supports single files')
+        module = __import__(module_name)
+        path = self.paths[0]
+        self.files_total = 1
+        self.bytes_total = os.path.getsize(path)
+        self.current_file = path
+        level = self.compresslevel
+        with self.open_output(self.archive_path, part) as raw, open(path, 'rb') as src:
+            out = CountingWriter(raw, self)
+            if module_name == 'gzip' and self.threads > 1:
+                with DeflatePipeline(out.write, level, self.threads) as pipeline, ParallelGzipFile(pipeline, path) as dst:
+                    shutil.copyfileobj(CountingReader(src, self), dst, self.CHUNK_SIZE)
+            else:
+                if module_name == 'gzip':
+                    # The member keeps the source's name rather than the temporary file's
+                    dst = module.GzipFile(os.path.basename(path), 'wb', level, out)
+                elif module_name == 'bz2':
+                    dst = module.open(out, 'wb', max(1, level))
+                else:
+                    dst = module.open(out, 'wb', preset=level)
+                with dst:
+                    shutil.copyfileobj(CountingReader(src, self), dst, self.CHUNK_SIZE)
+        self.files_done = 1
+
+class ExtractVolumesWorker(QThread):
+    # Extracts a split archive straight from its volumes: they are read one after another and never joined on
+    # disk, so extraction needs no room beyond the extracted files themselves
+    progress = Signal()
+    completed = Signal(str, str)
+    REPORT_INTERVAL = 0.1
+    DONE, CANCELLED, FAILED = CompressWorker.DONE, CompressWorker.CANCELLED, CompressWorker.FAILED
+
+    def __init__(self, volumes, dest_dir, password=None):
+        super().__init__()
+        self.volumes = volumes
+        self.dest_dir = dest_dir
+        self.password = password
+        self.reader = None
+        self.files_done = 0
+        self.current_file = ''
+        self._cancelled = False
+        self._last_report = 0
+
+    def cancel(self):
+        self._cancelled = True
+
+    def checkpoint(self):
+        if self._cancelled:
+            raise TransferCancelled()
+
+    def on_read(self):
+        self.checkpoint()
+        now = time.monotonic()
+        if now - self._last_report >= self.REPORT_INTERVAL:
+            self._last_report = now
+            self.progress.emit()
+
+    def run(self):
+        try:
+            self.reader = VolumeReader(self.volumes, self.on_read)
+            label = self.extract(self.reader)
+            self.progress.emit()
+            self.completed.emit(self.DONE, f'Extracted {label} archive from {len(self.volumes)} volume(s) to {self.dest_dir}')
+        except TransferCancelled:
+            self.completed.emit(self.CANCELLED, 'Extraction cancelled; files extracted so far were kept.')
+        except Exception as e:
+            self.completed.emit(self.FAILED, f'Error: {e}')
+        finally:
+            if self.reader:
+                self.reader.close()
+
+    def extract(self, reader):
+        if re.search(r'\.z\d{2,}$', self.volumes[0], re.IGNORECASE):
+            archive = SpannedZipReader(reader)
+            for entry in archive.entries:
+                self.checkpoint()
+                self.current_file = entry['name']
+                archive.extract(entry, self.dest_dir)
+                self.files_done += 1
+            return 'ZIP'
+        # name.001, name.002, ...: the archive cut into byte ranges, read through as one stream
+        base = self.volumes[0][:-4]
+        lower = base.lower()
+        if lower.endswith('.zip'):
+            with zipfile.ZipFile(reader) as zf:
+                if self.password:
+                    zf.setpassword(self.password.encode('utf-8'))
+                for info in zf.infolist():
+                    self.checkpoint()
+                    self.current_file = info.filename
+                    zf.extract(info, self.dest_dir)
+                    self.files_done += 1
+            return 'ZIP'
+        if '.tar' in lower or lower.endswith(('.tgz', '.tbz2', '.txz')):
+            with tarfile.open(fileobj=reader, mode='r|*') as tf:
+                for member in tf:
+                    self.checkpoint()
+                    self.current_file = member.name
+                    tf.extract(member, self.dest_dir)
+                    self.files_done += 1
+            return 'TAR'
+        for ext, module_name in (('.gz', 'gzip'), ('.bz2', 'bz2'), ('.xz', 'lzma')):
+            if lower.endswith(ext):
+                module = __import__(module_name)
+                name = os.path.basename(base)[:-len(ext)]
+                self.current_file = name
+                with module.open(reader, 'rb') as src, open(os.path.join(self.dest_dir, name), 'wb') as dst:
+                    shutil.copyfileobj(src, dst, CompressWorker.CHUNK_SIZE)
+                self.files_done = 1
+                return ext[1:].upper()
+        raise OSError(errno.ENOTSUP, f'unknown archive type in {os.path.basename(self.volumes[0])}')
+
+class DiskUsageWorker(QThread):
+    found = Signal(object)
+
+    def __init__(self, root_path, cache=None):
+        super().__init__()
+        self.root_path = root_path
+        self.cache = cache
+        self._is_running = True
+
+    def run(self):
+        index = DiskUsageIndex.build(self.root_path, lambda: not self._is_running, self.cache)
+        self.found.emit(index)
+
+    def stop(self):
+        self._is_running = False
+
+class SyncPlanWorker(QThread):
+    found = Signal(object, int)
+
+    def __init__(self, engine, sources, dest_dir, use_hash, mirror):
+        super().__init__()
+        self.engine = engine
+        self.sources = sources
+        self.dest_dir = dest_dir
+        self.use_hash = use_hash
+        self.mirror = mirror
+        self._is_running = True
+
+    def run(self):
+        try:
+            actions, unchanged = self.engine.plan_sync(self.sources, self.dest_dir, self.use_hash, self.mirror, self.checkpoint)
+        except TransferCancelled:
+            return
+        self.found.emit(actions, unchanged)
+
+    def checkpoint(self):
+        if not self._is_running:
+            raise TransferCancelled()
+
+    def stop(self):
+        self._is_running = False
+
+TrashEntry = collections.namedtuple('TrashEntry', 'path info_path original deleted')
+
+class Trash:
+    # freedesktop.org Trash. Files on the home trash's device go to $XDG_DATA_HOME/Trash, others to their mount's
+    # $topdir/.Trash/$uid (if the administrator set up a sticky .Trash) or $topdir/.Trash-$uid. Trashing is one
+    # rename plus a small .trashinfo file, so a huge folder takes as long as a single file.
+    def __init__(self, data_home=None):
+        data_home = data_home or os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+        self.home = os.path.join(data_home, 'Trash')
+        self.uid = os.getuid() if hasattr(os, 'getuid') else 0
+
+    @staticmethod
+    def mount_point(path):
+        path = os.path.realpath(path)
+        dev = os.lstat(path).st_dev
+        while True:
+            parent = os.path.dirname(path)
+            if parent == path or os.lstat(parent).st_dev != dev:
+                return path
+            path = parent
+
+    @staticmethod
+    def _prepare(trash_dir):
+        for sub in ('files', 'info'):
+            os.makedirs(os.path.join(trash_dir, sub), mode=0o700, exist_ok=True)
+        return trash_dir
+
+    def _mount_trash_dirs(self, top):
+        admin = os.path.join(top, '.Trash')
+        try:
+            st = os.lstat(admin)
+            if stat.S_ISDIR(st.st_mode) and st.st_mode & stat.S_ISVTX:
+                yield os.path.join(admin, str(self.uid))
+        except OSError:
+            pass
+        yield os.path.join(top, f'.Trash-{self.uid}')
+
+    def trash_dir_for(self, path):
+        # (trash directory, top directory that .trashinfo paths are relative to, or None for the home trash)
+        dev = os.lstat(path).st_dev
+        os.makedirs(self.home, mode=0o700, exist_ok=True)
+        if os.stat(self.home).st_dev == dev:
+            return self._prepare(self.home), None
+        top = self.mount_point(os.path.dirname(os.path.abspath(path)))
+        error = None
+        for trash_dir in self._mount_trash_dirs(top):
+            try:
+                return self._prepare(trash_dir), top
+            except OSError as e:
+                error = e
+        raise error
+
+    def trash(self, path):
+        # Resolved parent, so the path recorded relative to a mount's top directory is right
+        path = os.path.abspath(path)
+        path = os.path.join(os.path.realpath(os.path.dirname(path)), os.path.basename(path))
+        trash_dir, top = self.trash_dir_for(path)
+        name = os.path.basename(path.rstrip(os.sep))
+        original = path if top is None else os.path.relpath(path, top)
+        info = f'[Trash Info]\nPath={urllib.parse.quote(original)}\nDeletionDate={time.strftime("%Y-%m-%dT%H:%M:%S")}\n'
+        # The .trashinfo file is created exclusively first: it reserves the name in files/
+        for n in itertools.count(1):
+            candidate = name if n == 1 else f'{name}.{n}'
+            info_path = os.path.join(trash_dir, 'info', candidate + '.trashinfo')
+            try:
+                fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                continue
+            break
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(info)
+            target = os.path.join(trash_dir, 'files', candidate)
+            os.rename(path, target)
+        except BaseException:
+            os.remove(info_path)
+            raise
+        return target
+
+    def trash_dirs(self):
+        dirs = [self.home]
+        try:
+            with open('/proc/mounts') as f:
+                tops = [line.split()[1].replace('\\040', ' ') for line in f]
+        except OSError:
+            tops = []
+        for top in tops:
+            dirs.extend(self._mount_trash_dirs(top))
+        return [d for d in dict.fromkeys(dirs) if os.path.isdir(os.path.join(d, 'info'))]
+
+    def entries(self):
+        entries = []
+        for trash_dir in self.trash_dirs():
+            top = None if trash_dir == self.home else os.path.dirname(trash_dir.rstrip(os.sep))
+            if top and os.path.basename(top) == '.Trash':
+                top = os.path.dirname(top)
+            info_dir = os.path.join(trash_dir, 'info')
+            try:
+                names = os.listdir(info_dir)
+            except OSError:
+                continue
+            for info_name in names:
+                if not info_name.endswith('.trashinfo'):
+                    continue
+                info_path = os.path.join(info_dir, info_name)
+                fields = {}
+                try:
+                    with open(info_path, encoding='utf-8', errors='replace') as f:
+                        for line in f:
+                            key, sep, value = line.strip().partition('=')
+                            if sep:
+                                fields[key] = value
+                except OSError:
+                    continue
+                original = urllib.parse.unquote(fields.get('Path', ''))
+                if top and not os.path.isabs(original):
+                    original = os.path.join(top, original)
+                path = os.path.join(trash_dir, 'files', info_name[:-len('.trashinfo')])
+                entries.append(TrashEntry(path, info_path, original, fields.get('DeletionDate', '').replace('T', ' ')))
+        return entries
+
+    def restore(self, entry):
+        if os.path.lexists(entry.original):
+            raise FileExistsError(errno.EEXIST, 'a file with that name already exists', entry.original)
+        os.makedirs(os.path.dirname(entry.original), exist_ok=True)
+        os.rename(entry.path, entry.original)
+        os.remove(entry.info_path)
+
+    def forget(self, entries):
+        # Info files go after their data (as the spec asks), and only where the data is really gone
+        for entry in entries:
+            if not os.path.lexists(entry.path):
+                try:
+                    os.remove(entry.info_path)
+                except OSError:
+                    pass
+
 class DeleteWorker(QThread):
+    # Counts the entries first (from the folder size index when it holds the tree, otherwise with a parallel
+    # walk), then deletes on a thread pool. Each directory is one task: it unlinks its files relative to the
+    # directory's descriptor and queues its subdirectories; a directory goes once its last subdirectory has.
     progress = Signal(int)
+    status = Signal(str)
     finished = Signal()
     error = Signal(str)
-    def __init__(self, file_paths):
+    THREADS = 8
+    REPORT_INTERVAL = 0.1
+    HAS_DIR_FD = (os.unlink in os.supports_dir_fd and os.rmdir in os.supports_dir_fd
+                  and os.scandir in os.supports_fd)
+
+    def __init__(self, file_paths, size_engine=None, threads=None, low_priority=False):
         super().__init__()
         self.file_paths = file_paths
+        self.size_engine = size_engine
+        self.threads = threads or self.THREADS
+        # Background purges: niced threads so the disk and CPU stay free for the user
+        self.low_priority = low_priority
         self._is_interrupted = False
+        self.total = 0
+        self.removed = 0
+        self.errors = []
+        self.started_at = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._last_report = 0
+
     def run(self):
-        total = len(self.file_paths)
-        for i, file_path in enumerate(self.file_paths):
+        initializer = None
+        if self.low_priority:
+            self.lower_priority()
+            initializer = self.lower_priority
+        self.status.emit('Counting...')
+        for path in self.file_paths:
             if self._is_interrupted:
                 break
-            try:
-                if os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-                else:
-                    os.remove(file_path)
-            except Exception as e:
-                self.error.emit(f'Could not delete {file_path}: {e}')
-            self.progress.emit(int((i+1)/total*100))
+            self.total += self.count(path)
+        self.started_at = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(self.threads, initializer=initializer) as self.pool:
+            for path in self.file_paths:
+                if self._is_interrupted:
+                    break
+                try:
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        self._submit([path, None, 1, None, False])
+                    else:
+                        os.unlink(path)
+                        self._count_removed()
+                except OSError as e:
+                    self._fail(path, e)
+            with self._idle:
+                while self._pending:
+                    self._idle.wait()
+        if self._is_interrupted:
+            total = max(self.total, self.removed)
+            self.status.emit(f'Cancelled – {self.removed:,} of {total:,} entries removed')
+            self.progress.emit(min(99, int(self.removed * 100 / total)) if total else 0)
+        else:
+            self.report(True)
+        if self.errors:
+            more = f'\n... and {len(self.errors) - 10} more' if len(self.errors) > 10 else ''
+            self.error.emit('Could not delete:\n' + '\n'.join(self.errors[:10]) + more)
         self.finished.emit()
+
     def interrupt(self):
         self._is_interrupted = True
 
+    def is_interrupted(self):
+        return self._is_interrupted
+
+    @staticmethod
+    def lower_priority():
+        # On Linux the nice value belongs to the calling thread only
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+    def count(self, path):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return 0
+        if not stat.S_ISDIR(st.st_mode):
+            return 1
+        found = self.size_engine.index_for(path) if self.size_engine else None
+        if found:
+            # Files plus directories of the indexed subtree, without touching the disk
+            index, node = found
+            dirs = 0
+            stack = [node]
+            while stack:
+                dirs += 1
+                stack.extend(index.children(stack.pop()))
+            return index.files[node] + dirs
+        counts = []
+        walker = ParallelWalker(path, lambda entry: False, self.threads, is_cancelled=lambda: self._is_interrupted,
+                                collect=lambda folder, names: counts.append(len(names)))
+        for _ in walker.iter_matches():
+            pass
+        return sum(counts) + 1
+
+    def _submit(self, node):
+        # node: [path, parent node, unfinished parts (its own files plus one per subdirectory),
+        #        descriptor its subdirectories are removed through while any of them are left,
+        #        whether a part below it is kept so it cannot be removed]
+        with self._lock:
+            self._pending += 1
+        self.pool.submit(self._clear_dir, node)
+
+    def _clear_dir(self, node):
+        listed = False
+        try:
+            if not self._is_interrupted:
+                subdirs = self._unlink_files(node)
+                listed = True
+                with self._lock:
+                    node[2] += len(subdirs)
+                for name in subdirs:
+                    self._submit([os.path.join(node[0], name), node, 1, None, False])
+        except OSError as e:
+            self._fail(node[0], e)
+        finally:
+            # A directory that could not be listed is kept without a second error for its rmdir
+            self._release(node, keep=not listed)
+            with self._idle:
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def _unlink_files(self, node):
+        path = node[0]
+        subdirs = []
+        if self.HAS_DIR_FD:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_NOFOLLOW', 0))
+            target = fd
+        else:
+            fd = None
+            target = path
+        try:
+            with os.scandir(target) as it:
+                for entry in it:
+                    if self._is_interrupted:
+                        break
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                            continue
+                        if fd is not None:
+                            os.unlink(entry.name, dir_fd=fd)
+                        else:
+                            os.unlink(os.path.join(path, entry.name))
+                        self._count_removed()
+                    except OSError as e:
+                        self._fail(os.path.join(path, entry.name), e)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            raise
+        if fd is not None:
+            if subdirs:
+                # Kept open until the subdirectories are gone, so they are removed relative to it
+                node[3] = fd
+            else:
+                os.close(fd)
+        return subdirs
+
+    def _release(self, node, keep=False):
+        # Walks up while directories become empty; stopped or failed parts keep their ancestors,
+        # whose descriptors are still closed once nothing below them is left
+        while node is not None:
+            with self._lock:
+                node[2] -= 1
+                node[4] = node[4] or keep
+                if node[2]:
+                    return
+                keep = node[4]
+            parent = node[1]
+            if node[3] is not None:
+                os.close(node[3])
+                node[3] = None
+            if not (keep or self._is_interrupted):
+                try:
+                    if parent is not None and parent[3] is not None:
+                        os.rmdir(os.path.basename(node[0]), dir_fd=parent[3])
+                    else:
+                        os.rmdir(node[0])
+                    self._count_removed()
+                except OSError as e:
+                    self._fail(node[0], e)
+                    keep = True
+            node = parent
+
+    def _count_removed(self):
+        with self._lock:
+            self.removed += 1
+        self.report()
+
+    def _fail(self, path, e):
+        with self._lock:
+            self.errors.append(f'{path}: {e.strerror or e}')
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.REPORT_INTERVAL:
+            return
+        self._last_report = now
+        removed, total = self.removed, max(self.total, self.removed)
+        elapsed = now - self.started_at
+        rate = f' – {removed / elapsed:,.0f} entries/s' if elapsed > 0 else ''
+        self.status.emit(f'Deleted {removed:,} of {total:,} entries{rate}')
+        # The index may be slightly out of date, so only the end of the run shows 100%
+        self.progress.emit(100 if force else min(99, int(removed * 100 / total)) if total else 0)
+
 def main():
     app = QApplication(sys.argv)
     app.setStyle("Fusion")